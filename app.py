@@ -1,75 +1,129 @@
 import os
-from flask import Flask, render_template, request, jsonify, Response
-import cv2
-from pymongo import MongoClient
-import datetime
+import json
+import atexit
+import threading
+from flask import Flask, render_template, request, jsonify, Response, send_from_directory
 import logging
-from PIL import Image
-import io
-import ollama
+
+from core import services
+from core.cache import DescriptionCache
+from core.cameras import CameraRegistry
+from core.config import CACHE_FILE
+from core.detectors import create_detector
+from core.events import create_tracker
+from core.inference import get_client
+from core import logs as logs_api
+from core.metrics import LogSampler, metrics
+from core import stats as stats_api
+from core.recorder import ClipRecorder
 
 app = Flask(__name__)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# MongoDB setup
-try:
-    client = MongoClient('mongodb://127.0.0.1:27017', serverSelectionTimeoutMS=5000)
-    db = client['wildlife_conservation']  
-    log_collection = db['detection_logs']  
-    client.server_info()  # Test connection
-    logger.info("Connected to MongoDB successfully.")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {e}")
-    raise
-
-def process_frame(frame):
-    """Send frame to LLaVA model via Ollama and return the response."""
-    try:
-        # Convert OpenCV frame to PIL Image
-        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+# MongoDB connects on first use
+log_collection = services.log_collection()
+stats_collection = services.stats_collection()
+
+# Event opens, updates and closes are pushed to the logs page as they happen
+event_bus = services.get_event_bus()
+
+# Detection clips, served by the footages page and indexed with their metadata and thumbnails
+VIDEO_FOLDER = os.path.join('static', 'footages')
+
+# Created by start() in the process that serves requests, never on import: the log
+# sink replays its spool, the catalogs scan and the storage manager moves footage,
+# and the description cache is saved at exit
+log_sink = None
+detector = None
+footage_catalog = None
+storage = None
+cameras = None
+trackers = {}
+_started = False
+_start_lock = threading.Lock()
+
+
+def start():
+    """Start the detection services once per process."""
+    global log_sink, detector, footage_catalog, storage, cameras, trackers, _started
+    with _start_lock:
+        if _started:
+            return
+        # Indexes and stats rollups are prepared in the background
+        services.prepare_database()
 
-        # Convert to bytes for Ollama
-        img_bytes = io.BytesIO()
-        image.save(img_bytes, format='JPEG')
-        img_bytes = img_bytes.getvalue()
+        # Detection events and clip links are written in batches off the capture
+        # threads, and spooled to disk while MongoDB is unavailable
+        log_sink = services.get_log_sink()
 
-        # Send image to LLaVA via Ollama
-        response = ollama.chat(
-            model='llava',  
-            messages=[{"role": "user", "content": "What is in the video(the camera is a night vision camera so ignore the resolution)?", "images": [img_bytes]}]
-        )
+        # Cheap HOG screening on every gated frame; LLaVA only confirms candidates,
+        # and near-identical frames reuse a cached description
+        detector = create_detector('hog', cache=DescriptionCache(path=CACHE_FILE))
+
+        footage_catalog = services.create_footage_catalog(VIDEO_FOLDER)
+        # Quotas, transcoding and dedupe across both footage folders; copies in the served folder are kept
+        storage = services.start_storage_manager([footage_catalog, services.create_footage_catalog('saved_videos')])
+
+        # One capture/inference pipeline per configured camera, shared by every viewer;
+        # all cameras share the same LLaVA backend through the inference scheduler
+        cameras = CameraRegistry.from_config(detector, on_result=log_detection, recorder_factory=create_recorder,
+                                             on_stop=close_event)
+        event_log = services.create_event_log()
+        trackers = {camera_id: create_tracker(event_log, camera_id, cameras.recorders.get(camera_id))
+                    for camera_id in cameras.configs}
+        # Runs before the log sink's own exit hook, so the closes are flushed with it
+        atexit.register(lambda: [close_event(camera_id) for camera_id in trackers])
+        _started = True
 
-        return response['message']['content']
-    except Exception as e:
-        logger.error(f"Error processing frame with LLaVA: {e}")
-        return "Error processing frame."
+
+@app.before_request
+def ensure_started():
+    # Under `flask run` or a WSGI server the first request starts the services
+    if not _started:
+        start()
 
 
 #home page
 @app.route('/')
 def home():
-    return render_template('home.html')
+    return render_template('home.html', cameras=cameras.configs.values())
 
 @app.route('/footages')
 def footages():
     try:
-        video_folder = os.path.join('static', 'footages')  
-        videos = os.listdir(video_folder)  
-        
         # Filter videos by date if a date is provided in the query string
-        selected_date = request.args.get('date')
-        if selected_date:
-            # Convert the date to match video filename format (e.g., detection_2025-03-13.mp4)
-            videos = [video for video in videos if selected_date in video]
-        
+        videos = footage_catalog.find(date=request.args.get('date'), camera=request.args.get('camera'))
         return render_template('footages.html', videos=videos)
     except Exception as e:
         logger.error(f"Error fetching footages: {e}")
         return jsonify({"error": "Failed to fetch footages."}), 500
 
 
+# Clips are sent with conditional/range support so browsers can seek without downloading the whole file
+@app.route('/footages/video/<path:filename>')
+def footage_video(filename):
+    return send_from_directory(VIDEO_FOLDER, filename, conditional=True)
+
+
+@app.route('/footages/thumbnail/<path:filename>')
+def footage_thumbnail(filename):
+    return send_from_directory(footage_catalog.thumbnail_folder, filename, max_age=3600)
+
+
+@app.route('/api/footages')
+def footage_list():
+    try:
+        videos = footage_catalog.find(date=request.args.get('date'), camera=request.args.get('camera'))
+        for video in videos:
+            video['started'] = video['started'].isoformat()
+        return jsonify(videos)
+    except Exception as e:
+        logger.error(f"Error fetching footages: {e}")
+        return jsonify({"error": "Failed to fetch footages."}), 500
+
+
 # Logs page route
 @app.route('/logs')
 def logs():
@@ -85,28 +139,86 @@ def analysis():
 # API to get logs data from MongoDB
 @app.route('/api/logs')
 def get_logs():
+    """Filtered logs, newest first.
+
+    Query parameters: date, start, end (YYYY-MM-DD), month (YYYY-MM), camera,
+    label (a species or ``person``) and q (words in the description, matched
+    with the text index). Returns a page of ``limit`` logs with the
+    cursor for the next page in the X-Next-Cursor header; pass it back as
+    ``cursor``. With ``format=ndjson`` every matching log is streamed instead.
+    """
     try:
-        logs = log_collection.find()  # Fetch all logs from MongoDB
-        logs_list = []
-        for log in logs:
-            logs_list.append({
-                'date': log['date'],
-                'detection_time': log['detection_time'],
-                'close_time': log['close_time'],
-                'description': log.get('description', "No description available.")
-            })
-        return jsonify(logs_list)
+        args = request.args
+        query = logs_api.build_query(date=args.get('date'), start=args.get('start'), end=args.get('end'),
+                                     month=args.get('month'), camera=args.get('camera'), text=args.get('q'),
+                                     label=args.get('label'))
+
+        if args.get('format') == 'ndjson':
+            def generate():
+                for log in logs_api.iter_logs(log_collection, query):
+                    yield json.dumps(logs_api.to_json(log)) + '\n'
+            headers = {'Content-Disposition': 'attachment; filename=detection_logs.ndjson'}
+            return Response(generate(), mimetype='application/x-ndjson', headers=headers)
+
+        logs, next_cursor = logs_api.find_page(log_collection, query, args.get('limit', 100, type=int),
+                                               args.get('cursor'))
+        response = jsonify([logs_api.to_json(log) for log in logs])
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
     except Exception as e:
         logger.error(f"Error fetching logs from MongoDB: {e}")
         return jsonify({"error": "Failed to fetch logs."}), 500
 
 
+def format_event(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+# Live detection events as Server-Sent Events
+@app.route('/api/events')
+def event_stream():
+    """Push ``opened``, ``updated`` and ``closed`` detection events as they happen.
+
+    A reconnecting client resumes after the id in its Last-Event-ID header
+    (or the ``last_event_id`` parameter). If events it missed have already
+    left the buffer it gets a ``reset`` event and should reload /api/logs.
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        after = int(last_id) if last_id else event_bus.last_id
+    except ValueError:
+        return jsonify({"error": f"Invalid event id: {last_id}"}), 400
+
+    def generate():
+        cursor = after
+        yield "retry: 3000\n\n"
+        while True:
+            events, complete = event_bus.read(cursor, timeout=15)
+            if not complete:
+                cursor = event_bus.last_id
+                yield format_event(cursor, 'reset', {})
+                continue
+            if not events:
+                # Keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            for event_id, event_type, data in events:
+                cursor = event_id
+                yield format_event(event_id, event_type, data)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+
 @app.route('/api/detection_logs', methods=['GET'])
 def detection_logs():
     try:
-        logs = log_collection.find({}, {"_id": 0, "date": 1, "detection_time": 1})
         logs_list = []
-        for log in logs:
+        for log in logs_api.iter_logs(log_collection, {}):
+            log = logs_api.to_json(log)
             logs_list.append({
                 'date': log['date'],
                 'detection_time': log['detection_time']
@@ -117,112 +229,99 @@ def detection_logs():
         return jsonify({"error": "Failed to fetch detection logs."}), 500
 
 
-def detect_objects():
+@app.route('/api/stats')
+def detection_stats():
+    """Event counts and durations per day, hour of day and month.
+
+    Query parameters: start, end (YYYY-MM-DD) and camera. Served from the
+    detection_stats rollups, which are updated as each event closes.
+    """
     try:
-        cap = cv2.VideoCapture(0)
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        args = request.args
+        return jsonify(stats_api.query_stats(stats_collection, start=args.get('start'), end=args.get('end'),
+                                             camera=args.get('camera')))
+    except Exception as e:
+        logger.error(f"Error fetching detection statistics: {e}")
+        return jsonify({"error": "Failed to fetch detection statistics."}), 500
 
-        if not cap.isOpened():
-            logger.error("Failed to open webcam.")
-            return
 
-        description_logged = False
-        start_time = None
-        video_writer = None
-        video_filename = None
+# Descriptions arrive for every inferred frame; only a sample is logged, at debug level
+detection_sampler = LogSampler(logger)
 
-        # Ensure the footages directory exists
-        video_folder = os.path.join('static', 'footages')
-        if not os.path.exists(video_folder):
-            os.makedirs(video_folder)  # Create the directory if it doesn't exist
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                logger.error("Failed to grab frame.")
-                break
-
-            # Get description from the process_frame function
-            description = process_frame(frame)
-            logger.info(f"Detection Output: {description}")
-
-         
-            if "person" in description.lower() and not description_logged:
-                start_time = datetime.datetime.now()
-                detection_time = start_time.strftime('%H:%M:%S')
-                date = start_time.strftime('%Y-%m-%d')
-
-                # Log detection into MongoDB
-                try:
-                    log_collection.insert_one({
-                        'date': date,
-                        'detection_time': detection_time,
-                        'close_time': None,
-                        'description': description
-                    })
-                    description_logged = True
-
-                    # # Set up video writer to save the footage
-                    # video_filename = os.path.join(video_folder, f'detection_{date}_{detection_time}.mp4')
-                    # fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Codec
-                    # video_writer = cv2.VideoWriter(video_filename, fourcc, 20.0, (frame.shape[1], frame.shape[0]))
-
-                    # if not video_writer.isOpened():
-                    #     logger.error(f"Failed to open video writer for {video_filename}")
-                    #     return
-
-                    # logger.info(f"Started saving video to {video_filename}")
-                except Exception as e:
-                    logger.error(f"Error logging detection to MongoDB: {e}")
-
-            # Write the current frame to the video file if recording
-            if video_writer is not None:
-                video_writer.write(frame)
-
-            # Encode the frame in JPEG format to stream it
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                logger.error("Failed to encode frame.")
-                break
-
-            frame = buffer.tobytes()
-
-            # Yield the frame in a byte stream
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-
-            # Reset logging flag and stop recording when detection session ends
-            if description_logged:
-                close_time = datetime.datetime.now().strftime('%H:%M:%S')
-                try:
-                    log_collection.update_one(
-                        {'date': date, 'detection_time': detection_time, 'close_time': None},
-                        {'$set': {'close_time': close_time}}
-                    )
-                    description_logged = False
-                    video_writer.release()  
-                    logger.info(f"Finished saving video: {video_filename}")
-                except Exception as e:
-                    logger.error(f"Error updating close time in MongoDB: {e}")
+def log_detection(frame, result):
+    """Feed each detection result to its camera's event tracker."""
+    if result.description is not None:
+        detection_sampler.debug(f"Detection Output: {result.description}")
+    trackers[result.camera_id].update(result.detection, result.timestamp)
 
-    except Exception as e:
-        logger.error(f"Error in detect_objects: {e}")
-    finally:
-        cap.release()
-        if video_writer is not None:
-            video_writer.release()  
+
+def close_event(camera_id):
+    """Close the camera's open event and finish its clip once its pipeline stops, e.g. when the last viewer leaves."""
+    trackers[camera_id].close()
+    recorder = cameras.recorders.get(camera_id)
+    if recorder is not None:
+        recorder.close()
 
 
+def create_recorder(camera):
+    return ClipRecorder(VIDEO_FOLDER, camera.id, on_clip=services.create_clip_linker(footage_catalog))
+
+
+
+def detect_objects(broadcaster):
+    """Stream MJPEG frames from a camera's shared pipeline to one viewer."""
+    for frame in broadcaster.subscribe():
+        # Yield the frame in a byte stream
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+
 
 # Route to stream video
-@app.route('/video_feed')
-def video_feed():
-    return Response(detect_objects(), mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/video_feed', defaults={'camera_id': None})
+@app.route('/video_feed/<camera_id>')
+def video_feed(camera_id):
+    broadcaster = cameras.get(camera_id)
+    if broadcaster is None:
+        return jsonify({"error": f"Unknown camera: {camera_id}"}), 404
+    return Response(detect_objects(broadcaster), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+# API to get camera status, per-camera inference queue depth and log writer backlog
+@app.route('/api/cameras')
+def camera_status():
+    return jsonify({'cameras': cameras.stats(), 'detector': detector.stats(), 'inference': get_client().stats(),
+                    'log_sink': log_sink.stats(), 'storage': storage.stats()})
+
+
+def pipeline_gauges():
+    """Queue depths and viewers, read when /metrics is scraped."""
+    gauges = [('wildcare_log_queue_depth', {}, log_sink.queue_depth),
+              ('wildcare_log_sink_online', {}, int(log_sink.online)),
+              ('wildcare_inference_pending', {}, get_client().stats()['pending'])]
+    for camera in cameras.stats():
+        labels = {'camera': camera['id']}
+        gauges.append(('wildcare_viewers', labels, camera['viewers']))
+        if camera['queue'] is not None:
+            gauges.append(('wildcare_inference_queue_depth', labels, camera['queue']['queue_depth']))
+    return gauges
+
+
+metrics.add_collector(pipeline_gauges)
+
+
+# Per-stage latency histograms and frame/event counters in the Prometheus text format
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    debug = True
+    # The debug reloader runs this file in a watcher process too; only the serving child starts the services
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start()
+    app.run(debug=debug)
 
 
 
@@ -0,0 +1,112 @@
+"""Micro-benchmark of the per-frame encode path.
+
+Compares the old path (BGR->RGB + PIL JPEG for the model, a second
+cv2.imencode for the MJPEG stream, another BGR->RGB for display) with the
+shared ``Frame`` path, reporting milliseconds and allocated bytes per frame.
+
+    python benchmarks/bench_frames.py --frames 200 --viewers 3
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import MODEL_WIDTH  # noqa: E402
+from core.detectors import MODEL_JPEG_QUALITY  # noqa: E402
+from core.frames import JPEG_QUALITY, Frame  # noqa: E402
+
+
+def synthetic_frames(count, width, height):
+    """Noisy gradient frames, roughly as hard to compress as a night-vision feed."""
+    rng = np.random.default_rng(0)
+    base = np.tile(np.linspace(0, 200, width, dtype=np.uint8), (height, 1))
+    for _ in range(count):
+        noise = rng.integers(0, 40, (height, width), dtype=np.uint8)
+        yield cv2.merge([base + noise] * 3)
+
+
+def legacy_path(image, viewers):
+    # Model request
+    pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    img_bytes = io.BytesIO()
+    pil_image.save(img_bytes, format='JPEG')
+    model_bytes = img_bytes.getvalue()
+    # One MJPEG encode per viewer, each running its own generator
+    stream = [cv2.imencode('.jpg', image)[1].tobytes() for _ in range(viewers)]
+    # Display conversion
+    display = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return model_bytes, stream, display
+
+
+def frame_path(image, viewers):
+    frame = Frame(image)
+    model_bytes = frame.jpeg(MODEL_JPEG_QUALITY, MODEL_WIDTH)
+    stream = [frame.jpeg(JPEG_QUALITY) for _ in range(viewers)]
+    display = frame.rgb()
+    return model_bytes, stream, display
+
+
+def measure(path, frames, viewers):
+    # Warm up so one-off allocations (scratch buffers, codec tables) are not counted
+    path(frames[0], viewers)
+
+    start = time.perf_counter()
+    for image in frames:
+        path(image, viewers)
+    elapsed = time.perf_counter() - start
+
+    # Timed separately: tracing allocations slows everything down
+    tracemalloc.start()
+    peaks = []
+    for image in frames:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        path(image, viewers)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        'ms_per_frame': 1000 * elapsed / len(frames),
+        'alloc_kib_per_frame': sum(peaks) / len(peaks) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--viewers', type=int, default=1, help="MJPEG clients watching the stream")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    frames = list(synthetic_frames(args.frames, args.width, args.height))
+    results = {
+        'config': vars(args),
+        'legacy': measure(legacy_path, frames, args.viewers),
+        'frame': measure(frame_path, frames, args.viewers),
+    }
+
+    print(f"{args.frames} frames at {args.width}x{args.height}, {args.viewers} viewer(s)")
+    for name in ('legacy', 'frame'):
+        stats = results[name]
+        print(f"  {name:<7} {stats['ms_per_frame']:7.2f} ms/frame  {stats['alloc_kib_per_frame']:8.1f} KiB allocated/frame")
+    speedup = results['legacy']['ms_per_frame'] / results['frame']['ms_per_frame']
+    print(f"  speed-up {speedup:.2f}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
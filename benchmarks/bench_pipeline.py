@@ -0,0 +1,338 @@
+"""End-to-end benchmark of the three front-end loops against fake backends.
+
+Replays the bundled footage (synthetic frames if none of it decodes) as the
+camera, answers LLaVA requests from a local mock Ollama server and writes
+detection events through the log sink into mongomock or an in-memory
+stand-in, so no webcam, model or database is needed. For the Flask
+broadcaster, the PyQt frame worker and the Streamlit detection session
+polled by live-view fragments it reports
+end-to-end fps, p50/p90/p99 latency of the capture, encode, inference,
+logging and stream stages, and peak memory.
+
+    python benchmarks/bench_pipeline.py --duration 20 --latency 0.8 --json results.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from unittest import mock
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import CameraReplay, MockOllamaServer, load_footage, memory_database, synthetic_frames  # noqa: E402
+
+from core.cameras import CameraConfig, CameraRegistry, InferenceScheduler  # noqa: E402
+from core.detectors import create_detector  # noqa: E402
+from core.events import EventLog, create_tracker  # noqa: E402
+from core.frames import Frame  # noqa: E402
+from core.inference import OllamaClient  # noqa: E402
+from core.log_sink import LogSink  # noqa: E402
+from core.session import DetectionSession  # noqa: E402
+
+STAGES = ('capture', 'encode', 'inference', 'logging', 'stream')
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return 1000 * ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        'count': len(ordered),
+        'mean_ms': 1000 * sum(ordered) / len(ordered),
+        'p50_ms': at(0.50),
+        'p90_ms': at(0.90),
+        'p99_ms': at(0.99),
+        'max_ms': 1000 * ordered[-1],
+    }
+
+
+class Stages:
+    """Thread-safe latency samples per pipeline stage."""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def timed(self, stage, function):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def summary(self):
+        with self._lock:
+            return {stage: percentiles(samples) for stage, samples in self.samples.items()}
+
+
+class MemorySampler(threading.Thread):
+    """Peak resident memory of this process, sampled every ``interval`` seconds."""
+
+    def __init__(self, interval=0.2):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    @staticmethod
+    def rss():
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss
+        except ImportError:
+            pass
+        try:
+            import resource
+            # ru_maxrss is the process peak so far, in KiB on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.peak = max(self.peak, self.rss())
+        return self.peak / (1024 * 1024)
+
+
+def instrument_encode(stages):
+    """Patch ``Frame.jpeg`` to record actual encodes, not cache hits."""
+    original = Frame.jpeg
+
+    def jpeg(frame, *args, **kwargs):
+        cached = len(frame._jpeg)
+        start = time.perf_counter()
+        data = original(frame, *args, **kwargs)
+        if len(frame._jpeg) > cached:
+            stages.record('encode', time.perf_counter() - start)
+        return data
+
+    return mock.patch.object(Frame, 'jpeg', jpeg)
+
+
+def build(args, stages, url, spool_path):
+    client = OllamaClient(host=url, concurrency=args.concurrency, max_pending=args.concurrency * 4)
+    detector = create_detector(None if args.screener == 'none' else args.screener, client=client)
+    # A spool of its own, so the benchmark never replays or deletes the app's real one
+    sink = LogSink(memory_database(), flush_interval=0.5, spool_path=spool_path)
+    event_log = EventLog(sink.collection('detection_logs'), sink.collection('detection_stats'))
+    tracker = create_tracker(event_log, 'bench')
+    tracker.update = stages.timed('logging', tracker.update)
+    return detector, sink, tracker
+
+
+def run_flask(args, stages, url, spool_path):
+    """Shared pipeline behind the MJPEG broadcaster, with ``--viewers`` clients."""
+    detector, sink, tracker = build(args, stages, url, spool_path)
+    confirm = stages.timed('inference', detector.confirm if hasattr(detector, 'confirm') else detector.detect)
+    scheduler = InferenceScheduler(confirm, max_in_flight=args.concurrency, policy='activity')
+    registry = CameraRegistry([CameraConfig('bench', source=0)], scheduler,
+                              screen=getattr(detector, 'screen', None),
+                              on_result=lambda frame, result: tracker.update(result.detection, result.timestamp))
+    broadcaster = registry.get('bench')
+
+    delivered = [0] * args.viewers
+    stop = threading.Event()
+
+    def viewer(index):
+        last = None
+        for data in broadcaster.subscribe():
+            now = time.perf_counter()
+            if last is not None:
+                # Gap between consecutive frames as seen by the client
+                stages.record('stream', now - last)
+            last = now
+            delivered[index] += 1
+            if stop.is_set():
+                break
+
+    threads = [threading.Thread(target=viewer, args=(i,), daemon=True) for i in range(args.viewers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    # Don't leave the capture running into the next scenario
+    if broadcaster.pipeline is not None:
+        broadcaster.pipeline.stop()
+    tracker.close()
+    sink.flush()
+    return {'fps': sum(delivered) / len(delivered) / args.duration, 'log_sink': sink.stats(),
+            'inference': detector.stats() if hasattr(detector, 'stats') else None}
+
+
+def run_streamlit(args, stages, url, spool_path):
+    """A background detection session, as the Streamlit page keeps it, polled by ``--viewers`` fragments."""
+    detector, sink, _ = build(args, stages, url, spool_path)
+    event_log = EventLog(sink.collection('detection_logs'), sink.collection('detection_stats'))
+    confirm = stages.timed('inference', detector.confirm if hasattr(detector, 'confirm') else detector.detect)
+    scheduler = InferenceScheduler(confirm, max_in_flight=args.concurrency, policy='activity')
+    session = DetectionSession(CameraConfig('bench', source=0), scheduler, event_log,
+                               screen=getattr(detector, 'screen', None))
+    if not session.start():
+        raise RuntimeError(session.error)
+    session.tracker.update = stages.timed('logging', session.tracker.update)
+
+    delivered = [0] * args.viewers
+    stop = threading.Event()
+
+    def viewer(index):
+        # One browser session's live-view fragment, rerun on its own timer
+        while not stop.wait(args.refresh):
+            start = time.perf_counter()
+            if session.snapshot() is not None:
+                delivered[index] += 1
+            stages.record('stream', time.perf_counter() - start)
+
+    threads = [threading.Thread(target=viewer, args=(i,), daemon=True) for i in range(args.viewers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    session.stop()
+    sink.flush()
+    return {'fps': sum(delivered) / len(delivered) / args.duration, 'log_sink': sink.stats(),
+            'inference': detector.stats() if hasattr(detector, 'stats') else None}
+
+
+def run_qt(args, stages, url, spool_path):
+    """The PyQt window's frame worker and detection session, shown by a stand-in for its display slot."""
+    from PyQt5.QtCore import QCoreApplication, QTimer
+    import pyqt5
+
+    detector, sink, _ = build(args, stages, url, spool_path)
+    event_log = EventLog(sink.collection('detection_logs'), sink.collection('detection_stats'))
+    confirm = stages.timed('inference', detector.confirm if hasattr(detector, 'confirm') else detector.detect)
+    scheduler = InferenceScheduler(confirm, max_in_flight=args.concurrency, policy='activity')
+    session = DetectionSession(CameraConfig('bench', source=0), scheduler, event_log,
+                               screen=getattr(detector, 'screen', None))
+    # Started here so its tracker can be timed; the worker's own start() then finds it running
+    if not session.start():
+        raise RuntimeError(session.error)
+    session.tracker.update = stages.timed('logging', session.tracker.update)
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    worker = pyqt5.FrameWorker(session)
+    shown = [0]
+
+    def show(frame):
+        # What WildlifeMonitor.update_frame does before handing the image to Qt
+        start = time.perf_counter()
+        pyqt5.render_frame(worker.pipeline, frame)
+        stages.record('stream', time.perf_counter() - start)
+        shown[0] += 1
+        worker.frame_shown()
+
+    worker.frame_ready.connect(show)
+    worker.failed.connect(lambda message: app.quit())
+    worker.start()
+    QTimer.singleShot(int(args.duration * 1000), app.quit)
+    app.exec_()
+    worker.stop()
+    session.stop()
+    sink.flush()
+    return {'fps': shown[0] / args.duration, 'log_sink': sink.stats(),
+            'inference': detector.stats() if hasattr(detector, 'stats') else None}
+
+
+def run_scenario(name, args, frames, url):
+    stages = Stages()
+    replay = CameraReplay(frames, fps=args.fps)
+    sampler = MemorySampler()
+    with mock.patch.object(cv2, 'VideoCapture', replay.capture), instrument_encode(stages), \
+            tempfile.TemporaryDirectory() as spool_dir:
+        spool_path = os.path.join(spool_dir, 'detection_spool.ndjson')
+        sampler.start()
+        if name == 'flask':
+            result = run_flask(args, stages, url, spool_path)
+        elif name == 'pyqt':
+            result = run_qt(args, stages, url, spool_path)
+        else:
+            result = run_streamlit(args, stages, url, spool_path)
+    for seconds in replay.read_seconds:
+        stages.record('capture', seconds)
+    result['peak_rss_mib'] = sampler.stop()
+    result['stages'] = stages.summary()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=('flask', 'pyqt', 'streamlit'),
+                        default=['flask', 'pyqt', 'streamlit'])
+    parser.add_argument('--duration', type=float, default=15.0, help="Seconds per scenario")
+    parser.add_argument('--fps', type=float, default=15.0, help="Replayed camera frame rate")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--synthetic', action='store_true', help="Use synthetic frames instead of the footage")
+    parser.add_argument('--viewers', type=int, default=2, help="MJPEG clients or Streamlit browser sessions")
+    parser.add_argument('--refresh', type=float, default=0.2, help="Streamlit live-view refresh interval")
+    parser.add_argument('--screener', choices=('none', 'hog'), default='none',
+                        help="'none' sends every gated frame to the mock model")
+    parser.add_argument('--latency', type=float, default=0.5, help="Mock model latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--person-rate', type=float, default=0.3)
+    parser.add_argument('--concurrency', type=int, default=1, help="Model requests in flight")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    frames = [] if args.synthetic else load_footage(args.width, args.height)
+    source = 'footage'
+    if not frames:
+        frames, source = synthetic_frames(150, args.width, args.height), 'synthetic'
+
+    server = MockOllamaServer(args.latency, args.jitter, args.person_rate)
+    url = server.start()
+    results = {'config': dict(vars(args), frames=len(frames), source=source), 'scenarios': {}}
+    try:
+        for name in args.scenarios:
+            try:
+                results['scenarios'][name] = run_scenario(name, args, frames, url)
+            except ImportError as e:
+                # PyQt5 is only needed for the desktop front end
+                print(f"Skipping {name}: {e}")
+    finally:
+        server.stop()
+    results['model_requests'] = server.requests
+
+    print(f"{len(frames)} {source} frames at {args.width}x{args.height}, {args.fps:g} fps, "
+          f"mock model {args.latency:g}s")
+    for name, result in results['scenarios'].items():
+        print(f"  {name:<10} {result['fps']:6.1f} fps  peak {result['peak_rss_mib']:7.1f} MiB  "
+              f"log queue {result['log_sink']['queue_depth']}")
+        for stage in STAGES:
+            stats = result['stages'][stage]
+            if stats is None:
+                continue
+            print(f"      {stage:<10} p50 {stats['p50_ms']:8.2f}  p90 {stats['p90_ms']:8.2f}  "
+                  f"p99 {stats['p99_ms']:8.2f} ms  ({stats['count']})")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
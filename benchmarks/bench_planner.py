@@ -0,0 +1,135 @@
+"""Benchmark of what each frame sends to the model: full frame vs. planned crops.
+
+Replays high-resolution synthetic trail-camera frames with a small figure
+walking through part of them, gates them with the motion gate and sends
+every forwarded frame to a mock Ollama server that only "sees" the figure
+when it is tall enough in the image it receives, and whose latency grows
+with the bytes uploaded. Three input modes are compared:
+
+    full        the whole frame at full resolution and default JPEG quality
+    downscaled  the whole frame downscaled to the model width (the old default)
+    planned     the inference planner: motion crops, tiles and a byte budget
+
+For each it reports requests, bytes sent per frame, model latency and the
+recall and false-alarm rate of the figure over the forwarded frames.
+
+    python benchmarks/bench_planner.py --width 2560 --height 1440 --max-kb 96 --json planner.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import functools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import percentiles  # noqa: E402
+from fakes import MockOllamaServer, figure_visible, trail_frames  # noqa: E402
+
+from core.detectors import process_frame  # noqa: E402
+from core.frames import JPEG_QUALITY, Frame  # noqa: E402
+from core.inference import OllamaClient  # noqa: E402
+from core.motion import MotionGate  # noqa: E402
+from core.planner import InferencePlanner  # noqa: E402
+
+MODES = ('full', 'downscaled', 'planned')
+
+
+def create_planner(mode, args, frame_width):
+    if mode == 'full':
+        return InferencePlanner(width=frame_width, max_bytes=None, quality=JPEG_QUALITY, roi=False)
+    if mode == 'downscaled':
+        return InferencePlanner(width=args.model_width, max_bytes=None, roi=False)
+    return InferencePlanner(width=args.model_width, max_bytes=int(args.max_kb * 1024) or None, roi=True,
+                            max_tiles=args.max_tiles)
+
+
+def run_mode(mode, args, frames, truth, client):
+    planner = create_planner(mode, args, frames[0].shape[1])
+    gate = MotionGate(max_staleness=args.staleness)
+    sent, tiles, latencies = [], 0, []
+    hits = misses = false_alarms = negatives = errors = 0
+    for seq, image in enumerate(frames):
+        frame = Frame(image, seq, timestamp=seq / args.fps)
+        if not gate.should_process(image, now=frame.timestamp):
+            continue
+        frame.regions = gate.last_regions
+        start = time.perf_counter()
+        result = process_frame(frame, client=client, planner=planner)
+        latencies.append(time.perf_counter() - start)
+        sent.append(result.plan.bytes)
+        tiles += len(result.plan.tiles)
+        if not result.ok:
+            errors += 1
+            continue
+        person = result.data['person']
+        if truth[seq]:
+            hits += person
+            misses += not person
+        else:
+            negatives += 1
+            false_alarms += person
+    return {
+        'frames_sent': len(sent),
+        'requests': tiles,
+        'errors': errors,
+        'total_mib': sum(sent) / (1024 * 1024),
+        'bytes_per_frame': sum(sent) / len(sent) if sent else 0,
+        'latency': percentiles(latencies),
+        'recall': hits / float(hits + misses) if hits + misses else None,
+        'false_alarm_rate': false_alarms / float(negatives) if negatives else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--frames', type=int, default=90)
+    parser.add_argument('--fps', type=float, default=5.0, help="Frame rate the frames are timestamped at")
+    parser.add_argument('--width', type=int, default=2560)
+    parser.add_argument('--height', type=int, default=1440)
+    parser.add_argument('--figure', type=int, nargs=2, default=(36, 72), metavar=('W', 'H'),
+                        help="Size of the walking figure in full-resolution pixels")
+    parser.add_argument('--min-size', type=int, default=24,
+                        help="Smallest figure height in pixels the mock model recognises")
+    parser.add_argument('--model-width', type=int, default=672)
+    parser.add_argument('--max-kb', type=float, default=96, help="Byte budget per frame in the planned mode")
+    parser.add_argument('--max-tiles', type=int, default=4)
+    parser.add_argument('--staleness', type=float, default=2.0, help="Motion gate's max seconds between frames")
+    parser.add_argument('--latency', type=float, default=0.3, help="Mock model latency per request in seconds")
+    parser.add_argument('--seconds-per-mb', type=float, default=0.5, help="Extra mock latency per MB uploaded")
+    parser.add_argument('--concurrency', type=int, default=2, help="Model requests in flight")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    frames, truth = trail_frames(args.frames, args.width, args.height, tuple(args.figure))
+    server = MockOllamaServer(args.latency, jitter=0.0, see=functools.partial(figure_visible, min_size=args.min_size),
+                              seconds_per_mb=args.seconds_per_mb)
+    url = server.start()
+    results = {'config': vars(args), 'modes': {}}
+    try:
+        for mode in args.modes:
+            client = OllamaClient(host=url, concurrency=args.concurrency, max_pending=args.max_tiles * 4)
+            results['modes'][mode] = run_mode(mode, args, frames, truth, client)
+    finally:
+        server.stop()
+
+    print(f"{args.frames} frames at {args.width}x{args.height}, figure {args.figure[0]}x{args.figure[1]}, "
+          f"mock model {args.latency:g}s + {args.seconds_per_mb:g}s/MB")
+    for mode, result in results['modes'].items():
+        latency = result['latency'] or {'p50_ms': 0.0, 'p90_ms': 0.0}
+        recall = 'n/a' if result['recall'] is None else f"{result['recall']:.0%}"
+        false_alarms = 'n/a' if result['false_alarm_rate'] is None else f"{result['false_alarm_rate']:.0%}"
+        print(f"  {mode:<10} {result['frames_sent']:4d} frames  {result['requests']:4d} requests  "
+              f"{result['bytes_per_frame'] / 1024:8.1f} KiB/frame  "
+              f"p50 {latency['p50_ms']:7.1f}  p90 {latency['p90_ms']:7.1f} ms  "
+              f"recall {recall:>4}  false alarms {false_alarms:>4}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Startup benchmark for the front ends.
+
+Measures the cold-start import time of each front end in a fresh
+interpreter, lists the slowest imports (``python -X importtime``), and
+times the first and repeated Streamlit script runs with ``AppTest``. No
+MongoDB or Ollama server is needed: nothing should connect at startup.
+
+    python benchmarks/bench_startup.py --runs 5 --reruns 10
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def cold_start(module, runs):
+    """Seconds to import ``module`` in a fresh interpreter, one sample per run."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET.format(module=module)], cwd=ROOT,
+                                capture_output=True, text=True, timeout=120)
+        wall = time.perf_counter() - start
+        if result.returncode != 0:
+            return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+        samples.append((float(result.stdout.strip().splitlines()[-1]), wall))
+    return {
+        'import_ms': 1000 * statistics.median(s[0] for s in samples),
+        'process_ms': 1000 * statistics.median(s[1] for s in samples),
+    }
+
+
+def slowest_imports(module, top):
+    """The ``top`` top-level packages with the largest cumulative import time."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True, timeout=120)
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented; only top-level entries carry the whole package's cost
+        if name[1:].startswith(' '):
+            continue
+        package = name.strip().split('.')[0]
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{'module': name, 'ms': us / 1000} for name, us in ranked]
+
+
+def streamlit_reruns(reruns):
+    """First run and median rerun time of streamlit.py under AppTest."""
+    try:
+        # Import the real package before the repo root (which has a streamlit.py) is on the path
+        from streamlit.testing.v1 import AppTest
+    except ImportError as e:
+        return {'error': f"streamlit is not installed: {e}"}
+    sys.path.append(ROOT)
+    os.chdir(ROOT)
+
+    app = AppTest.from_file(os.path.join(ROOT, 'streamlit.py'), default_timeout=60)
+    start = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - start
+
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - start)
+    return {
+        'first_run_ms': 1000 * first,
+        'rerun_ms': 1000 * statistics.median(samples) if samples else None,
+        'exceptions': [str(e.value) for e in app.exception],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="Cold starts per front end")
+    parser.add_argument('--reruns', type=int, default=10, help="Streamlit reruns after the first run")
+    parser.add_argument('--top', type=int, default=8, help="Slowest imports to list per front end")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = {'config': vars(args), 'cold_start': {}, 'imports': {}}
+    for module in ('core.services', 'app', 'pyqt5'):
+        results['cold_start'][module] = cold_start(module, args.runs)
+        failed = 'error' in results['cold_start'][module]
+        results['imports'][module] = [] if failed else slowest_imports(module, args.top)
+    results['streamlit'] = streamlit_reruns(args.reruns)
+
+    print(f"Cold start (median of {args.runs})")
+    for module, stats in results['cold_start'].items():
+        if 'error' in stats:
+            print(f"  {module:<14} failed: {stats['error']}")
+        else:
+            print(f"  {module:<14} {stats['import_ms']:8.1f} ms import  {stats['process_ms']:8.1f} ms process")
+        for entry in results['imports'][module]:
+            print(f"      {entry['module']:<26} {entry['ms']:8.1f} ms")
+
+    stats = results['streamlit']
+    if 'error' in stats:
+        print(f"Streamlit: {stats['error']}")
+    else:
+        print(f"Streamlit  first run {stats['first_run_ms']:.1f} ms  rerun {stats['rerun_ms']:.1f} ms (median of {args.reruns})")
+        for exception in stats['exceptions']:
+            print(f"  exception: {exception}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
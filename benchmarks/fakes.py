@@ -0,0 +1,262 @@
+"""Stand-ins for the camera, the Ollama server and MongoDB used by the benchmarks."""
+import os
+import json
+import time
+import base64
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FOOTAGE_FOLDERS = [os.path.join(ROOT, 'static', 'footages'), os.path.join(ROOT, 'saved_videos')]
+
+PERSON_RESPONSE = "A person is walking along the fence line carrying a bag."
+EMPTY_RESPONSE = "A dark forest clearing with trees and grass; no animals are visible."
+
+
+def structured_response(person):
+    """The answer in the JSON detection schema, as sent when a request asks for a ``format``."""
+    return json.dumps({
+        'description': PERSON_RESPONSE if person else EMPTY_RESPONSE,
+        'labels': [{'label': 'person', 'count': 1}] if person else [],
+        'person': person,
+        'confidence': 0.9 if person else 0.0,
+    })
+
+
+def synthetic_frames(count, width, height):
+    """Noisy gradient frames with a bright block moving across, so motion gating has work to do."""
+    rng = np.random.default_rng(0)
+    base = np.tile(np.linspace(0, 200, width, dtype=np.uint8), (height, 1))
+    frames = []
+    for i in range(count):
+        gray = base + rng.integers(0, 40, (height, width), dtype=np.uint8)
+        x = (i * 8) % max(1, width - 60)
+        gray[height // 3:height // 3 + 60, x:x + 60] = 255
+        frames.append(cv2.merge([gray] * 3))
+    return frames
+
+
+def trail_frames(count, width, height, figure=(36, 72), seed=0):
+    """High-resolution night-vision-like frames with a small red figure walking across the middle third.
+
+    Returns ``(frames, truth)``, where ``truth[i]`` says whether the figure is
+    in frame ``i``; it is absent from the first and last thirds, so both
+    recall and false alarms can be measured. The figure is small enough to
+    shrink to a few pixels when the frame is downscaled for the model, and
+    brighter than the dark scene everywhere along its path, as an animal
+    lit by the camera's illuminator is.
+    """
+    rng = np.random.default_rng(seed)
+    base = np.tile(np.linspace(10, 70, width, dtype=np.uint8), (height, 1))
+    # Foliage-like texture that JPEG has to spend bytes on
+    texture = cv2.resize(rng.integers(0, 60, (height // 8, width // 8), dtype=np.uint8), (width, height))
+    figure_w, figure_h = figure
+    frames, truth = [], []
+    for i in range(count):
+        gray = cv2.add(base, texture)
+        gray = cv2.add(gray, rng.integers(0, 12, (height, width), dtype=np.uint8))
+        image = cv2.merge([gray] * 3)
+        present = count // 3 <= i < 2 * count // 3
+        if present:
+            x = int((i - count // 3) / max(1, count // 3) * (width - figure_w))
+            y = height // 2
+            image[y:y + figure_h, x:x + figure_w] = (120, 120, 255)
+        frames.append(image)
+        truth.append(present)
+    return frames, truth
+
+
+def figure_visible(jpeg, min_size=24):
+    """Whether the red figure of ``trail_frames`` is at least ``min_size`` pixels tall in a JPEG.
+
+    Stands in for the model's eyesight: a figure downscaled to a few pixels
+    is not recognised.
+    """
+    image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return False
+    blue, green, red = cv2.split(image.astype(np.int16))
+    rows = np.nonzero(((red - green > 100) & (red - blue > 100)).any(axis=1))[0]
+    return len(rows) > 0 and rows[-1] - rows[0] + 1 >= min_size
+
+
+def load_footage(width, height, max_frames=300):
+    """Decode the bundled clips into memory, resized to ``width`` x ``height``."""
+    frames = []
+    for folder in FOOTAGE_FOLDERS:
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if name.startswith('.') or os.path.getsize(path) == 0:
+                continue
+            cap = cv2.VideoCapture(path)
+            while len(frames) < max_frames:
+                ret, image = cap.read()
+                if not ret:
+                    break
+                frames.append(cv2.resize(image, (width, height)))
+            cap.release()
+    return frames
+
+
+class CameraReplay:
+    """Frames replayed in a loop at ``fps`` by every capture opened from it.
+
+    Patch ``cv2.VideoCapture`` with ``replay.capture`` to use it as the
+    camera. Frames are decoded up front, so a read costs only a copy, like a
+    driver handing over a buffer; ``read_seconds`` collects the time spent
+    per read, excluding the wait for the next frame.
+    """
+
+    def __init__(self, frames, fps=15.0, paced=True):
+        self.frames = frames
+        self.fps = fps
+        self.paced = paced
+        self.read_seconds = []
+
+    def capture(self, source=None, *args):
+        return FakeCapture(self)
+
+
+class FakeCapture:
+    """The parts of ``cv2.VideoCapture`` the front ends use, reading from a ``CameraReplay``."""
+
+    def __init__(self, replay):
+        self.replay = replay
+        self._index = 0
+        self._next_at = None
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def open(self, source=None, *args):
+        self._opened = True
+        return True
+
+    def set(self, prop, value):
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.replay.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.replay.frames[0].shape[1]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.replay.frames[0].shape[0]
+        return 0.0
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        if self.replay.paced:
+            now = time.perf_counter()
+            if self._next_at is not None and now < self._next_at:
+                time.sleep(self._next_at - now)
+            self._next_at = max(now, self._next_at or now) + 1.0 / self.replay.fps
+        start = time.perf_counter()
+        frames = self.replay.frames
+        image = frames[self._index % len(frames)].copy()
+        self._index += 1
+        self.replay.read_seconds.append(time.perf_counter() - start)
+        return True, image
+
+    def release(self):
+        self._opened = False
+
+
+class MockOllamaServer:
+    """Local HTTP server answering ``/api/chat`` like Ollama after a configurable delay.
+
+    Latency is ``latency`` seconds plus up to ``jitter`` seconds of uniform
+    noise, plus ``seconds_per_mb`` per megabyte of images; ``person_rate`` of
+    the responses mention a person, unless ``see`` is given, in which case
+    ``see(jpeg)`` decides for each image. Requests with a ``format`` get
+    JSON, others prose. ``start()`` returns the base URL to give to
+    ``OllamaClient``.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.1, person_rate=0.3, seed=0, see=None, seconds_per_mb=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.person_rate = person_rate
+        self.see = see
+        self.seconds_per_mb = seconds_per_mb
+        self.requests = 0
+        self.bytes_received = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                images = [base64.b64decode(image) for message in request.get('messages', [])
+                          for image in message.get('images', [])]
+                size = sum(len(image) for image in images)
+                with mock._lock:
+                    mock.requests += 1
+                    mock.bytes_received += size
+                    delay = mock.latency + mock._random.uniform(0, mock.jitter) + mock.seconds_per_mb * size / 1e6
+                    person = mock._random.random() < mock.person_rate
+                if mock.see is not None:
+                    person = any(mock.see(image) for image in images)
+                time.sleep(delay)
+                if request.get('format'):
+                    content = structured_response(person)
+                else:
+                    content = PERSON_RESPONSE if person else EMPTY_RESPONSE
+                body = json.dumps({'model': 'llava', 'message': {'role': 'assistant', 'content': content},
+                                   'done': True}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="mock-ollama").start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class MemoryCollection:
+    """Write-only stand-in for a pymongo collection that just counts documents."""
+
+    def __init__(self, name):
+        self.name = name
+        self.documents = 0
+
+    def bulk_write(self, operations, ordered=True):
+        self.documents += len(operations)
+
+
+class MemoryDatabase(dict):
+    def __missing__(self, name):
+        collection = self[name] = MemoryCollection(name)
+        return collection
+
+
+def memory_database():
+    """A mongomock database when mongomock is installed, otherwise a ``MemoryDatabase``."""
+    try:
+        import mongomock
+    except ImportError:
+        return MemoryDatabase()
+    return mongomock.MongoClient()['benchmark']
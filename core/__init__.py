@@ -0,0 +1 @@
+"""Shared detection pipeline used by the Flask, PyQt5 and Streamlit front ends."""
@@ -0,0 +1,116 @@
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class FrameBroadcaster:
+    """Share one capture/inference/encode pipeline between many viewers.
+
+    The first subscriber starts a pipeline built by ``pipeline_factory``; every
+    encoded JPEG it produces is fanned out to per-client bounded queues. A
+    client that falls behind loses its oldest queued frame instead of stalling
+    the others. Once the last viewer has been gone for ``idle_timeout`` seconds
+    the pipeline is stopped and the camera released.
+    """
+
+    def __init__(self, pipeline_factory, queue_size=2, idle_timeout=5.0):
+        self.pipeline_factory = pipeline_factory
+        self.queue_size = queue_size
+        self.idle_timeout = idle_timeout
+
+        self.pipeline = None
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._last_thread = None
+
+    def subscribe(self):
+        """Yield encoded frames for one viewer until the pipeline ends."""
+        client = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(client)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(self._last_thread,), daemon=True,
+                                                name="broadcaster")
+                self._last_thread = self._thread
+                self._thread.start()
+        try:
+            while True:
+                frame = client.get()
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            with self._lock:
+                self._subscribers.discard(client)
+
+    @property
+    def viewers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _offer(self, client, frame):
+        try:
+            client.put_nowait(frame)
+        except queue.Full:
+            # Slow viewer: drop its oldest frame, keep the newest
+            try:
+                client.get_nowait()
+                self.frames_dropped += 1
+            except queue.Empty:
+                pass
+            client.put_nowait(frame)
+
+    def _pump(self, pipeline):
+        """Fan frames out until the pipeline ends or nobody is watching.
+
+        Returns True when stopped because the broadcaster went idle.
+        """
+        idle_since = None
+        for frame in pipeline.frames():
+            with self._lock:
+                subscribers = list(self._subscribers)
+                if not subscribers:
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since >= self.idle_timeout:
+                        self._thread = None
+                        return True
+                    continue
+                idle_since = None
+            for client in subscribers:
+                self._offer(client, frame)
+                self.frames_sent += 1
+        return False
+
+    def _run(self, previous):
+        # Let the previous pipeline release the camera before reopening it
+        if previous is not None:
+            previous.join()
+
+        pipeline = self.pipeline_factory()
+        self.pipeline = pipeline
+        idle = False
+        try:
+            if pipeline.start():
+                idle = self._pump(pipeline)
+            else:
+                logger.error("Failed to start pipeline for broadcast.")
+        except Exception as e:
+            logger.error(f"Error in broadcaster: {e}")
+        finally:
+            pipeline.stop()
+            pipeline.capture.join(timeout=5)
+            if not idle:
+                with self._lock:
+                    self._thread = None
+                    # Wake viewers still waiting so their responses can end
+                    for client in self._subscribers:
+                        self._offer(client, None)
+            logger.info(f"Broadcast stopped: {pipeline.stats()}, sent {self.frames_sent}, "
+                        f"dropped {self.frames_dropped}")
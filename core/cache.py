@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+
+from core.motion import hamming
+
+logger = logging.getLogger(__name__)
+
+
+class DescriptionCache:
+    """Bounded LRU/TTL cache of model results keyed by perceptual frame hash.
+
+    A lookup matches any entry whose hash is within ``max_distance`` bits of
+    the frame's hash, so the long runs of near-identical frames from a static
+    night-vision camera reuse one description. Entries expire after ``ttl``
+    seconds; the least recently used entry is evicted beyond ``max_entries``.
+    With a ``path`` the cache is loaded at start-up and saved on exit.
+    """
+
+    def __init__(self, max_entries=256, ttl=600.0, max_distance=4, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.path = path
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def _expire(self, now):
+        expired = [key for key, (_, stored_at) in self._entries.items() if now - stored_at > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+    def get(self, frame_hash):
+        """Return the cached value nearest to ``frame_hash``, or None."""
+        with self._lock:
+            self._expire(time.time())
+            best_key, best_distance = None, self.max_distance + 1
+            for key in self._entries:
+                distance = hamming(key, frame_hash)
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+                    if distance == 0:
+                        break
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key][0]
+
+    def put(self, frame_hash, value):
+        with self._lock:
+            self._entries[frame_hash] = (value, time.time())
+            self._entries.move_to_end(frame_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / float(lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load description cache {self.path}: {e}")
+            return
+        with self._lock:
+            for key, entry in entries:
+                self._entries[int(key, 16)] = (entry['value'], entry['stored_at'])
+            self._expire(time.time())
+        logger.info(f"Loaded {len(self._entries)} cached descriptions from {self.path}.")
+
+    def save(self):
+        with self._lock:
+            entries = [[format(key, 'x'), {'value': value, 'stored_at': stored_at}]
+                       for key, (value, stored_at) in self._entries.items()]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save description cache {self.path}: {e}")
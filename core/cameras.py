@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+from core.broadcast import FrameBroadcaster
+from core.config import CAMERAS_FILE
+from core.metrics import metrics
+from core.motion import MotionGate
+from core.pipeline import DetectionPipeline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'scheduler': {'max_in_flight': 1, 'policy': 'round_robin'},
+    'cameras': [{'id': 'cam0', 'name': 'Webcam', 'source': 0, 'width': 640, 'height': 480}],
+}
+
+
+class CameraConfig:
+    """One configured video source: a local device index or an RTSP/HTTP URL."""
+
+    def __init__(self, id, source=0, name=None, width=None, height=None, priority=0):
+        self.id = str(id)
+        # Device indexes may be written as strings in the config file
+        self.source = int(source) if isinstance(source, str) and source.isdigit() else source
+        self.name = name or self.id
+        self.width = width
+        self.height = height
+        self.priority = priority
+
+
+def load_config(path=CAMERAS_FILE):
+    """Read the camera config file, falling back to a single local webcam."""
+    if not os.path.exists(path):
+        logger.info(f"No camera config at {path}, using the default webcam.")
+        return DEFAULT_CONFIG
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except Exception as e:
+        logger.error(f"Failed to read camera config {path}: {e}")
+        return DEFAULT_CONFIG
+    config.setdefault('scheduler', DEFAULT_CONFIG['scheduler'])
+    config.setdefault('cameras', DEFAULT_CONFIG['cameras'])
+    return config
+
+
+def load_cameras(path=CAMERAS_FILE):
+    return [CameraConfig(**camera) for camera in load_config(path)['cameras']]
+
+
+class _CameraQueue:
+    def __init__(self, callback, size, priority):
+        self.callback = callback
+        self.frames = deque(maxlen=size)
+        self.priority = priority
+        self.dropped = 0
+        self.inferences = 0
+        self.in_flight = 0
+        self.last_served = 0.0
+        self.last_activity = 0.0
+        # When the oldest frame still queued arrived; newer frames replacing it keep the wait going
+        self.waiting_since = None
+
+
+class InferenceScheduler:
+    """Share a limited inference backend fairly between cameras.
+
+    Each camera submits frames into its own bounded queue (size 1 means the
+    newest frame always wins). ``max_in_flight`` workers pick the next camera
+    to serve either round-robin (least recently served first) or, with the
+    ``activity`` policy, preferring cameras with a detection in the last
+    ``activity_window`` seconds and then by configured priority. A camera
+    whose frames have waited longer than ``max_wait`` seconds is served
+    next whatever the policy, so busy cameras cannot starve the rest.
+    """
+
+    def __init__(self, process, max_in_flight=1, policy='round_robin', queue_size=1, activity_window=60.0,
+                 max_wait=10.0):
+        if policy not in ('round_robin', 'activity'):
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.process = process
+        self.max_in_flight = max_in_flight
+        self.policy = policy
+        self.queue_size = queue_size
+        self.activity_window = activity_window
+        self.max_wait = max_wait
+
+        self._cond = threading.Condition()
+        self._cameras = {}
+        self._workers = []
+
+    def register(self, camera_id, callback, priority=0):
+        """Route results for ``camera_id`` to ``callback(seq, frame, detection)``."""
+        with self._cond:
+            self._cameras[camera_id] = _CameraQueue(callback, self.queue_size, priority)
+            if not self._workers:
+                for i in range(self.max_in_flight):
+                    worker = threading.Thread(target=self._worker, daemon=True, name=f"inference-{i}")
+                    worker.start()
+                    self._workers.append(worker)
+
+    def unregister(self, camera_id):
+        with self._cond:
+            self._cameras.pop(camera_id, None)
+
+    def submit(self, camera_id, seq, frame):
+        with self._cond:
+            camera = self._cameras.get(camera_id)
+            if camera is None:
+                return
+            if len(camera.frames) == camera.frames.maxlen:
+                camera.dropped += 1
+                metrics.inc('wildcare_frames_dropped_total', camera=camera_id)
+            if not camera.frames:
+                camera.waiting_since = time.monotonic()
+            camera.frames.append((seq, frame))
+            self._cond.notify()
+
+    def mark_activity(self, camera_id):
+        """Record a positive detection, used by the ``activity`` policy."""
+        with self._cond:
+            camera = self._cameras.get(camera_id)
+            if camera is not None:
+                camera.last_activity = time.monotonic()
+
+    def _next(self):
+        ready = [(camera_id, camera) for camera_id, camera in self._cameras.items() if camera.frames]
+        if not ready:
+            return None, None
+        now = time.monotonic()
+        starved = [item for item in ready if now - item[1].waiting_since > self.max_wait]
+        if starved:
+            return min(starved, key=lambda item: item[1].waiting_since)
+        if self.policy == 'activity':
+            key = lambda item: (now - item[1].last_activity > self.activity_window,
+                                -item[1].priority, item[1].last_served)
+        else:
+            key = lambda item: item[1].last_served
+        return min(ready, key=key)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                camera_id, camera = self._next()
+                while camera is None:
+                    self._cond.wait()
+                    camera_id, camera = self._next()
+                seq, frame = camera.frames.popleft()
+                camera.last_served = time.monotonic()
+                camera.waiting_since = camera.last_served if camera.frames else None
+                camera.in_flight += 1
+
+            try:
+                output = self.process(frame)
+            except Exception as e:
+                logger.error(f"Error running inference for camera {camera_id}: {e}")
+                output = None
+
+            with self._cond:
+                camera.in_flight -= 1
+                camera.inferences += 1
+
+            if output is not None:
+                try:
+                    camera.callback(seq, frame, output)
+                except Exception as e:
+                    logger.error(f"Error handling result for camera {camera_id}: {e}")
+
+    def stats(self):
+        """Per-camera queue depth, drops and inference counts."""
+        with self._cond:
+            return {
+                camera_id: {
+                    'queue_depth': len(camera.frames),
+                    'dropped': camera.dropped,
+                    'in_flight': camera.in_flight,
+                    'inferences': camera.inferences,
+                }
+                for camera_id, camera in self._cameras.items()
+            }
+
+
+def build_camera_pipeline(detector, path=CAMERAS_FILE):
+    """``(configs, scheduler, screen)`` for the configured cameras around a detector or cascade.
+
+    A cascade's cheap stage runs per camera as ``screen``; only its
+    confirmation stage goes through the shared scheduler.
+    """
+    config = load_config(path)
+    if hasattr(detector, 'screen'):
+        scheduler = InferenceScheduler(detector.confirm, **config['scheduler'])
+        screen = detector.screen
+    else:
+        scheduler = InferenceScheduler(detector.detect, **config['scheduler'])
+        screen = None
+    return [CameraConfig(**camera) for camera in config['cameras']], scheduler, screen
+
+
+class CameraRegistry:
+    """Config-driven set of cameras, each with its own capture and broadcaster."""
+
+    def __init__(self, configs, scheduler, screen=None, on_result=None, gate_factory=MotionGate,
+                 recorder_factory=None, on_stop=None):
+        self.configs = {config.id: config for config in configs}
+        self.scheduler = scheduler
+        self.screen = screen
+        self.on_result = on_result
+        self.on_stop = on_stop
+        self.gate_factory = gate_factory
+        # Recorders outlive pipeline restarts so a clip in progress is not cut
+        self.recorders = {camera_id: recorder_factory(config) for camera_id, config in self.configs.items()
+                          if recorder_factory is not None}
+        self.broadcasters = {camera_id: FrameBroadcaster(self._factory(config))
+                             for camera_id, config in self.configs.items()}
+
+    @classmethod
+    def from_config(cls, detector, path=CAMERAS_FILE, on_result=None, recorder_factory=None, on_stop=None):
+        """Build cameras from the config file around a detector or detector cascade."""
+        configs, scheduler, screen = build_camera_pipeline(detector, path)
+        return cls(configs, scheduler, screen, on_result, recorder_factory=recorder_factory, on_stop=on_stop)
+
+    def _factory(self, config):
+        def create_pipeline():
+            return DetectionPipeline(self.scheduler, config.id, source=config.source, gate=self.gate_factory(),
+                                     screen=self.screen, recorder=self.recorders.get(config.id),
+                                     width=config.width, height=config.height, priority=config.priority,
+                                     on_result=self.on_result, on_stop=self.on_stop)
+        return create_pipeline
+
+    @property
+    def default_id(self):
+        return next(iter(self.configs))
+
+    def get(self, camera_id=None):
+        """Return the broadcaster for ``camera_id`` (or the first camera), or None."""
+        return self.broadcasters.get(camera_id or self.default_id)
+
+    def stats(self):
+        queues = self.scheduler.stats()
+        cameras = []
+        for camera_id, config in self.configs.items():
+            broadcaster = self.broadcasters[camera_id]
+            cameras.append({
+                'id': camera_id,
+                'name': config.name,
+                'viewers': broadcaster.viewers,
+                'running': broadcaster.pipeline is not None and broadcaster.pipeline.running,
+                'queue': queues.get(camera_id),
+            })
+        return cameras
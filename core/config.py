@@ -0,0 +1,35 @@
+# Settings shared by the front ends, read from the environment once at import
+import os
+
+MONGO_URI = os.environ.get('WILDCARE_MONGO_URI', 'mongodb://127.0.0.1:27017')
+MONGO_DB = os.environ.get('WILDCARE_MONGO_DB', 'wildlife_conservation')
+MONGO_TIMEOUT_MS = int(os.environ.get('WILDCARE_MONGO_TIMEOUT_MS', '5000'))
+MONGO_POOL_SIZE = int(os.environ.get('WILDCARE_MONGO_POOL_SIZE', '20'))
+
+LOG_COLLECTION = 'detection_logs'
+STATS_COLLECTION = 'detection_stats'
+FOOTAGE_COLLECTION = 'footage'
+
+# IANA zone (e.g. Asia/Kolkata) for showing and grouping event times; the server's own by default
+TIMEZONE = os.environ.get('WILDCARE_TIMEZONE')
+
+OLLAMA_HOST = os.environ.get('OLLAMA_HOST', 'http://127.0.0.1:11434')
+
+# What each frame sends to the model (see core/planner.py): width of a downscaled full frame,
+# JPEG byte budget per frame, cropping to motion regions and the most tiles per frame
+MODEL_WIDTH = int(os.environ.get('WILDCARE_MODEL_WIDTH', '672'))
+MODEL_MAX_BYTES = int(float(os.environ.get('WILDCARE_MODEL_MAX_KB', '96')) * 1024) or None
+MODEL_ROI = os.environ.get('WILDCARE_MODEL_ROI', '1') not in ('0', 'false', 'no')
+MODEL_MAX_TILES = int(os.environ.get('WILDCARE_MODEL_MAX_TILES', '4'))
+
+CAMERAS_FILE = os.environ.get('WILDCARE_CAMERAS', 'cameras.json')
+CACHE_FILE = os.environ.get('WILDCARE_CACHE_FILE', 'description_cache.json')
+SPOOL_FILE = os.environ.get('WILDCARE_SPOOL_FILE', 'detection_spool.ndjson')
+
+# Footage retention; unset limits are not enforced
+STORAGE_MAX_GB = float(os.environ['WILDCARE_STORAGE_MAX_GB']) if os.environ.get('WILDCARE_STORAGE_MAX_GB') else None
+# Age-based deletion of unlinked footage is opt-in
+STORAGE_MAX_AGE_DAYS = (int(os.environ['WILDCARE_STORAGE_MAX_AGE_DAYS'])
+                        if os.environ.get('WILDCARE_STORAGE_MAX_AGE_DAYS') else None)
+TRANSCODE_AFTER_DAYS = int(os.environ.get('WILDCARE_TRANSCODE_AFTER_DAYS', '2'))
+FFMPEG = os.environ.get('WILDCARE_FFMPEG', 'ffmpeg')
@@ -0,0 +1,40 @@
+import logging
+import threading
+
+from pymongo import MongoClient
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide pooled MongoClient, created on first use.
+
+    Creating the client does not contact the server, so importing a front end
+    never blocks on MongoDB; the first query does. Safe to wrap in
+    ``st.cache_resource`` or call from any thread.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=config.MONGO_TIMEOUT_MS,
+                                  maxPoolSize=config.MONGO_POOL_SIZE, connect=False)
+        return _client
+
+
+def get_db():
+    return get_client()[config.MONGO_DB]
+
+
+def ping():
+    """True if MongoDB answers within the server selection timeout."""
+    try:
+        get_client().admin.command('ping')
+        return True
+    except Exception as e:
+        logger.error(f"MongoDB is not reachable: {e}")
+        return False
@@ -0,0 +1,336 @@
+import time
+import logging
+import threading
+
+import cv2
+
+from core.frames import JPEG_QUALITY, as_frame
+from core.inference import get_client
+from core.metrics import metrics
+from core.planner import combine_results, get_planner
+from core.schema import DETECTION_SCHEMA, build_prompt, parse_response
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT = "What is in the video(the camera is a night vision camera so ignore the resolution)?"
+
+# Starting quality of a full-frame JPEG sent to the model (its width is core.config.MODEL_WIDTH);
+# core/planner.py may crop the frame instead or lower the quality to fit its byte budget
+MODEL_JPEG_QUALITY = JPEG_QUALITY
+
+
+def process_frame(frame, prompt=DEFAULT_PROMPT, options=None, client=None, planner=None):
+    """Send frame to LLaVA via the shared Ollama client and return an ``InferenceResult``.
+
+    The planner decides what is sent: the downscaled frame, or crops of
+    its motion regions as concurrent requests whose answers are combined.
+    The model is asked to answer in the JSON detection schema; ``result.data``
+    holds the validated fields, or what the fallback parser found in the text
+    when the answer is not valid JSON. ``result.plan`` is the ``InputPlan``.
+    """
+    plan = (planner or get_planner()).plan(as_frame(frame))
+    metrics.inc('wildcare_model_bytes_total', plan.bytes)
+    metrics.inc('wildcare_model_tiles_total', len(plan.tiles))
+
+    start = time.perf_counter()
+    prompt = build_prompt(prompt)
+    results = (client or get_client()).chat_many([(tile, prompt) for tile in plan.tiles], options,
+                                                 format=DETECTION_SCHEMA)
+    metrics.stage('inference', time.perf_counter() - start)
+    for result in results:
+        if result.ok:
+            result.data = parse_response(result.text)
+    result = combine_results(results)
+    result.plan = plan
+    if not result.ok:
+        logger.error(f"Error processing frame with LLaVA: {result.status}: {result.error}")
+    return result
+
+
+class Detection:
+    """Outcome of running a detector on one frame.
+
+    ``boxes`` are ``(x, y, w, h)`` candidate regions in frame coordinates;
+    ``description`` and ``labels`` (``{'label', 'count'}`` dicts) are only set
+    by stages that describe the scene. ``confidence`` is the stage's own
+    0-1 score; a confirmed cascade detection keeps the screening stage's
+    score (e.g. an unbounded HOG SVM weight) in ``screen_confidence``. When the
+    stage could not run (e.g. the model host timed out) ``error`` is set, with
+    the model call's ``status`` (e.g. ``timeout``) when there was one, and
+    the result says nothing either way about a person being present.
+    """
+
+    def __init__(self, person=False, boxes=(), confidence=0.0, description=None, stage=None, error=None,
+                 labels=(), screen_confidence=None, status=None):
+        self.person = person
+        self.boxes = list(boxes)
+        self.confidence = confidence
+        self.screen_confidence = screen_confidence
+        self.description = description
+        self.labels = list(labels)
+        self.stage = stage
+        self.error = error
+        self.status = status
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        return {'person': self.person, 'confidence': self.confidence, 'description': self.description,
+                'labels': self.labels, 'stage': self.stage}
+
+    @classmethod
+    def from_dict(cls, data):
+        # Entries cached before labels were stored have none
+        return cls(person=data['person'], confidence=data['confidence'], description=data['description'],
+                   labels=data.get('labels', ()), stage=data['stage'])
+
+
+class Detector:
+    """Base class for detection stages."""
+
+    name = 'detector'
+
+    def detect(self, frame):
+        raise NotImplementedError
+
+
+class HogPersonDetector(Detector):
+    """OpenCV's built-in HOG + linear SVM pedestrian detector."""
+
+    name = 'hog'
+
+    def __init__(self, min_confidence=0.5, width=400, win_stride=(8, 8)):
+        self.min_confidence = min_confidence
+        self.width = width
+        self.win_stride = win_stride
+        self._local = threading.local()
+
+    @property
+    def hog(self):
+        # HOGDescriptor is not safe to share between threads
+        hog = getattr(self._local, 'hog', None)
+        if hog is None:
+            hog = cv2.HOGDescriptor()
+            hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+            self._local.hog = hog
+        return hog
+
+    def detect(self, frame):
+        frame = as_frame(frame).image
+        scale = min(1.0, self.width / float(frame.shape[1]))
+        small = cv2.resize(frame, None, fx=scale, fy=scale) if scale < 1.0 else frame
+        rects, weights = self.hog.detectMultiScale(small, winStride=self.win_stride, padding=(8, 8), scale=1.05)
+
+        boxes, confidence = [], 0.0
+        for (x, y, w, h), weight in zip(rects, weights):
+            weight = float(weight)
+            if weight < self.min_confidence:
+                continue
+            boxes.append(tuple(int(v / scale) for v in (x, y, w, h)))
+            confidence = max(confidence, weight)
+        return Detection(person=bool(boxes), boxes=boxes, confidence=confidence, stage=self.name)
+
+
+class DnnPersonDetector(Detector):
+    """SSD-style person detector run on the CPU with ``cv2.dnn``.
+
+    Works with any model whose output is the usual ``[1, 1, N, 7]`` SSD
+    layout, e.g. MobileNet-SSD (Caffe, ``person_class=15``) or an SSD exported
+    to ONNX with COCO labels (``person_class=1``).
+    """
+
+    name = 'dnn'
+
+    def __init__(self, model_path, config_path=None, person_class=15, min_confidence=0.5,
+                 input_size=(300, 300), scale=0.007843, mean=(127.5, 127.5, 127.5)):
+        self.model_path = model_path
+        self.config_path = config_path
+        self.person_class = person_class
+        self.min_confidence = min_confidence
+        self.input_size = input_size
+        self.scale = scale
+        self.mean = mean
+        self._local = threading.local()
+
+    @property
+    def net(self):
+        net = getattr(self._local, 'net', None)
+        if net is None:
+            if self.config_path:
+                net = cv2.dnn.readNet(self.model_path, self.config_path)
+            else:
+                net = cv2.dnn.readNet(self.model_path)
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self._local.net = net
+        return net
+
+    def detect(self, frame):
+        frame = as_frame(frame).image
+        height, width = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(frame, self.scale, self.input_size, self.mean)
+        net = self.net
+        net.setInput(blob)
+        output = net.forward()
+
+        boxes, confidence = [], 0.0
+        for detection in output.reshape(-1, 7):
+            score = float(detection[2])
+            if int(detection[1]) != self.person_class or score < self.min_confidence:
+                continue
+            x1, y1, x2, y2 = (detection[3:7] * [width, height, width, height]).astype(int)
+            boxes.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
+            confidence = max(confidence, score)
+        return Detection(person=bool(boxes), boxes=boxes, confidence=confidence, stage=self.name)
+
+
+class LlavaDetector(Detector):
+    """Describe the frame with LLaVA and read the person flag and labels from its answer."""
+
+    name = 'llava'
+
+    def __init__(self, prompt=DEFAULT_PROMPT, options=None, client=None, planner=None):
+        self.prompt = prompt
+        self.options = options
+        self.client = client
+        self.planner = planner
+
+    def detect(self, frame):
+        result = process_frame(frame, self.prompt, self.options, self.client, self.planner)
+        if not result.ok:
+            return Detection(stage=self.name, error=f"{result.status}: {result.error}", status=result.status)
+        data = result.data
+        return Detection(person=data['person'], confidence=data['confidence'],
+                         description=data['description'] or result.text, labels=data['labels'], stage=self.name)
+
+
+class CachedDetector(Detector):
+    """Reuse a detector's result for frames that look the same as a recent one.
+
+    Frames are keyed by their difference hash; near-duplicates within the
+    cache's Hamming tolerance return the cached result without encoding the
+    frame or calling the wrapped detector. Failed results are not cached.
+    """
+
+    def __init__(self, detector, cache):
+        self.detector = detector
+        self.cache = cache
+        self.name = detector.name
+
+    def detect(self, frame):
+        frame = as_frame(frame)
+        frame_hash = frame.dhash()
+        cached = self.cache.get(frame_hash)
+        if cached is not None:
+            return Detection.from_dict(cached)
+        detection = self.detector.detect(frame)
+        if detection.ok:
+            self.cache.put(frame_hash, detection.to_dict())
+        return detection
+
+
+class StageStats:
+    """Call count and latency for one cascade stage."""
+
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def record(self, seconds):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.last_seconds = seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'avg_ms': 1000 * self.total_seconds / self.calls if self.calls else 0.0,
+            'max_ms': 1000 * self.max_seconds,
+            'last_ms': 1000 * self.last_seconds,
+        }
+
+
+class CascadeDetector(Detector):
+    """Run a cheap screening stage on every frame and confirm candidates with LLaVA.
+
+    ``screen`` and ``confirm`` are exposed separately so a pipeline can run the
+    screening stage per camera and queue only the candidates for the shared
+    confirmation backend; ``detect`` runs both synchronously.
+    """
+
+    name = 'cascade'
+
+    def __init__(self, screener, confirmer):
+        self.screener = screener
+        self.confirmer = confirmer
+        self.frames = 0
+        self.escalations = 0
+        self.stage_stats = {screener.name: StageStats(), confirmer.name: StageStats()}
+        self._lock = threading.Lock()
+
+    def _timed(self, detector, frame):
+        start = time.perf_counter()
+        detection = detector.detect(frame)
+        elapsed = time.perf_counter() - start
+        if detector is self.screener:
+            # The confirmation stage is timed per model call in process_frame
+            metrics.stage('screen', elapsed)
+        with self._lock:
+            self.stage_stats[detector.name].record(elapsed)
+        return detection
+
+    def screen(self, frame):
+        """Run the cheap stage; ``person`` on the result means escalate."""
+        detection = self._timed(self.screener, frame)
+        with self._lock:
+            self.frames += 1
+            if detection.person:
+                self.escalations += 1
+        return detection
+
+    def confirm(self, frame, candidate=None):
+        """Run the confirmation stage, keeping the candidate's boxes and screening score."""
+        detection = self._timed(self.confirmer, frame)
+        if candidate is not None:
+            detection.boxes = candidate.boxes
+            detection.screen_confidence = candidate.confidence
+        return detection
+
+    def detect(self, frame):
+        frame = as_frame(frame)
+        candidate = self.screen(frame)
+        if not candidate.person:
+            return candidate
+        return self.confirm(frame, candidate)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'frames': self.frames,
+                'escalations': self.escalations,
+                'escalation_rate': self.escalations / float(self.frames) if self.frames else 0.0,
+                'stages': {name: stats.as_dict() for name, stats in self.stage_stats.items()},
+            }
+        if isinstance(self.confirmer, CachedDetector):
+            stats['cache'] = self.confirmer.cache.stats()
+        return stats
+
+
+def create_detector(screener='hog', model_path=None, cache=None, **llava_options):
+    """Build the default cascade; ``screener=None`` sends every frame to LLaVA.
+
+    ``cache`` is an optional ``DescriptionCache`` placed in front of LLaVA.
+    """
+    confirmer = LlavaDetector(**llava_options)
+    if cache is not None:
+        confirmer = CachedDetector(confirmer, cache)
+    if screener is None:
+        return confirmer
+    if screener == 'dnn':
+        return CascadeDetector(DnnPersonDetector(model_path), confirmer)
+    return CascadeDetector(HogPersonDetector(), confirmer)
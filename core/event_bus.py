@@ -0,0 +1,50 @@
+import time
+import threading
+from collections import deque
+
+
+class EventBus:
+    """In-process publish/subscribe for detection events, with a replay buffer.
+
+    Every published event gets an increasing integer id and the last
+    ``history`` events are kept, so a subscriber that reconnects with the
+    last id it saw gets exactly what it missed. Ids start from the current
+    time in milliseconds, so they keep increasing across restarts and an id
+    from before a restart reads as "missed events" rather than "up to date".
+    """
+
+    def __init__(self, history=1000):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._last_id = int(time.time() * 1000)
+
+    @property
+    def last_id(self):
+        with self._cond:
+            return self._last_id
+
+    def publish(self, type, data):
+        """Add an event and wake every subscriber; return its id."""
+        with self._cond:
+            self._last_id += 1
+            self._events.append((self._last_id, type, data))
+            self._cond.notify_all()
+            return self._last_id
+
+    def _since(self, after):
+        events = [event for event in self._events if event[0] > after]
+        # Events between ``after`` and the oldest buffered one were dropped
+        oldest = self._events[0][0] if self._events else self._last_id + 1
+        complete = after >= self._last_id or oldest <= after + 1
+        return events, complete
+
+    def read(self, after, timeout=None):
+        """Wait up to ``timeout`` for events newer than ``after``.
+
+        Returns ``(events, complete)``; ``complete`` is False when some
+        events after ``after`` are no longer buffered, and the subscriber
+        should reload its state from the database.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > after, timeout)
+            return self._since(after)
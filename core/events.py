@@ -0,0 +1,231 @@
+import time
+import logging
+import threading
+from collections import deque
+
+from core.logs import SCHEMA_VERSION, as_local, to_json, utc_datetime
+from core.metrics import metrics
+from core.stats import record_event
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionEvent:
+    """One continuous sighting on a camera, from first confirmation to close."""
+
+    def __init__(self, camera_id, started_at):
+        self.id = None
+        self.camera_id = camera_id
+        self.started_at = started_at
+        self.last_positive = started_at
+        self.ended_at = None
+        self.frame_count = 0
+        self.positive_count = 0
+        self.peak_confidence = 0.0
+        self.description = None
+        # Most individuals of each label seen in any one frame
+        self.counts = {}
+        self._best_confidence = -1.0
+
+    @property
+    def duration(self):
+        return (self.ended_at or self.last_positive) - self.started_at
+
+    @property
+    def labels(self):
+        return sorted(self.counts)
+
+    def add(self, detection, now):
+        self.frame_count += 1
+        for item in detection.labels:
+            self.counts[item['label']] = max(self.counts.get(item['label'], 0), item['count'])
+        if not detection.person:
+            return
+        self.positive_count += 1
+        self.last_positive = now
+        self.peak_confidence = max(self.peak_confidence, detection.confidence)
+        # Keep the description from the most confident frame that has one
+        if detection.description and detection.confidence > self._best_confidence:
+            self.description = detection.description
+            self._best_confidence = detection.confidence
+
+
+class EventTracker:
+    """Turn per-frame detections into debounced detection events.
+
+    An event opens once ``open_after`` positive frames have been seen within
+    ``window`` seconds and closes after ``close_after`` seconds without a
+    positive frame. The close is decided by the next detection of any kind,
+    so a positive frame after a longer gap first closes the old event and
+    then counts towards a new one. ``on_open(event)`` and ``on_close(event)`` fire only on
+    those transitions; ``on_open`` may return an id that is kept on the event.
+    ``on_update(event)`` fires while an event is open whenever a more
+    confident frame changes its description. Failed detections are ignored
+    rather than counted as negatives.
+    """
+
+    def __init__(self, camera_id=None, open_after=2, window=10.0, close_after=10.0, on_open=None, on_close=None,
+                 on_update=None):
+        self.camera_id = camera_id
+        self.open_after = open_after
+        self.window = window
+        self.close_after = close_after
+        self.on_open = on_open
+        self.on_close = on_close
+        self.on_update = on_update
+
+        self.event = None
+        self.events_opened = 0
+        self.events_closed = 0
+
+        self._positives = deque()
+        self._lock = threading.Lock()
+
+    def update(self, detection, now=None):
+        """Feed one detection; return the last of ``'open'``, ``'update'``, ``'close'`` it caused, or None."""
+        if not detection.ok:
+            return None
+        now = time.time() if now is None else now
+
+        transitions = []
+        with self._lock:
+            event = self.event
+            if event is not None and now - event.last_positive >= self.close_after:
+                # The sighting ended before this frame, whatever the frame shows
+                event.ended_at = event.last_positive
+                self.event = None
+                self.events_closed += 1
+                transitions.append(('close', event))
+                event = None
+
+            if event is None:
+                if detection.person:
+                    self._positives.append(now)
+                    while self._positives and now - self._positives[0] > self.window:
+                        self._positives.popleft()
+                    if len(self._positives) >= self.open_after:
+                        event = self.event = DetectionEvent(self.camera_id, self._positives[0])
+                        self._positives.clear()
+                        event.add(detection, now)
+                        self.events_opened += 1
+                        transitions.append(('open', event))
+            else:
+                description = event.description
+                event.add(detection, now)
+                if event.description != description:
+                    transitions.append(('update', event))
+
+        for transition, event in transitions:
+            self._fire(transition, event)
+        return transitions[-1][0] if transitions else None
+
+    def close(self, now=None):
+        """Close the open event, e.g. when the camera stops."""
+        with self._lock:
+            event = self.event
+            if event is None:
+                return
+            event.ended_at = event.last_positive if now is None else now
+            self.event = None
+            self.events_closed += 1
+        self._fire('close', event)
+
+    def _fire(self, transition, event):
+        metrics.inc('wildcare_event_transitions_total', camera=self.camera_id, transition=transition)
+        callback = {'open': self.on_open, 'update': self.on_update, 'close': self.on_close}[transition]
+        if callback is None:
+            return
+        try:
+            result = callback(event)
+            if transition == 'open' and result is not None:
+                event.id = result
+        except Exception as e:
+            logger.error(f"Error handling detection event {transition}: {e}")
+
+
+class EventLog:
+    """Write detection events to MongoDB: one insert on open, one update on close.
+
+    Documents use the datetime schema described in ``core.logs``. When a ``rollups`` collection is given, each closed event is also counted
+    in the pre-aggregated statistics served by /api/stats. When a ``bus`` is
+    given, opens, description updates and closes are published to it in the
+    /api/logs JSON shape (updates and closes carry only the changed fields).
+    """
+
+    def __init__(self, collection, rollups=None, bus=None):
+        self.collection = collection
+        self.rollups = rollups
+        self.bus = bus
+
+    def _publish(self, type, data):
+        if self.bus is not None:
+            self.bus.publish(type, data)
+
+    def open(self, event):
+        document = {
+            'start': utc_datetime(event.started_at),
+            'end': None,
+            'meta': {'camera': event.camera_id},
+            'description': event.description,
+            'person': True,
+            'labels': event.labels,
+            'counts': dict(event.counts),
+            'schema_version': SCHEMA_VERSION,
+        }
+        result = self.collection.insert_one(dict(document))
+        self._publish('opened', to_json(dict(document, _id=result.inserted_id)))
+        logger.info(f"Detection event opened on camera {event.camera_id}.")
+        return result.inserted_id
+
+    def update(self, event):
+        """Publish a better description; MongoDB gets it when the event closes."""
+        if event.id is None:
+            return
+        self._publish('updated', {'id': str(event.id), 'camera': event.camera_id, 'description': event.description,
+                                  'labels': event.labels})
+
+    def close(self, event):
+        if event.id is None:
+            return
+        ended = utc_datetime(event.ended_at)
+        self.collection.update_one(
+            {'_id': event.id},
+            {'$set': {
+                'end': ended,
+                'description': event.description,
+                'duration': round(event.duration, 1),
+                'frame_count': event.frame_count,
+                'peak_confidence': event.peak_confidence,
+                'labels': event.labels,
+                'counts': dict(event.counts),
+            }}
+        )
+        if self.rollups is not None:
+            record_event(self.rollups, event.id, event.started_at, event.camera_id, round(event.duration, 1))
+        self._publish('closed', {'id': str(event.id), 'camera': event.camera_id,
+                                'close_time': as_local(ended).strftime('%H:%M:%S'), 'end': ended.isoformat(),
+                                'description': event.description, 'labels': event.labels,
+                                'duration': round(event.duration, 1)})
+        logger.info(f"Detection event closed on camera {event.camera_id} after {event.duration:.1f}s.")
+
+
+def create_tracker(event_log, camera_id, recorder=None, **options):
+    """EventTracker that logs to ``event_log`` and drives ``recorder`` on open/close.
+
+    The recorder is started before the insert so footage is kept even if
+    MongoDB is unavailable, then told the event id to link the clip to.
+    """
+    def on_open(event):
+        if recorder is not None:
+            recorder.start()
+        event_id = event_log.open(event)
+        if recorder is not None:
+            recorder.start(event_id)
+        return event_id
+
+    def on_close(event):
+        if recorder is not None:
+            recorder.stop()
+        event_log.close(event)
+
+    return EventTracker(camera_id, on_open=on_open, on_close=on_close, on_update=event_log.update, **options)
@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import logging
+import datetime
+import threading
+
+import cv2
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov')
+THUMBNAIL_FOLDER = '.thumbnails'
+THUMBNAIL_WIDTH = 320
+
+# footage_2025-03-16_14-27-26.mp4 or footage_2025-03-16_14-27-26_cam0.mp4
+FILENAME_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})_(\d{2}-\d{2}-\d{2})(?:_([\w-]+))?\.\w+$')
+
+
+def parse_filename(filename):
+    """Start time and camera id encoded in a recorder filename, or (None, None)."""
+    match = FILENAME_PATTERN.search(filename)
+    if not match:
+        return None, None
+    started = datetime.datetime.strptime(f"{match.group(1)} {match.group(2)}", '%Y-%m-%d %H-%M-%S')
+    return started, match.group(3)
+
+
+def probe(path, thumbnail_path=None):
+    """Duration, codec and frame size of a clip, writing a thumbnail of its middle frame."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        info = {
+            'fps': round(fps, 2),
+            'frames': frames,
+            'duration': round(frames / fps, 1) if fps else None,
+            'codec': ''.join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip('\x00 ') or None,
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'thumbnail': None,
+        }
+        if thumbnail_path is not None:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frames // 2)
+            ret, image = cap.read()
+            if ret:
+                height, width = image.shape[:2]
+                size = (THUMBNAIL_WIDTH, max(1, height * THUMBNAIL_WIDTH // width))
+                if cv2.imwrite(thumbnail_path, cv2.resize(image, size, interpolation=cv2.INTER_AREA)):
+                    info['thumbnail'] = os.path.basename(thumbnail_path)
+        return info
+    finally:
+        cap.release()
+
+
+class FootageCatalog:
+    """MongoDB index of the clips in one footage folder.
+
+    Each clip has one document with its path, size, duration, codec, start
+    time and camera, plus a JPEG thumbnail under ``folder/.thumbnails``, so
+    listing footage never opens the video files. The index is kept current by
+    ``add`` (hooked into the clip recorder) and by ``scan``, which picks up
+    files added, changed or deleted behind its back. Empty files are skipped.
+    """
+
+    def __init__(self, collection, folder):
+        self.collection = collection
+        self.folder = folder
+        self.thumbnail_folder = os.path.join(folder, THUMBNAIL_FOLDER)
+        self._scan_lock = threading.Lock()
+
+    def ensure_indexes(self):
+        try:
+            self.collection.create_index([('path', pymongo.ASCENDING)], unique=True, name='path')
+            self.collection.create_index([('folder', pymongo.ASCENDING), ('started', pymongo.DESCENDING)],
+                                         name='folder_started')
+        except Exception as e:
+            logger.error(f"Failed to create footage indexes: {e}")
+
+    def add(self, path, camera=None, started=None):
+        """Index (or re-index) one clip; returns its document, or None if it was skipped."""
+        filename = os.path.basename(path)
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            logger.error(f"Failed to index footage {path}: {e}")
+            return None
+        if stat.st_size == 0:
+            logger.warning(f"Skipping empty footage file {path}")
+            return None
+
+        os.makedirs(self.thumbnail_folder, exist_ok=True)
+        info = probe(path, os.path.join(self.thumbnail_folder, f"{os.path.splitext(filename)[0]}.jpg"))
+        if info is None:
+            logger.warning(f"Skipping unreadable footage file {path}")
+            return None
+
+        parsed_started, parsed_camera = parse_filename(filename)
+        started = started or parsed_started or datetime.datetime.fromtimestamp(stat.st_mtime)
+        document = dict(info,
+                        path=path,
+                        folder=self.folder,
+                        filename=filename,
+                        size=stat.st_size,
+                        mtime=stat.st_mtime,
+                        started=started,
+                        date=started.strftime('%Y-%m-%d'),
+                        camera=camera or parsed_camera)
+        self.collection.replace_one({'path': path}, document, upsert=True)
+        return document
+
+    def remove(self, path):
+        self.collection.delete_one({'path': path})
+
+    def on_clip(self, refs, clip):
+        """``ClipRecorder`` callback that indexes each clip as soon as it is finished."""
+        self.add(clip['path'], camera=clip['camera'], started=clip['started'])
+
+    def scan(self):
+        """Bring the index in line with the folder; returns the number of clips (re)indexed."""
+        with self._scan_lock:
+            indexed = {doc['path']: doc for doc in self.collection.find({'folder': self.folder},
+                                                                         {'path': 1, 'size': 1, 'mtime': 1})}
+            present = set()
+            added = 0
+            for filename in sorted(os.listdir(self.folder)):
+                path = os.path.join(self.folder, filename)
+                if filename.startswith('.') or not filename.lower().endswith(VIDEO_EXTENSIONS):
+                    continue
+                stat = os.stat(path)
+                # Empty files (e.g. from a crashed recording) are never listed
+                if stat.st_size == 0:
+                    continue
+                present.add(path)
+                doc = indexed.get(path)
+                if doc is not None and doc.get('size') == stat.st_size and doc.get('mtime') == stat.st_mtime:
+                    continue
+                if self.add(path) is not None:
+                    added += 1
+
+            removed = [path for path in indexed if path not in present]
+            if removed:
+                self.collection.delete_many({'path': {'$in': removed}})
+            if added or removed:
+                logger.info(f"Footage index for {self.folder}: {added} clip(s) indexed, {len(removed)} removed.")
+            return added
+
+    def start_scanner(self, interval=300.0):
+        """Create the indexes, then scan now and every ``interval`` seconds on a background thread."""
+        def run():
+            self.ensure_indexes()
+            while True:
+                try:
+                    self.scan()
+                except Exception as e:
+                    logger.error(f"Footage scan of {self.folder} failed: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=run, daemon=True, name=f"footage-scan-{self.folder}").start()
+
+    def find(self, date=None, camera=None):
+        """Indexed clips in this folder, newest first."""
+        query = {'folder': self.folder}
+        if date:
+            query['date'] = date
+        if camera:
+            query['camera'] = camera
+        return list(self.collection.find(query, {'_id': 0}).sort('started', pymongo.DESCENDING))
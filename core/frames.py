@@ -0,0 +1,99 @@
+import time
+import threading
+
+import cv2
+import numpy as np
+
+from core.metrics import metrics
+from core.motion import dhash
+
+# Shared by the stream and the model so a frame that needs no resizing for
+# the model is encoded once for both
+JPEG_QUALITY = 80
+
+_scratch = threading.local()
+
+
+def _scratch_buffer(shape, dtype=np.uint8):
+    """Per-thread buffer reused across frames for intermediate images."""
+    buffers = getattr(_scratch, 'buffers', None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buffer = buffers.get((shape, dtype))
+    if buffer is None:
+        buffer = buffers[(shape, dtype)] = np.empty(shape, dtype)
+    return buffer
+
+
+class Frame:
+    """A captured BGR frame whose derived forms are computed at most once.
+
+    The pixel array is never copied. ``jpeg`` encodes lazily and caches the
+    bytes per (quality, width), so the MJPEG stream, every viewer and any
+    other consumer asking for the same format share one encode; the model
+    asks for a downscaled variant, which is resized into a reused per-thread
+    buffer before encoding. ``rgb`` does the BGR->RGB conversion for display
+    once. ``regions`` are the boxes where the motion gate saw change in a
+    frame it forwarded, whatever it forwarded it for (motion, a scene change
+    or staleness); empty when no small regions stood out, and None when the
+    frame did not go through a gate.
+    """
+
+    __slots__ = ('image', 'seq', 'timestamp', 'regions', '_jpeg', '_rgb', '_hash', '_lock')
+
+    def __init__(self, image, seq=0, timestamp=None):
+        self.image = image
+        self.seq = seq
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.regions = None
+        self._jpeg = {}
+        self._rgb = None
+        self._hash = None
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def jpeg(self, quality=JPEG_QUALITY, width=None):
+        """JPEG bytes of the frame, optionally downscaled to ``width`` pixels wide."""
+        height, full_width = self.image.shape[:2]
+        if width is not None and width >= full_width:
+            width = None
+        key = (quality, width)
+        data = self._jpeg.get(key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            data = self._jpeg.get(key)
+            if data is not None:
+                return data
+            start = time.perf_counter()
+            image = self.image
+            if width is not None:
+                size = (width, max(1, height * width // full_width))
+                shape = (size[1], size[0]) + self.image.shape[2:]
+                image = cv2.resize(self.image, size, dst=_scratch_buffer(shape), interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            if not ret:
+                raise ValueError("Failed to encode frame.")
+            data = self._jpeg[key] = buffer.tobytes()
+            metrics.stage('encode', time.perf_counter() - start)
+            return data
+
+    def rgb(self):
+        """RGB copy of the frame for Qt/Streamlit display, converted once."""
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    def dhash(self):
+        if self._hash is None:
+            self._hash = dhash(self.image)
+        return self._hash
+
+
+def as_frame(frame):
+    """Wrap a raw BGR array in a ``Frame``; pass ``Frame`` objects through."""
+    return frame if isinstance(frame, Frame) else Frame(frame)
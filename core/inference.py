@@ -0,0 +1,270 @@
+import time
+import base64
+import asyncio
+import logging
+import threading
+
+import httpx
+
+from core.config import OLLAMA_HOST
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceResult:
+    """Outcome of one model request.
+
+    ``status`` is one of ``ok``, ``timeout``, ``overloaded``, ``circuit_open``
+    or ``error``; ``text`` is only set when the request succeeded, ``data``
+    when the caller parsed it into typed fields, and ``plan`` when it was
+    planned from a frame (see core/planner.py).
+    """
+
+    def __init__(self, status, text=None, error=None, latency=0.0, attempts=0):
+        self.status = status
+        self.text = text
+        self.error = error
+        self.latency = latency
+        self.attempts = attempts
+        self.data = None
+        self.plan = None
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+    def __repr__(self):
+        return f"InferenceResult(status={self.status!r}, latency={self.latency:.2f}, error={self.error!r})"
+
+
+class CircuitBreaker:
+    """Stop calling an overloaded model host for a while after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    requests fail fast for ``reset_timeout`` seconds; then a single trial
+    request is let through (half-open) and its outcome closes or reopens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Model host failing, opening circuit for {self.reset_timeout}s.")
+                self.opened_at = time.monotonic()
+
+
+class OllamaClient:
+    """Pooled, concurrent client for the Ollama chat API.
+
+    Requests run on a private asyncio loop over one keep-alive ``httpx``
+    connection pool. ``concurrency`` caps requests in flight at the server,
+    ``max_pending`` caps requests waiting for a slot (beyond that callers get
+    an ``overloaded`` result straight away), and every request has a deadline
+    of ``timeout`` seconds including retries.
+    """
+
+    def __init__(self, host=OLLAMA_HOST, model='llava', concurrency=2, timeout=60.0, retries=1,
+                 max_pending=8, breaker=None):
+        if '://' not in host:
+            host = f'http://{host}'
+        self.host = host
+        self.model = model
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.max_pending = max_pending
+        self.breaker = breaker or CircuitBreaker()
+
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+        self._lock = threading.Lock()
+        self._loop = None
+        self._http = None
+        self._semaphore = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                limits = httpx.Limits(max_connections=self.concurrency,
+                                      max_keepalive_connections=self.concurrency)
+                self._http = httpx.AsyncClient(base_url=self.host, limits=limits, timeout=None)
+                self._semaphore = asyncio.Semaphore(self.concurrency)
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, daemon=True, name="ollama-client").start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    async def _post(self, payload, deadline):
+        attempts = 0
+        error, status = None, 'error'
+        while attempts <= self.retries:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 'timeout', None, error or 'deadline exceeded', attempts
+            attempts += 1
+            try:
+                response = await asyncio.wait_for(self._http.post('/api/chat', json=payload), remaining)
+                if response.status_code in (429, 503):
+                    status, error = 'overloaded', f"HTTP {response.status_code}"
+                else:
+                    response.raise_for_status()
+                    return 'ok', response.json()['message']['content'], None, attempts
+            except (asyncio.TimeoutError, httpx.TimeoutException):
+                status, error = 'timeout', 'request timed out'
+            except httpx.HTTPStatusError as e:
+                # 4xx other than 429 will not succeed on retry
+                if e.response.status_code < 500:
+                    return 'error', None, str(e), attempts
+                status, error = 'error', str(e)
+            except Exception as e:
+                status, error = 'error', str(e)
+            await asyncio.sleep(min(0.5 * attempts, max(0.0, deadline - time.monotonic())))
+        return status, None, error, attempts
+
+    async def _chat(self, image_bytes, prompt, options, timeout, format=None):
+        start = time.monotonic()
+        deadline = start + (timeout or self.timeout)
+        if not self.breaker.allow():
+            return InferenceResult('circuit_open', error='model host circuit is open')
+
+        images = [base64.b64encode(data).decode('ascii') for data in image_bytes]
+        payload = {
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': prompt, 'images': images}],
+            'stream': False,
+        }
+        if options:
+            payload['options'] = options
+        if format:
+            # "json" or a JSON schema the answer is constrained to
+            payload['format'] = format
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            return InferenceResult('timeout', error='timed out waiting for a free slot',
+                                   latency=time.monotonic() - start)
+        try:
+            status, text, error, attempts = await self._post(payload, deadline)
+        finally:
+            self._semaphore.release()
+
+        if status == 'ok':
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return InferenceResult(status, text, error, time.monotonic() - start, attempts)
+
+    def _admit(self, count):
+        with self._lock:
+            if self.pending + count > self.max_pending + self.concurrency:
+                return False
+            self.pending += count
+            return True
+
+    def _done(self, results):
+        with self._lock:
+            self.pending -= len(results)
+            for result in results:
+                if result.ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def chat(self, images, prompt, options=None, timeout=None, format=None):
+        """Send one chat request with one or more JPEG images and wait for it."""
+        if isinstance(images, bytes):
+            images = [images]
+        return self.chat_many([(images, prompt)], options, timeout, format)[0]
+
+    def chat_many(self, requests, options=None, timeout=None, format=None):
+        """Run several ``(images, prompt)`` requests concurrently, in order.
+
+        Useful for frames from several cameras or several tiles of one frame.
+        """
+        if not self._admit(len(requests)):
+            return [InferenceResult('overloaded', error='too many pending requests') for _ in requests]
+
+        loop = self._ensure_loop()
+
+        async def run_all():
+            return await asyncio.gather(*[
+                self._chat([images] if isinstance(images, bytes) else images, prompt, options, timeout, format)
+                for images, prompt in requests
+            ])
+
+        try:
+            results = asyncio.run_coroutine_threadsafe(run_all(), loop).result()
+        except Exception as e:
+            logger.error(f"Error running inference requests: {e}")
+            results = [InferenceResult('error', error=str(e)) for _ in requests]
+        self._done(results)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self.pending,
+                'completed': self.completed,
+                'failed': self.failed,
+                'circuit': self.breaker.state,
+            }
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide shared client, created on first use."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
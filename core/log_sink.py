@@ -0,0 +1,268 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+
+from bson import ObjectId, json_util
+from pymongo import ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import ConnectionFailure
+from pymongo.results import InsertOneResult
+
+from core.config import SPOOL_FILE
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LogSink:
+    """Buffered, non-blocking writer for detection logs.
+
+    Writes are queued in memory and flushed by a background thread with one
+    ``bulk_write`` per collection, either every ``flush_interval`` seconds or
+    as soon as ``batch_size`` writes are waiting, so capture loops never wait
+    on MongoDB. Inserts get their ``_id`` up front so later updates can refer
+    to documents that have not been flushed yet, and are written as upserts.
+    Replaying a partially applied batch only stays exact if every queued
+    write is idempotent, which is why updates use ``$set`` and the rollups in
+    ``core.stats`` record event ids rather than only incrementing counters.
+
+    When MongoDB is unreachable, batches are appended to the ``spool_path``
+    file instead; every ``retry_interval`` seconds the sink tries again and,
+    once MongoDB is back, replays the spool in order before new writes. A
+    batch that fails for any other reason (e.g. a document BSON cannot
+    encode, or a write the server rejects) is retried one write at a time
+    and the writes that still fail are appended to ``<spool_path>.rejected``
+    instead of blocking the spool.
+    """
+
+    def __init__(self, db, batch_size=100, flush_interval=1.0, spool_path=SPOOL_FILE,
+                 retry_interval=10.0, max_queue=10000):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.retry_interval = retry_interval
+
+        self.written = 0
+        self.spooled = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retry_at = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name="log-sink")
+        self._thread.start()
+        atexit.register(self.close)
+
+    def collection(self, name):
+        """A collection-like handle whose writes go through this sink."""
+        return SinkCollection(self, name)
+
+    def insert(self, collection, document):
+        """Queue an insert and return the document's ``_id``."""
+        document = dict(document)
+        document.setdefault('_id', ObjectId())
+        self._put({'collection': collection, 'op': 'insert', 'document': document})
+        return document['_id']
+
+    def update(self, collection, filter, update, upsert=False, many=False):
+        self._put({'collection': collection, 'op': 'update_many' if many else 'update',
+                   'filter': filter, 'update': update, 'upsert': upsert})
+
+    def _put(self, entry):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            logger.error("Log sink queue is full; dropping a write.")
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def online(self):
+        return self._retry_at == 0.0
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'online': self.online,
+            'written': self.written,
+            'spooled': self.spooled,
+            'dropped': self.dropped,
+            'flushes': self.flushes,
+            'last_flush_ms': round(1000 * self.last_flush_latency, 1),
+            'max_flush_ms': round(1000 * self.max_flush_latency, 1),
+        }
+
+    def flush(self, timeout=10.0):
+        """Wait until everything queued so far has been written or spooled."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=30)
+
+    def _run(self):
+        # Writes left in the spool by a previous run go first
+        self._replay()
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # Keep the writer alive whatever went wrong, or queued writes would pile up unwritten
+                    logger.error(f"Unexpected error writing detection logs, spooling them: {e}")
+                    self._spool(batch)
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                break
+            if not batch and not self.online and time.time() >= self._retry_at:
+                self._replay()
+
+    def _collect(self):
+        """Block for the first write, then gather more until the batch is full or the interval ends."""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = self.flush_interval if deadline is None else deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if entry is None:
+                return batch, True
+            batch.append(entry)
+            if deadline is None:
+                deadline = time.time() + self.flush_interval
+        return batch, False
+
+    def _write(self, batch):
+        # Keep order: while a spool is pending, new writes queue up behind it
+        if not self.online and (time.time() < self._retry_at or not self._replay()):
+            self._spool(batch)
+            return
+        try:
+            self._write_all(batch)
+        except ConnectionFailure as e:
+            logger.error(f"Failed to write detection logs, spooling to {self.spool_path}: {e}")
+            self._retry_at = time.time() + self.retry_interval
+            self._spool(batch)
+
+    def _write_all(self, batch):
+        """Bulk-write a batch; if it fails for a reason other than MongoDB being unreachable, write it one by one.
+
+        Only connection errors propagate, for the caller to spool the batch.
+        Entries that fail on their own (e.g. a document BSON cannot encode,
+        or a ``WriteError`` from the server) are set aside in
+        ``<spool_path>.rejected``. Retrying from the start of the batch is
+        safe because every write is idempotent.
+        """
+        try:
+            self._bulk_write(batch)
+            return
+        except ConnectionFailure:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to write a batch of detection logs, writing them one by one: {e}")
+        for entry in batch:
+            try:
+                self._bulk_write([entry])
+            except ConnectionFailure:
+                raise
+            except Exception as e:
+                logger.error(f"Rejected a detection log write to {entry['collection']}: {e}")
+                self._spool([entry], self.spool_path + '.rejected')
+
+    def _bulk_write(self, batch):
+        start = time.perf_counter()
+        # Group consecutive writes to the same collection into one ordered bulk_write
+        groups = []
+        for entry in batch:
+            if not groups or groups[-1][0] != entry['collection']:
+                groups.append((entry['collection'], []))
+            groups[-1][1].append(_operation(entry))
+        for name, operations in groups:
+            self.db[name].bulk_write(operations, ordered=True)
+
+        latency = time.perf_counter() - start
+        metrics.stage('log_flush', latency)
+        self.flushes += 1
+        self.written += len(batch)
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+
+    def _spool(self, batch, path=None):
+        try:
+            with open(path or self.spool_path, 'a') as f:
+                for entry in batch:
+                    f.write(json_util.dumps(entry) + '\n')
+            self.spooled += len(batch)
+        except (OSError, TypeError, ValueError) as e:
+            self.dropped += len(batch)
+            logger.error(f"Failed to spool detection logs: {e}")
+
+    def _replay(self):
+        """Write the spool to MongoDB; return True if nothing is left in it."""
+        if not os.path.exists(self.spool_path):
+            self._retry_at = 0.0
+            return True
+        try:
+            with open(self.spool_path) as f:
+                batch = [json_util.loads(line) for line in f if line.strip()]
+            for i in range(0, len(batch), self.batch_size):
+                self._write_all(batch[i:i + self.batch_size])
+            os.remove(self.spool_path)
+        except ConnectionFailure as e:
+            logger.error(f"MongoDB still unavailable, keeping the log spool: {e}")
+            self._retry_at = time.time() + self.retry_interval
+            return False
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read log spool {self.spool_path}: {e}")
+            self._retry_at = time.time() + self.retry_interval
+            return False
+        self._retry_at = 0.0
+        if batch:
+            logger.info(f"Replayed {len(batch)} spooled detection log writes.")
+        return True
+
+
+def _operation(entry):
+    if entry['op'] == 'insert':
+        document = entry['document']
+        return ReplaceOne({'_id': document['_id']}, document, upsert=True)
+    operation = UpdateMany if entry['op'] == 'update_many' else UpdateOne
+    return operation(entry['filter'], entry['update'], upsert=entry['upsert'])
+
+
+class SinkCollection:
+    """The subset of a pymongo ``Collection`` the event log and recorders write through."""
+
+    def __init__(self, sink, name):
+        self.sink = sink
+        self.name = name
+
+    def insert_one(self, document):
+        return InsertOneResult(self.sink.insert(self.name, document), acknowledged=False)
+
+    def update_one(self, filter, update, upsert=False):
+        self.sink.update(self.name, filter, update, upsert=upsert)
+
+    def update_many(self, filter, update, upsert=False):
+        self.sink.update(self.name, filter, update, upsert=upsert, many=True)
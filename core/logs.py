@@ -0,0 +1,227 @@
+import json
+import base64
+import logging
+import datetime
+
+import pymongo
+from bson import ObjectId
+
+from core.config import TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# Detection logs store the event as UTC datetimes with the camera under
+# ``meta``:
+#
+#     {start, end, meta: {camera}, description, person, labels, counts,
+#      duration, frame_count, peak_confidence, video_filename, clip,
+#      schema_version: 2}
+#
+# Version 1 documents (written before the migration) have local-time
+# ``date``/``detection_time``/``close_time`` strings and a top-level
+# ``camera``; ``migrate_logs.py`` converts them. ``to_json`` reads both, so
+# /api/logs and the front ends keep their ``date``/``detection_time`` shape.
+SCHEMA_VERSION = 2
+
+LEGACY_FIELDS = ('date', 'detection_time', 'close_time', 'camera')
+
+LOG_PROJECTION = {
+    'start': 1,
+    'end': 1,
+    'meta': 1,
+    'description': 1,
+    'video_filename': 1,
+    'person': 1,
+    'labels': 1,
+    'duration': 1,
+    # Version 1 documents, until they are migrated
+    'date': 1,
+    'detection_time': 1,
+    'close_time': 1,
+    'camera': 1,
+}
+
+# Newest first; the compound index below serves both the sort and the keyset filter
+LOG_SORT = [('start', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]
+
+# Index names used before the datetime schema; migrate_logs.py drops them
+LEGACY_INDEXES = ('date_time', 'camera_date_time', 'labels_date_time', 'person_date_time')
+
+MAX_PAGE_SIZE = 1000
+
+
+def local_timezone():
+    """Zone the front ends show times in: ``WILDCARE_TIMEZONE``, else the server's."""
+    if TIMEZONE:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(TIMEZONE)
+    return datetime.datetime.now().astimezone().tzinfo
+
+
+def mongo_timezone():
+    """The same zone in the form MongoDB's date operators accept."""
+    return TIMEZONE or datetime.datetime.now().astimezone().strftime('%z')
+
+
+def utc_datetime(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+def as_local(value):
+    """A datetime read from MongoDB (naive UTC) in the display time zone."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(local_timezone())
+
+
+def parse_day(day, tz=None):
+    """Local midnight of a ``YYYY-MM-DD`` day, as an aware datetime."""
+    return datetime.datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=tz or local_timezone())
+
+
+def legacy_times(log, tz=None):
+    """``(start, end)`` of a version 1 document, read in ``tz``.
+
+    An event whose close time is earlier than its start time ran past
+    midnight, so it ended the next day.
+    """
+    tz = tz or local_timezone()
+    start = datetime.datetime.strptime(f"{log['date']} {log['detection_time']}", '%Y-%m-%d %H:%M:%S')
+    start = start.replace(tzinfo=tz)
+    end = None
+    if log.get('close_time'):
+        end = datetime.datetime.strptime(f"{log['date']} {log['close_time']}", '%Y-%m-%d %H:%M:%S')
+        end = end.replace(tzinfo=tz)
+        if end < start:
+            end += datetime.timedelta(days=1)
+    return start, end
+
+
+def migrate_document(log, tz=None):
+    """``$set`` fields that turn a version 1 document into a version 2 one."""
+    start, end = legacy_times(log, tz)
+    fields = {
+        'start': start.astimezone(datetime.timezone.utc),
+        'end': end.astimezone(datetime.timezone.utc) if end else None,
+        'meta': {'camera': log.get('camera')},
+        'schema_version': SCHEMA_VERSION,
+    }
+    if end is not None and log.get('duration') is None:
+        fields['duration'] = (end - start).total_seconds()
+    return fields
+
+
+def ensure_indexes(collection):
+    """Create the indexes the log queries rely on; cheap if they already exist."""
+    try:
+        collection.create_index(LOG_SORT, name='start')
+        collection.create_index([('meta.camera', pymongo.ASCENDING)] + LOG_SORT, name='camera_start')
+        # Species and person queries; labels is an array, so this is a multikey index
+        collection.create_index([('labels', pymongo.ASCENDING)] + LOG_SORT, name='labels_start')
+        collection.create_index([('person', pymongo.ASCENDING)] + LOG_SORT, name='person_start')
+        collection.create_index([('description', pymongo.TEXT)], name='description_text')
+        if collection.count_documents({'schema_version': {'$exists': False}}, limit=1):
+            logger.warning("Some detection logs use the old string schema; run migrate_logs.py to convert them.")
+    except Exception as e:
+        logger.error(f"Failed to create log indexes: {e}")
+
+
+def build_query(date=None, start=None, end=None, month=None, camera=None, text=None, label=None, person=None):
+    """MongoDB filter for the log list; dates are ``YYYY-MM-DD``, months ``YYYY-MM``.
+
+    Days and months are local to the display time zone and become a range
+    on ``start``. ``text`` is matched against the description's text index
+    (whole words, stemmed), ``label`` against the labels the model reported.
+    """
+    query = {}
+    if date:
+        first = parse_day(date)
+        query['start'] = {'$gte': first, '$lt': first + datetime.timedelta(days=1)}
+    elif month:
+        first = parse_day(f'{month}-01')
+        following = (first + datetime.timedelta(days=32)).replace(day=1)
+        query['start'] = {'$gte': first, '$lt': following}
+    elif start or end:
+        query['start'] = {}
+        if start:
+            query['start']['$gte'] = parse_day(start)
+        if end:
+            query['start']['$lt'] = parse_day(end) + datetime.timedelta(days=1)
+    if camera:
+        query['meta.camera'] = camera
+    if label:
+        query['labels'] = label.strip().lower()
+    if person is not None:
+        query['person'] = person
+    if text:
+        query['$text'] = {'$search': text}
+    return query
+
+
+def encode_cursor(log):
+    start = log.get('start')
+    key = [start.isoformat() if start else None, str(log['_id'])]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    start, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.datetime.fromisoformat(start) if start else None, ObjectId(log_id)
+
+
+def after_cursor(query, cursor):
+    """Restrict ``query`` to logs sorted after the one ``cursor`` points at."""
+    start, log_id = decode_cursor(cursor)
+    if start is None:
+        # Unmigrated documents have no start and sort last, by id
+        keyset = {'start': None, '_id': {'$lt': log_id}}
+    else:
+        keyset = {'$or': [
+            {'start': {'$lt': start}},
+            {'start': start, '_id': {'$lt': log_id}},
+            {'start': None},
+        ]}
+    return {'$and': [query, keyset]} if query else keyset
+
+
+def find_page(collection, query, limit=100, cursor=None):
+    """Return one page of logs and the cursor for the next page (None at the end)."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        query = after_cursor(query, cursor)
+    # Fetch one extra document to know whether another page exists
+    logs = list(collection.find(query, LOG_PROJECTION).sort(LOG_SORT).limit(limit + 1))
+    next_cursor = encode_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return logs[:limit], next_cursor
+
+
+def iter_logs(collection, query, batch_size=500):
+    """Iterate over every matching log without loading them all into memory."""
+    return collection.find(query, LOG_PROJECTION).sort(LOG_SORT).batch_size(batch_size)
+
+
+def to_json(log):
+    """The JSON shape returned by /api/logs, from either schema version.
+
+    ``date``, ``detection_time`` and ``close_time`` are local strings as
+    before; ``start`` and ``end`` are ISO 8601 UTC timestamps.
+    """
+    if 'start' in log:
+        start = as_local(log['start'])
+        end = as_local(log['end']) if log.get('end') else None
+        camera = (log.get('meta') or {}).get('camera')
+    else:
+        start, end = legacy_times(log)
+        camera = log.get('camera')
+    return {
+        'id': str(log['_id']),
+        'date': start.strftime('%Y-%m-%d'),
+        'detection_time': start.strftime('%H:%M:%S'),
+        'close_time': end.strftime('%H:%M:%S') if end else None,
+        'start': start.astimezone(datetime.timezone.utc).isoformat(),
+        'end': end.astimezone(datetime.timezone.utc).isoformat() if end else None,
+        'description': log.get('description') or "No description available.",
+        'camera': camera,
+        'video_filename': log.get('video_filename'),
+        'labels': log.get('labels', []),
+    }
@@ -0,0 +1,182 @@
+import time
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cached JPEG encode up to a slow LLaVA call
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'wildcare_frames_captured_total': ('counter', "Frames read from the camera."),
+    'wildcare_frames_skipped_total': ('counter', "Frames the motion gate kept away from the detector."),
+    'wildcare_frames_inferred_total': ('counter', "Frames with a detection result."),
+    'wildcare_frames_dropped_total': ('counter', "Frames replaced in the inference queue before being served."),
+    'wildcare_inference_errors_total': ('counter', "Detections that failed, by status."),
+    'wildcare_event_transitions_total': ('counter', "Detection events opened and closed."),
+    'wildcare_stage_seconds': ('histogram', "Time spent per pipeline stage."),
+}
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Process-wide counters, gauges and latency histograms.
+
+    Updates are a dict lookup and an add under one lock, cheap enough for
+    every frame. ``render`` produces the Prometheus text format for
+    ``/metrics``; ``summary`` is a compact view for the desktop and
+    Streamlit panels. Gauges that are cheaper to read on demand (queue
+    depths, viewers) come from collectors registered with ``add_collector``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(seconds)
+
+    def stage(self, stage, seconds):
+        self.observe('wildcare_stage_seconds', seconds, stage=stage)
+
+    def timer(self, stage):
+        return _Timer(self, stage)
+
+    def add_collector(self, collector):
+        """``collector()`` returns ``[(name, labels, value), ...]`` gauges, read at render time."""
+        self._collectors.append(collector)
+
+    def _gauges(self):
+        gauges = []
+        for collector in self._collectors:
+            try:
+                gauges.extend(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        return gauges
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+
+        lines = []
+        described = set()
+
+        def describe(name, default_kind):
+            if name in described:
+                return
+            described.add(name)
+            kind, text = HELP.get(name, (default_kind, None))
+            if text:
+                lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name, 'counter')
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        # Samples of one metric have to be contiguous
+        for name, labels, value in sorted(self._gauges(), key=lambda gauge: gauge[0]):
+            describe(name, 'gauge')
+            lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Totals per counter and count/mean per stage, summed over labels other than the stage."""
+        with self._lock:
+            counters, stages = {}, {}
+            for (name, labels), value in self._counters.items():
+                short = name.replace('wildcare_', '').replace('_total', '')
+                counters[short] = counters.get(short, 0) + value
+            for (name, labels), histogram in self._histograms.items():
+                stage = dict(labels).get('stage', name)
+                total = stages.setdefault(stage, [0, 0.0])
+                total[0] += histogram.count
+                total[1] += histogram.sum
+        return {
+            'counters': counters,
+            'stages': {stage: {'count': count, 'avg_ms': 1000 * total / count if count else 0.0}
+                       for stage, (count, total) in stages.items()},
+        }
+
+    def summary_text(self):
+        """A few lines for a small status panel."""
+        summary = self.summary()
+        counters = summary['counters']
+        lines = [' '.join(f"{name.replace('frames_', '')}={counters[name]}" for name in sorted(counters))]
+        lines += [f"{stage}: {stats['avg_ms']:.1f} ms avg ({stats['count']})"
+                  for stage, stats in sorted(summary['stages'].items())]
+        return '\n'.join(lines)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class _Timer:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class LogSampler:
+    """Pass one message in ``every`` to the logger at debug level."""
+
+    def __init__(self, logger, every=50):
+        self.logger = logger
+        self.every = every
+        self.count = 0
+
+    def debug(self, message):
+        self.count += 1
+        if self.count % self.every == 1 and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"{message} (1 in {self.every})")
+
+
+metrics = Metrics()
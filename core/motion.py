@@ -0,0 +1,145 @@
+import time
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def dhash(frame, hash_size=8):
+    """Return a 64-bit difference hash of a BGR or grayscale frame."""
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(frame, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+
+class MotionGate:
+    """Decide which captured frames are worth sending to the model.
+
+    Each frame is downscaled to grayscale and compared against a running
+    background average; the change score is the fraction of pixels whose
+    difference exceeds ``pixel_threshold``. A perceptual hash is compared
+    against the last forwarded frame to catch global scene changes that the
+    slowly adapting background absorbs. Frames are forwarded when either check
+    fires, or when nothing has been forwarded for ``max_staleness`` seconds.
+
+    ``last_regions`` holds the ``(x, y, w, h)`` boxes of the blobs of
+    changed pixels in the last forwarded frame, in full-frame coordinates, so
+    the model can be shown just those parts. They are found whatever the
+    frame was forwarded for: a small, distant animal changes far fewer pixels
+    than ``threshold`` and is still worth cropping out when a stale or
+    changed scene is sent. Blobs of fewer than ``min_blob_cells`` changed
+    downscaled pixels are sensor noise.
+    """
+
+    def __init__(self, threshold=0.02, pixel_threshold=25, hash_tolerance=6,
+                 max_staleness=30.0, downscale_width=160, learning_rate=0.05, max_regions=8, min_blob_cells=2):
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.hash_tolerance = hash_tolerance
+        self.max_staleness = max_staleness
+        self.downscale_width = downscale_width
+        self.learning_rate = learning_rate
+        self.max_regions = max_regions
+        self.min_blob_cells = min_blob_cells
+
+        self.background = None
+        self.last_hash = None
+        self.last_forward_time = None
+        self.last_score = 0.0
+        self.last_regions = []
+        self._changed = None
+
+        self.forwarded = 0
+        self.skipped = 0
+
+    def _prepare(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.downscale_width / float(width)
+        size = (self.downscale_width, max(1, int(height * scale)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def score(self, gray):
+        """Fraction of pixels that differ from the background model."""
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self._changed = None
+            return 1.0
+        diff = np.abs(gray.astype(np.float32) - self.background)
+        self._changed = diff > self.pixel_threshold
+        # Update the background in place: bg += lr * (frame - bg)
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+        return np.count_nonzero(self._changed) / float(diff.size)
+
+    def regions(self, shape):
+        """Boxes around the blobs of pixels that changed in the last scored frame, scaled to ``shape``.
+
+        Changed pixels are joined into blobs after a one-pixel dilation, and
+        a blob counts only if it holds at least ``min_blob_cells`` of them.
+        More than ``max_regions`` blobs means the whole scene changed, and
+        no boxes are returned.
+        """
+        if self._changed is None:
+            return []
+        mask = cv2.dilate(self._changed.astype(np.uint8), None, iterations=1)
+        count, labels, boxes, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        # Changed pixels per blob; the dilation only joins nearby ones, it does not count
+        sizes = np.bincount(labels[self._changed], minlength=count)
+        scale_x = shape[1] / float(mask.shape[1])
+        scale_y = shape[0] / float(mask.shape[0])
+        regions = []
+        for label in range(1, count):
+            if sizes[label] < self.min_blob_cells:
+                continue
+            x, y, w, h = boxes[label, :4]
+            regions.append((int(x * scale_x), int(y * scale_y), int(np.ceil(w * scale_x)), int(np.ceil(h * scale_y))))
+        return regions if len(regions) <= self.max_regions else []
+
+    def should_process(self, frame, now=None):
+        """Return True if the frame should be forwarded to the model."""
+        now = time.monotonic() if now is None else now
+        gray = self._prepare(frame)
+        self.last_score = self.score(gray)
+        frame_hash = dhash(gray)
+
+        stale = self.last_forward_time is None or now - self.last_forward_time >= self.max_staleness
+        moved = self.last_score >= self.threshold
+        scene_changed = self.last_hash is None or hamming(frame_hash, self.last_hash) > self.hash_tolerance
+
+        if stale or moved or scene_changed:
+            self.last_regions = self.regions(frame.shape)
+            self.last_hash = frame_hash
+            self.last_forward_time = now
+            self.forwarded += 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        total = self.forwarded + self.skipped
+        return {
+            'forwarded': self.forwarded,
+            'skipped': self.skipped,
+            'skip_ratio': self.skipped / float(total) if total else 0.0,
+            'last_score': self.last_score,
+        }
+
+    def log_stats(self, every=100):
+        """Log forwarded/skipped counts every ``every`` frames."""
+        total = self.forwarded + self.skipped
+        if total and total % every == 0:
+            stats = self.stats()
+            logger.info(f"Motion gate: forwarded {stats['forwarded']}, skipped {stats['skipped']} "
+                        f"({stats['skip_ratio']:.0%} skipped)")
@@ -0,0 +1,306 @@
+import time
+import logging
+import threading
+
+import cv2
+
+from core.frames import JPEG_QUALITY, Frame
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LatestSlot:
+    """Single-slot handoff between threads where the newest item always wins.
+
+    ``put`` replaces whatever is in the slot; readers wait for an item newer
+    than the last one they saw, skipping any they were too slow to see.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+
+    def put(self, item):
+        with self._cond:
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, after=0, timeout=None):
+        """Wait for an item newer than ``after`` and return ``(seq, item)``."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after, timeout):
+                return after, None
+            return self._seq, self._item
+
+
+class DetectionResult:
+    """A detector's output for one captured frame, attached to the stream as an overlay."""
+
+    def __init__(self, seq, detection, timestamp, camera_id=None):
+        self.seq = seq
+        self.detection = detection
+        self.timestamp = timestamp
+        self.camera_id = camera_id
+
+    @property
+    def person(self):
+        return self.detection.person
+
+    @property
+    def description(self):
+        return self.detection.description
+
+    @property
+    def boxes(self):
+        return self.detection.boxes
+
+
+class CaptureThread(threading.Thread):
+    """Read frames from a camera as fast as it delivers them.
+
+    Only the newest frame is kept, so OpenCV's internal buffer never fills up
+    with stale frames while the rest of the pipeline is busy. Frames are
+    published as ``Frame`` objects so every consumer shares their encodes.
+    """
+
+    def __init__(self, source=0, width=None, height=None, on_frame=None, camera_id=None):
+        super().__init__(daemon=True, name=f"capture-{source}")
+        self.source = source
+        self.camera_id = str(source) if camera_id is None else camera_id
+        self.width = width
+        self.height = height
+        self.on_frame = on_frame
+        self.latest = LatestSlot()
+        self.fps = 0.0
+        self.frames_captured = 0
+        self.opened = threading.Event()
+        self._running = threading.Event()
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        try:
+            if self.width and self.height:
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+            if not cap.isOpened():
+                logger.error(f"Failed to open camera source {self.source}.")
+                return
+
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            self._running.set()
+            self.opened.set()
+
+            while self._running.is_set():
+                start = time.perf_counter()
+                ret, image = cap.read()
+                if not ret:
+                    logger.error("Failed to grab frame.")
+                    break
+                metrics.stage('capture', time.perf_counter() - start)
+                metrics.inc('wildcare_frames_captured_total', camera=self.camera_id)
+                self.frames_captured += 1
+                frame = Frame(image, self.frames_captured)
+                self.latest.put(frame)
+                if self.on_frame is not None:
+                    self.on_frame(frame)
+        except Exception as e:
+            logger.error(f"Error in capture thread: {e}")
+        finally:
+            self._running.clear()
+            self.opened.set()
+            cap.release()
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def stop(self):
+        self._running.clear()
+
+
+class DetectionPipeline:
+    """Capture, inference and streaming running at their own rates.
+
+    The capture thread publishes every frame for the stream and hands it to
+    the optional clip recorder's pre-roll buffer. Frames that pass
+    the motion gate go through the optional per-camera ``screen`` stage (e.g.
+    the HOG pass of a detector cascade) on its own thread, and only candidates
+    are submitted to the shared inference scheduler; without a screen every
+    gated frame is submitted. Results come back through ``_handle_result`` and
+    are drawn onto subsequent frames, so a slow model never delays the live view.
+    ``on_stop(camera_id)`` is called once when the pipeline stops, e.g. to
+    close the camera's open event; results arriving after that are dropped.
+    """
+
+    def __init__(self, scheduler, camera_id, source=0, gate=None, screen=None, recorder=None, width=None,
+                 height=None, priority=0, on_result=None, jpeg_quality=JPEG_QUALITY, on_stop=None):
+        self.scheduler = scheduler
+        self.camera_id = camera_id
+        self.gate = gate
+        self.screen = screen
+        self.recorder = recorder
+        self.priority = priority
+        self.on_result = on_result
+        self.on_stop = on_stop
+        self.jpeg_quality = jpeg_quality
+
+        self.capture = CaptureThread(source, width, height, on_frame=self._on_frame, camera_id=camera_id)
+        self.result = None
+        self.candidate = None
+        self.inferences = 0
+        self.errors = 0
+
+        self._screen_slot = LatestSlot()
+        self._result_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start capturing and inferring; return False if the camera did not open."""
+        self.scheduler.register(self.camera_id, self._handle_result, self.priority)
+        self.capture.start()
+        self.capture.opened.wait(timeout=10)
+        if not self.capture.running:
+            self.scheduler.unregister(self.camera_id)
+            return False
+        if self.screen is not None:
+            threading.Thread(target=self._screen_loop, daemon=True, name=f"screen-{self.camera_id}").start()
+        return True
+
+    def stop(self):
+        with self._result_lock:
+            if self._stopped.is_set():
+                return
+            self._stopped.set()
+        self.capture.stop()
+        self.scheduler.unregister(self.camera_id)
+        if self.on_stop is not None:
+            try:
+                self.on_stop(self.camera_id)
+            except Exception as e:
+                logger.error(f"Error stopping camera {self.camera_id}: {e}")
+
+    @property
+    def running(self):
+        return self.capture.running and not self._stopped.is_set()
+
+    def _on_frame(self, frame):
+        if self.recorder is not None:
+            self.recorder.push(frame)
+        if self.gate is None or self.gate.should_process(frame.image):
+            if self.gate is not None:
+                # Where the frame changed, so the model can be shown just those parts
+                frame.regions = self.gate.last_regions
+            if self.screen is not None:
+                self._screen_slot.put(frame)
+            else:
+                self.scheduler.submit(self.camera_id, frame.seq, frame)
+        else:
+            metrics.inc('wildcare_frames_skipped_total', camera=self.camera_id)
+        if self.gate is not None:
+            self.gate.log_stats()
+
+    def _screen_loop(self):
+        last = 0
+        while self.running:
+            last, frame = self._screen_slot.get(after=last, timeout=0.5)
+            if frame is None:
+                continue
+            seq = frame.seq
+            try:
+                candidate = self.screen(frame)
+            except Exception as e:
+                logger.error(f"Error in screening stage for camera {self.camera_id}: {e}")
+                continue
+
+            self.candidate = DetectionResult(seq, candidate, time.time(), self.camera_id)
+            if candidate.person:
+                self.scheduler.submit(self.camera_id, seq, frame)
+            else:
+                self._handle_result(seq, frame, candidate)
+
+    def _handle_result(self, seq, frame, detection):
+        if not detection.ok:
+            # A failed model call is neither a detection nor a non-detection
+            self.errors += 1
+            metrics.inc('wildcare_inference_errors_total', camera=self.camera_id, status=detection.status or 'error')
+            logger.warning(f"Inference failed for camera {self.camera_id}: {detection.error}")
+            return
+
+        candidate = self.candidate
+        if candidate is not None and candidate.seq == seq and not detection.boxes:
+            detection.boxes = candidate.boxes
+        result = DetectionResult(seq, detection, time.time(), self.camera_id)
+
+        metrics.inc('wildcare_frames_inferred_total', camera=self.camera_id)
+        # on_result runs under the lock too, so stop() cannot call on_stop while a result is still being handled
+        with self._result_lock:
+            # A model call that finished after stop() belongs to a closed run
+            if self._stopped.is_set():
+                return
+            self.inferences += 1
+            # With several workers results can finish out of order
+            if self.result is not None and self.result.seq > seq:
+                return
+            self.result = result
+
+            if result.person:
+                self.scheduler.mark_activity(self.camera_id)
+            if self.on_result is not None:
+                self.on_result(frame, result)
+
+    def overlay(self, frame):
+        """A copy of ``frame``'s image with the latest detection drawn on it, or None if there is nothing to draw."""
+        result = self.result
+        candidate = self.candidate
+        show_boxes = candidate is not None and candidate.person and time.time() - candidate.timestamp < 2.0
+        if not show_boxes and (result is None or not result.person):
+            return None
+
+        image = frame.image.copy()
+        if result is not None and result.person:
+            cv2.putText(image, "PERSON DETECTED", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+        # Candidate boxes from the screening stage, while they are fresh
+        if show_boxes:
+            for x, y, w, h in candidate.boxes:
+                cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 255), 2)
+        return image
+
+    def encode(self, frame):
+        """JPEG bytes of ``frame`` with the latest detection drawn on it.
+
+        Without anything to draw the frame's shared encode is reused as is.
+        """
+        start = time.perf_counter()
+        image = self.overlay(frame)
+        if image is None:
+            return frame.jpeg(self.jpeg_quality)
+        ret, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ret:
+            raise ValueError("Failed to encode frame.")
+        metrics.stage('overlay', time.perf_counter() - start)
+        return buffer.tobytes()
+
+    def frames(self):
+        """Yield JPEG-encoded frames at the camera's rate with the latest overlay."""
+        seq = 0
+        while self.running:
+            seq, frame = self.capture.latest.get(after=seq, timeout=1.0)
+            if frame is None:
+                continue
+            try:
+                yield self.encode(frame)
+            except ValueError as e:
+                logger.error(str(e))
+
+    def stats(self):
+        return {
+            'frames_captured': self.capture.frames_captured,
+            'camera_fps': self.capture.fps,
+            'inferences': self.inferences,
+            'errors': self.errors,
+        }
@@ -0,0 +1,230 @@
+import math
+import time
+import logging
+import threading
+
+import cv2
+
+from core.config import MODEL_MAX_BYTES, MODEL_MAX_TILES, MODEL_ROI, MODEL_WIDTH
+from core.frames import JPEG_QUALITY, as_frame
+from core.inference import InferenceResult
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+QUALITY_STEP = 10
+
+
+class InputPlan:
+    """What one frame sends to the model: a JPEG per tile and the frame region each covers."""
+
+    def __init__(self, tiles, regions, quality, scale=1.0):
+        self.tiles = tiles
+        self.regions = regions
+        self.quality = quality
+        self.scale = scale
+
+    @property
+    def bytes(self):
+        return sum(len(tile) for tile in self.tiles)
+
+    def __repr__(self):
+        return f"InputPlan(tiles={len(self.tiles)}, bytes={self.bytes}, quality={self.quality}, scale={self.scale:.2f})"
+
+
+class InferencePlanner:
+    """Decide which pixels of a frame go to the model, at what size and quality.
+
+    Without motion regions the whole frame is downscaled to ``width`` pixels
+    wide, as before. When the motion gate reported where the frame changed
+    (``Frame.regions``), those regions are padded, merged and cropped out at
+    native resolution instead, so a small figure far from the camera keeps
+    its pixels; a region wider or taller than ``width`` is split into tiles
+    of at most ``width`` square, and if that would take more than
+    ``max_tiles`` requests every region is downscaled until it fits. Once
+    the regions cover ``full_frame_fraction`` of the frame, or cropping
+    would not beat the downscaled frame's resolution, the full frame is sent.
+
+    ``max_bytes`` is a budget for all tiles of a frame together: each tile
+    is encoded at the current quality and re-encoded ``QUALITY_STEP`` lower
+    until it fits, down to ``min_quality``. The quality found is where the
+    next frame starts, and it climbs back once tiles come in well under
+    budget, so a steady scene costs one encode per tile.
+    """
+
+    def __init__(self, width=MODEL_WIDTH, max_bytes=MODEL_MAX_BYTES, quality=JPEG_QUALITY, min_quality=40,
+                 roi=MODEL_ROI, max_tiles=MODEL_MAX_TILES, padding=0.25, min_side=96, full_frame_fraction=0.5):
+        self.width = width
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.min_quality = min_quality
+        self.roi = roi
+        self.max_tiles = max(1, max_tiles)
+        self.padding = padding
+        self.min_side = min_side
+        self.full_frame_fraction = full_frame_fraction
+        self._quality = quality
+
+    def plan(self, frame):
+        frame = as_frame(frame)
+        start = time.perf_counter()
+        height, width = frame.shape[:2]
+        regions = self.regions(frame) if self.roi else []
+        crops = self._crops(regions, width) if regions else None
+        if crops is None:
+            plan = self._full_frame(frame)
+        else:
+            crops, scale = crops
+            budget = self.max_bytes // len(crops) if self.max_bytes else None
+            tiles = [self._fit(self._crop_encoder(frame.image, crop, scale), budget) for crop in crops]
+            plan = InputPlan([data for data, quality in tiles], crops, min(quality for data, quality in tiles), scale)
+        metrics.stage('plan', time.perf_counter() - start)
+        return plan
+
+    def regions(self, frame):
+        """Padded, merged motion regions of ``frame``, or [] when the full frame should be sent."""
+        boxes = frame.regions
+        if not boxes:
+            return []
+        height, width = frame.shape[:2]
+        padded = []
+        for x, y, w, h in boxes:
+            pad_w = max(int(w * self.padding), (self.min_side - w) // 2, 0)
+            pad_h = max(int(h * self.padding), (self.min_side - h) // 2, 0)
+            x1, y1 = max(0, x - pad_w), max(0, y - pad_h)
+            x2, y2 = min(width, x + w + pad_w), min(height, y + h + pad_h)
+            padded.append((x1, y1, x2, y2))
+        merged = merge_boxes(padded)
+        area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in merged)
+        if area >= self.full_frame_fraction * width * height:
+            return []
+        return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in merged]
+
+    def _crops(self, regions, frame_width):
+        """Tiles covering ``regions`` and the scale they are sent at, or None for the full frame."""
+        full_scale = min(1.0, self.width / float(frame_width))
+        scale = 1.0
+        while True:
+            crops = [tile for region in regions for tile in split_region(region, int(self.width / scale))]
+            if len(crops) <= self.max_tiles:
+                return crops, scale
+            scale *= 0.75
+            # No sharper than the downscaled frame any more, and it would cost more requests
+            if scale <= full_scale:
+                return None
+
+    def _full_frame(self, frame):
+        height, width = frame.shape[:2]
+        # Frame.jpeg caches the encode, so another consumer of the same variant shares it
+        data, quality = self._fit(lambda quality: frame.jpeg(quality, self.width), self.max_bytes)
+        return InputPlan([data], [(0, 0, width, height)], quality, min(1.0, self.width / float(width)))
+
+    def _crop_encoder(self, image, crop, scale):
+        x, y, w, h = crop
+        image = image[y:y + h, x:x + w]
+        if scale < 1.0:
+            image = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+
+        def encode(quality):
+            ret, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            if not ret:
+                raise ValueError("Failed to encode frame.")
+            return buffer.tobytes()
+        return encode
+
+    def _fit(self, encode, budget):
+        """Encode at the current quality, stepping down until the bytes fit ``budget``."""
+        quality = self._quality
+        data = encode(quality)
+        while budget and len(data) > budget and quality > self.min_quality:
+            quality = max(self.min_quality, quality - QUALITY_STEP)
+            data = encode(quality)
+        if budget and len(data) > budget:
+            logger.debug(f"Model input of {len(data)} bytes is over the {budget} byte budget at quality {quality}.")
+        if budget and len(data) < budget * 0.6 and quality < self.quality:
+            self._quality = min(self.quality, quality + QUALITY_STEP)
+        else:
+            self._quality = quality
+        return data, quality
+
+
+def merge_boxes(boxes):
+    """Merge overlapping ``(x1, y1, x2, y2)`` boxes until none overlap."""
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def split_region(region, side, overlap=0.1):
+    """Split an ``(x, y, w, h)`` region into tiles no larger than ``side``, overlapping slightly.
+
+    Tiles overlap by ``overlap`` of a tile so an animal on a seam is whole in one of them.
+    """
+    x, y, w, h = region
+    columns = 1 if w <= side else math.ceil((w - side * overlap) / (side * (1 - overlap)))
+    rows = 1 if h <= side else math.ceil((h - side * overlap) / (side * (1 - overlap)))
+    tile_w, tile_h = min(w, side), min(h, side)
+    tiles = []
+    for row in range(rows):
+        for column in range(columns):
+            # Spread the tiles evenly so the last one ends at the region's edge
+            tx = x + (column * (w - tile_w) // (columns - 1) if columns > 1 else 0)
+            ty = y + (row * (h - tile_h) // (rows - 1) if rows > 1 else 0)
+            tiles.append((tx, ty, tile_w, tile_h))
+    return tiles
+
+
+def combine_results(results):
+    """One ``InferenceResult`` for a frame sent as several tiles.
+
+    The frame shows a person or animal if any tile does, so a tile that
+    found one makes the answer usable even if another tile failed; without
+    a positive tile any failure fails the frame. Label counts take the
+    largest count from any tile (tiles overlap, so summing would count an
+    animal on a seam twice), and the description is the one from the most
+    confident tile that found something.
+    """
+    if len(results) == 1:
+        return results[0]
+    answered = [result for result in results if result.ok]
+    found = [result for result in answered if result.data['person'] or result.data['labels']]
+    if len(answered) < len(results) and not found:
+        return next(result for result in results if not result.ok)
+
+    best = max(found or answered, key=lambda result: result.data['confidence'])
+    counts = {}
+    for result in answered:
+        for item in result.data['labels']:
+            counts[item['label']] = max(counts.get(item['label'], 0), item['count'])
+    combined = InferenceResult('ok', best.text, latency=max(result.latency for result in results),
+                               attempts=sum(result.attempts for result in results))
+    combined.data = dict(best.data,
+                         labels=[{'label': label, 'count': count} for label, count in counts.items()],
+                         person=any(result.data['person'] for result in answered))
+    return combined
+
+
+_default_planner = None
+_default_lock = threading.Lock()
+
+
+def get_planner():
+    """Process-wide planner configured from ``core.config``, created on first use."""
+    global _default_planner
+    with _default_lock:
+        if _default_planner is None:
+            _default_planner = InferencePlanner()
+        return _default_planner
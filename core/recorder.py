@@ -0,0 +1,227 @@
+import os
+import time
+import queue
+import logging
+import datetime
+import threading
+from collections import deque
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Browser-playable H.264 when the OpenCV build has it, MPEG-4 part 2 otherwise
+FOURCCS = ('avc1', 'mp4v')
+
+
+class ClipRecorder:
+    """Event-driven clip recorder with an in-memory pre-roll for one camera.
+
+    Every captured frame is pushed in; while idle only the last
+    ``pre_roll`` seconds are kept. ``start`` opens a clip that begins with
+    that buffered footage, ``stop`` keeps recording for ``post_roll`` more
+    seconds and then finishes the clip, whether or not frames keep coming.
+    Encoding and disk I/O happen on a background writer thread, so a slow
+    disk never stalls capture; frames the writer cannot keep up with are
+    dropped and counted. Clips are written under ``folder/.recording`` and
+    moved into ``folder`` once complete, and ``on_clip(refs, info)`` is
+    called with the refs passed to ``start`` and the clip's path, duration
+    and size. ``close`` finishes a clip in progress at once, e.g. when the
+    camera stops; the recorder can be started again afterwards.
+    """
+
+    def __init__(self, folder, camera_id=None, pre_roll=5.0, post_roll=5.0, default_fps=15.0,
+                 on_clip=None, max_queue=300, poll_interval=0.5):
+        self.folder = folder
+        self.camera_id = camera_id
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.default_fps = default_fps
+        self.on_clip = on_clip
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+
+        self.clips_written = 0
+        self.frames_dropped = 0
+
+        self._buffer = deque()
+        self._clip = None
+        self._stop_at = None
+        self._lock = threading.Lock()
+        self._queue = None
+        self._writer = None
+        self._start_writer()
+
+    @property
+    def recording(self):
+        return self._clip is not None
+
+    def _start_writer(self):
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._writer = threading.Thread(target=self._write_loop, args=(self._queue,), daemon=True,
+                                        name=f"recorder-{self.camera_id}")
+        self._writer.start()
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def _end_clip(self):
+        # No more frames go to the clip; the writer finishes it once the ones queued are written
+        self._clip['closed'] = True
+        self._clip = None
+        self._stop_at = None
+
+    def push(self, frame):
+        """Add a captured ``Frame``; cheap enough to call from the capture thread."""
+        with self._lock:
+            if self._clip is None:
+                self._buffer.append(frame)
+                while self._buffer and frame.timestamp - self._buffer[0].timestamp > self.pre_roll:
+                    self._buffer.popleft()
+                return
+
+            self._enqueue(('frame', frame))
+            if self._stop_at is not None and frame.timestamp >= self._stop_at:
+                self._end_clip()
+
+    def _estimate_fps(self):
+        if len(self._buffer) < 2:
+            return self.default_fps
+        span = self._buffer[-1].timestamp - self._buffer[0].timestamp
+        return (len(self._buffer) - 1) / span if span > 0 else self.default_fps
+
+    def start(self, ref=None):
+        """Start a clip (or keep the current one going) for a detection."""
+        with self._lock:
+            if self._writer is None:
+                self._start_writer()
+            if self._clip is None:
+                started = datetime.datetime.fromtimestamp(self._buffer[0].timestamp if self._buffer else time.time())
+                name = f"footage_{started.strftime('%Y-%m-%d_%H-%M-%S')}"
+                if self.camera_id:
+                    name += f"_{self.camera_id}"
+                self._clip = {'name': f"{name}.mp4", 'refs': [], 'fps': self._estimate_fps(),
+                              'started': started, 'closed': False}
+                self._queue.put(('open', self._clip))
+                for frame in self._buffer:
+                    self._enqueue(('frame', frame))
+                self._buffer.clear()
+            if ref is not None:
+                self._clip['refs'].append(ref)
+            self._stop_at = None
+
+    def stop(self):
+        """The detection ended; finish the clip after the post-roll."""
+        with self._lock:
+            if self._clip is not None and self._stop_at is None:
+                self._stop_at = time.time() + self.post_roll
+
+    def close(self):
+        """Finish any clip in progress now and wait for the writer to save it."""
+        with self._lock:
+            if self._clip is not None:
+                self._end_clip()
+            writer, pending = self._writer, self._queue
+            self._writer = None
+        if writer is None:
+            return
+        pending.put(None)
+        writer.join(timeout=30)
+
+    def _expire(self):
+        """End the clip once its post-roll is over, even if no frame arrives to notice."""
+        with self._lock:
+            if self._clip is not None and self._stop_at is not None and time.time() >= self._stop_at:
+                self._end_clip()
+
+    def _open_writer(self, path, fps, frame):
+        height, width = frame.image.shape[:2]
+        for fourcc in FOURCCS:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+            if writer.isOpened():
+                return writer
+            writer.release()
+        logger.error(f"Failed to open video writer for {path}")
+        return None
+
+    def _write_loop(self, items):
+        tmp_folder = os.path.join(self.folder, '.recording')
+        os.makedirs(tmp_folder, exist_ok=True)
+        clip, writer, frames = None, None, 0
+
+        while True:
+            try:
+                item = items.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self._expire()
+                item = ('idle', None)
+            kind, payload = item if item is not None else ('exit', None)
+            try:
+                if kind == 'open':
+                    if clip is not None:
+                        self._complete(clip, writer, frames)
+                    clip, writer, frames = payload, None, 0
+                    clip['tmp_path'] = os.path.join(tmp_folder, clip['name'])
+                elif kind == 'frame' and clip is not None:
+                    if writer is None:
+                        writer = self._open_writer(clip['tmp_path'], clip['fps'], payload)
+                    if writer is not None:
+                        writer.write(payload.image)
+                        frames += 1
+                # A closed clip is complete once the frames queued before the close are written
+                if clip is not None and clip['closed'] and (kind == 'exit' or items.empty()):
+                    self._complete(clip, writer, frames)
+                    clip, writer = None, None
+            except Exception as e:
+                logger.error(f"Error writing clip: {e}")
+            if kind == 'exit':
+                break
+
+        if writer is not None:
+            writer.release()
+
+    def _complete(self, clip, writer, frames):
+        if writer is None:
+            return
+        try:
+            writer.release()
+            self._finish(clip, frames)
+        except Exception as e:
+            logger.error(f"Error finishing clip {clip['name']}: {e}")
+
+    def _finish(self, clip, frames):
+        path = os.path.join(self.folder, clip['name'])
+        os.replace(clip['tmp_path'], path)
+        info = {
+            'path': path,
+            'filename': clip['name'],
+            'started': clip['started'],
+            'duration': frames / clip['fps'] if clip['fps'] else 0.0,
+            'size': os.path.getsize(path),
+            'camera': self.camera_id,
+        }
+        self.clips_written += 1
+        logger.info(f"Finished saving video: {path} ({info['duration']:.1f}s, {info['size']} bytes)")
+        if self.on_clip is not None:
+            try:
+                self.on_clip(clip['refs'], info)
+            except Exception as e:
+                logger.error(f"Error linking clip {path}: {e}")
+
+
+def clip_linker(collection):
+    """Return an ``on_clip`` callback that attaches clips to their detection log documents."""
+    def link_clip(log_ids, clip):
+        if not log_ids:
+            return
+        collection.update_many(
+            {'_id': {'$in': log_ids}},
+            {'$set': {
+                'video_filename': clip['filename'],
+                'clip': {'path': clip['path'], 'duration': clip['duration'], 'size': clip['size']}
+            }}
+        )
+    return link_clip
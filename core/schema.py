@@ -0,0 +1,173 @@
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# JSON schema the model is asked to answer in; Ollama constrains the output to it
+# when passed as the request's ``format``
+DETECTION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'description': {'type': 'string'},
+        'labels': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'label': {'type': 'string'}, 'count': {'type': 'integer'}},
+                'required': ['label', 'count'],
+            },
+        },
+        'person': {'type': 'boolean'},
+        'confidence': {'type': 'number'},
+    },
+    'required': ['description', 'labels', 'person', 'confidence'],
+}
+
+JSON_INSTRUCTION = (
+    " Answer in JSON with: description (one or two sentences), labels (a list of "
+    "{label, count} for each kind of animal or person visible, singular lowercase nouns), "
+    "person (true only if a human is visible) and confidence (0 to 1)."
+)
+
+PERSON_WORDS = ('person', 'people', 'human', 'humans', 'man', 'men', 'woman', 'women', 'poacher', 'poachers',
+                'hunter', 'hunters', 'someone')
+
+# Words the fallback parser recognises as labels, mapped to their singular form
+ANIMAL_WORDS = {
+    'deer': 'deer', 'elephant': 'elephant', 'elephants': 'elephant', 'tiger': 'tiger', 'tigers': 'tiger',
+    'leopard': 'leopard', 'leopards': 'leopard', 'bear': 'bear', 'bears': 'bear', 'boar': 'boar',
+    'boars': 'boar', 'pig': 'boar', 'pigs': 'boar', 'monkey': 'monkey', 'monkeys': 'monkey', 'fox': 'fox',
+    'foxes': 'fox', 'wolf': 'wolf', 'wolves': 'wolf', 'bird': 'bird', 'birds': 'bird', 'owl': 'owl',
+    'owls': 'owl', 'dog': 'dog', 'dogs': 'dog', 'cat': 'cat', 'cats': 'cat', 'cow': 'cow', 'cows': 'cow',
+    'cattle': 'cow', 'goat': 'goat', 'goats': 'goat', 'rabbit': 'rabbit', 'rabbits': 'rabbit',
+    'snake': 'snake', 'snakes': 'snake', 'bison': 'bison', 'gaur': 'bison', 'rhino': 'rhino',
+    'rhinos': 'rhino', 'antelope': 'antelope', 'antelopes': 'antelope', 'porcupine': 'porcupine',
+}
+
+NUMBER_WORDS = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+                'eight': 8, 'nine': 9, 'ten': 10, 'several': 2, 'few': 2, 'many': 3, 'group': 3, 'herd': 3}
+
+# A negation applies to the rest of its clause: "no people or animals are visible". "No one" is
+# covered by "no", and any contraction ending in "n't" ("isn't", "doesn't", "can't") is one too
+NEGATIONS = {'no', 'not', 'cannot', 'never', 'nothing', 'without', 'nobody', 'none', 'neither', 'nor', 'lacks',
+             'lack', 'devoid'}
+CLAUSE_BREAKS = re.compile(r"[.;:!?]|,\s*(?:but|while|although|though|and)\b|\b(?:but|while|although|though)\b")
+# Contractions are kept whole so "isn't" is one token rather than "isn" and "t"
+TOKENS = re.compile(r"[a-z]+n't|[a-z]+|\d+")
+
+
+def build_prompt(prompt):
+    return prompt + JSON_INSTRUCTION
+
+
+def _clauses(text):
+    text = text.lower().replace('\u2019', "'")
+    return [TOKENS.findall(clause) for clause in CLAUSE_BREAKS.split(text)]
+
+
+def _is_negation(token):
+    return token in NEGATIONS or token.endswith("n't")
+
+
+def parse_text(text):
+    """Fallback for answers that are not valid JSON: find labels in the prose.
+
+    A word only counts if no negation comes before it in the same clause, so
+    "no person is visible" and "there are no people" are not detections. The
+    count is taken from a number word right before the label.
+    """
+    counts = {}
+    person = False
+    for tokens in _clauses(text or ''):
+        negated = False
+        for i, token in enumerate(tokens):
+            if _is_negation(token):
+                negated = True
+                continue
+            if negated:
+                continue
+            if token in PERSON_WORDS:
+                person = True
+                label = 'person'
+            elif token in ANIMAL_WORDS:
+                label = ANIMAL_WORDS[token]
+            else:
+                continue
+            previous = tokens[i - 1] if i else ''
+            count = int(previous) if previous.isdigit() else NUMBER_WORDS.get(previous, 1)
+            counts[label] = max(counts.get(label, 0), count)
+    return {
+        'description': text,
+        'labels': [{'label': label, 'count': count} for label, count in counts.items()],
+        'person': person,
+        # Prose gives no confidence; a mention counts as certain, like before
+        'confidence': 1.0 if person else 0.0,
+        'structured': False,
+    }
+
+
+def _extract_json(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    # Models sometimes wrap the object in prose or a code fence
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+
+
+def validate(data):
+    """Normalised copy of a model answer, or None if it does not match the schema."""
+    if not isinstance(data, dict) or not isinstance(data.get('description'), str):
+        return None
+    items = data.get('labels') or []
+    if not isinstance(items, list):
+        return None
+    labels = {}
+    for item in items:
+        if isinstance(item, str):
+            item = {'label': item, 'count': 1}
+        if not isinstance(item, dict) or not isinstance(item.get('label'), str) or not item['label'].strip():
+            return None
+        label = item['label'].strip().lower()
+        label = 'person' if label in PERSON_WORDS else ANIMAL_WORDS.get(label, label)
+        try:
+            count = max(1, int(item.get('count', 1)))
+        except (TypeError, ValueError):
+            return None
+        labels[label] = max(labels.get(label, 0), count)
+
+    person = data.get('person')
+    if not isinstance(person, bool):
+        person = 'person' in labels
+    try:
+        confidence = min(1.0, max(0.0, float(data.get('confidence', 1.0 if person else 0.0))))
+    except (TypeError, ValueError):
+        return None
+    if person and 'person' not in labels:
+        labels['person'] = 1
+    return {
+        'description': data['description'].strip(),
+        'labels': [{'label': label, 'count': count} for label, count in labels.items()],
+        'person': person,
+        'confidence': confidence,
+        'structured': True,
+    }
+
+
+def parse_response(text):
+    """Typed detection fields from a model answer: the JSON schema if it validates, else the prose."""
+    raw = _extract_json(text or '')
+    data = validate(raw)
+    if data is None:
+        logger.debug("Model answer did not match the detection schema; parsing it as text.")
+        if isinstance(raw, dict) and isinstance(raw.get('description'), str):
+            text = raw['description']
+        return parse_text(text)
+    return data
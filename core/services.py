@@ -0,0 +1,102 @@
+import os
+import logging
+import threading
+
+from core import config
+from core.db import get_db
+from core.event_bus import EventBus
+from core.events import EventLog
+from core.footage import FootageCatalog
+from core.log_sink import LogSink
+from core.logs import ensure_indexes
+from core.recorder import clip_linker
+from core.stats import ensure_rollups
+from core.storage import StorageManager
+
+logger = logging.getLogger(__name__)
+
+# Wiring shared by the Flask, PyQt5 and Streamlit front ends. Everything is
+# created on first use, so importing a front end never touches MongoDB.
+
+_log_sink = None
+_event_bus = None
+_setup_started = False
+_lock = threading.Lock()
+
+
+def log_collection():
+    return get_db()[config.LOG_COLLECTION]
+
+
+def stats_collection():
+    return get_db()[config.STATS_COLLECTION]
+
+
+def get_log_sink():
+    """The process-wide buffered writer for detection logs."""
+    global _log_sink
+    with _lock:
+        if _log_sink is None:
+            _log_sink = LogSink(get_db())
+        return _log_sink
+
+
+def get_event_bus():
+    """The process-wide bus live dashboards subscribe to for detection events."""
+    global _event_bus
+    with _lock:
+        if _event_bus is None:
+            _event_bus = EventBus()
+        return _event_bus
+
+
+def create_event_log():
+    """EventLog whose writes, including the stats rollups, go through the log sink."""
+    sink = get_log_sink()
+    return EventLog(sink.collection(config.LOG_COLLECTION), sink.collection(config.STATS_COLLECTION),
+                    bus=get_event_bus())
+
+
+def create_clip_linker(catalog=None):
+    """``on_clip`` callback that links clips to their logs and, if given, adds them to ``catalog``."""
+    link_clip = clip_linker(get_log_sink().collection(config.LOG_COLLECTION))
+    if catalog is None:
+        return link_clip
+
+    def on_clip(refs, clip):
+        link_clip(refs, clip)
+        catalog.on_clip(refs, clip)
+    return on_clip
+
+
+def create_footage_catalog(folder):
+    """Footage index for ``folder``, scanned now and periodically in the background."""
+    os.makedirs(folder, exist_ok=True)
+    catalog = FootageCatalog(get_db()[config.FOOTAGE_COLLECTION], folder)
+    catalog.start_scanner()
+    return catalog
+
+
+def start_storage_manager(catalogs):
+    """Enforce the footage quotas over ``catalogs`` (first one is kept on dedupe) in the background."""
+    max_bytes = int(config.STORAGE_MAX_GB * 1024 ** 3) if config.STORAGE_MAX_GB else None
+    manager = StorageManager(catalogs, log_collection(), max_bytes=max_bytes,
+                             max_age_days=config.STORAGE_MAX_AGE_DAYS,
+                             transcode_after_days=config.TRANSCODE_AFTER_DAYS, ffmpeg=config.FFMPEG)
+    manager.start()
+    return manager
+
+
+def prepare_database():
+    """Create indexes and backfill the stats rollups once, on a background thread."""
+    global _setup_started
+    with _lock:
+        if _setup_started:
+            return
+        _setup_started = True
+
+    def run():
+        ensure_indexes(log_collection())
+        ensure_rollups(log_collection(), stats_collection())
+
+    threading.Thread(target=run, daemon=True, name="db-setup").start()
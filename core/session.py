@@ -0,0 +1,142 @@
+import time
+import logging
+import threading
+
+from core.cameras import build_camera_pipeline
+from core.config import CAMERAS_FILE
+from core.events import create_tracker
+from core.metrics import LogSampler
+from core.motion import MotionGate
+from core.pipeline import DetectionPipeline
+
+logger = logging.getLogger(__name__)
+detection_sampler = LogSampler(logger)
+
+
+class DetectionSession:
+    """A camera's detection pipeline that runs from ``start`` to ``stop``, whoever is watching.
+
+    Front ends that re-run their page code (Streamlit) keep one session per
+    camera for the whole process and only read from it: ``snapshot`` is the
+    newest frame with the latest detection drawn on it and ``status`` the
+    counters, so any number of viewers and reruns share one capture. Results
+    feed the camera's event tracker; a run's tracker is closed by ``stop``,
+    and results still in flight from a stopped run are ignored.
+    """
+
+    def __init__(self, camera, scheduler, event_log, screen=None, recorder=None, gate_factory=MotionGate):
+        self.camera = camera
+        self.scheduler = scheduler
+        self.event_log = event_log
+        self.screen = screen
+        # Kept across runs; stop finishes the clip in progress
+        self.recorder = recorder
+        self.gate_factory = gate_factory
+
+        self.pipeline = None
+        self.tracker = None
+        self.started_at = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        pipeline = self.pipeline
+        return pipeline is not None and pipeline.running
+
+    def start(self):
+        """Open the camera and start detecting; return False if it could not be opened."""
+        with self._lock:
+            if self.running:
+                return True
+            self._stop()
+            tracker = create_tracker(self.event_log, self.camera.id, self.recorder)
+
+            def on_result(frame, result):
+                with self._lock:
+                    if self.tracker is not tracker:
+                        return
+                    # Events open after a few positive frames and close after a quiet period;
+                    # MongoDB is only written on those transitions
+                    tracker.update(result.detection, result.timestamp)
+                if result.description is not None:
+                    detection_sampler.debug(f"LLaVA Output: {result.description}")
+
+            pipeline = DetectionPipeline(self.scheduler, self.camera.id, source=self.camera.source,
+                                         gate=self.gate_factory(), screen=self.screen, recorder=self.recorder,
+                                         width=self.camera.width, height=self.camera.height,
+                                         priority=self.camera.priority, on_result=on_result)
+            if not pipeline.start():
+                self.error = f"Failed to open camera {self.camera.name}."
+                logger.error(self.error)
+                return False
+            self.pipeline, self.tracker = pipeline, tracker
+            self.started_at = time.time()
+            self.error = None
+            logger.info(f"Detection started on camera {self.camera.id}.")
+            return True
+
+    def stop(self):
+        with self._lock:
+            self._stop()
+
+    def _stop(self):
+        pipeline, tracker = self.pipeline, self.tracker
+        self.pipeline = self.tracker = None
+        if pipeline is None:
+            return
+        pipeline.stop()
+        pipeline.capture.join(timeout=5)
+        tracker.close()
+        # No more frames are coming, so finish the clip now rather than after the post-roll
+        if self.recorder is not None:
+            self.recorder.close()
+        logger.info(f"Detection stopped on camera {self.camera.id}: {pipeline.stats()}")
+
+    def snapshot(self):
+        """JPEG of the newest frame with the latest detection drawn on it, or None."""
+        pipeline = self.pipeline
+        if pipeline is None:
+            return None
+        seq, frame = pipeline.capture.latest.get(timeout=0)
+        if frame is None:
+            return None
+        try:
+            return pipeline.encode(frame)
+        except ValueError as e:
+            logger.error(str(e))
+            return None
+
+    def status(self):
+        pipeline = self.pipeline
+        status = {
+            'camera': self.camera.name,
+            'running': self.running,
+            'started_at': self.started_at if pipeline is not None else None,
+            'error': self.error,
+            'person': False,
+            'description': None,
+            'detected_at': None,
+        }
+        if pipeline is None:
+            return status
+        if not pipeline.running:
+            status['error'] = "The camera stopped delivering frames."
+        result = pipeline.result
+        if result is not None:
+            status.update(person=result.person, description=result.description, detected_at=result.timestamp)
+        status.update(pipeline.stats())
+        return status
+
+
+def create_sessions(detector, event_log, path=CAMERAS_FILE, recorder_factory=None):
+    """One session per configured camera, all sharing one inference scheduler.
+
+    The scheduler and screening stage are built as for ``CameraRegistry.from_config``.
+    """
+    configs, scheduler, screen = build_camera_pipeline(detector, path)
+    sessions = {}
+    for camera in configs:
+        recorder = recorder_factory(camera) if recorder_factory is not None else None
+        sessions[camera.id] = DetectionSession(camera, scheduler, event_log, screen, recorder)
+    return sessions
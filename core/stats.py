@@ -0,0 +1,122 @@
+import logging
+import datetime
+
+import pymongo
+
+from core.logs import local_timezone, mongo_timezone
+
+logger = logging.getLogger(__name__)
+
+# One document per (date, hour, camera) with the number of closed events,
+# their total duration and their ids, maintained as events close
+ROLLUP_KEY = [('date', pymongo.ASCENDING), ('hour', pymongo.ASCENDING), ('camera', pymongo.ASCENDING)]
+
+
+def ensure_rollups(log_collection, rollup_collection):
+    """Create the rollup indexes and backfill the rollups from existing logs once."""
+    try:
+        rollup_collection.create_index(ROLLUP_KEY, unique=True, name='bucket')
+        rollup_collection.create_index([('month', pymongo.ASCENDING)], name='month')
+        if rollup_collection.estimated_document_count() == 0 and log_collection.estimated_document_count() > 0:
+            rebuild_rollups(log_collection, rollup_collection)
+    except Exception as e:
+        logger.error(f"Failed to prepare detection statistics: {e}")
+
+
+def rebuild_rollups(log_collection, rollup_collection):
+    """Recompute every rollup bucket from the closed events in the detection logs.
+
+    Buckets are local days and hours; logs not yet migrated to the datetime
+    schema are read from their local date and time strings.
+    """
+    logger.info("Rebuilding detection statistics from the logs.")
+    timezone = mongo_timezone()
+    rollup_collection.delete_many({})
+    log_collection.aggregate([
+        # Only closed events: an open one is counted by record_event when it closes
+        {'$match': {'$or': [{'start': {'$type': 'date'}, 'end': {'$type': 'date'}},
+                            {'date': {'$type': 'string'}, 'detection_time': {'$type': 'string'},
+                             'close_time': {'$type': 'string'}}]}},
+        {'$group': {
+            '_id': {
+                'date': {'$cond': [{'$eq': [{'$type': '$start'}, 'date']},
+                                   {'$dateToString': {'date': '$start', 'format': '%Y-%m-%d', 'timezone': timezone}},
+                                   '$date']},
+                'hour': {'$cond': [{'$eq': [{'$type': '$start'}, 'date']},
+                                   {'$hour': {'date': '$start', 'timezone': timezone}},
+                                   {'$toInt': {'$substrCP': ['$detection_time', 0, 2]}}]},
+                'camera': {'$ifNull': ['$meta.camera', {'$ifNull': ['$camera', None]}]},
+            },
+            'count': {'$sum': 1},
+            'duration': {'$sum': {'$ifNull': ['$duration', 0]}},
+            'events': {'$push': '$_id'},
+        }},
+        {'$project': {
+            '_id': 0,
+            'date': '$_id.date',
+            'hour': '$_id.hour',
+            'camera': '$_id.camera',
+            'month': {'$substrCP': ['$_id.date', 0, 7]},
+            'count': 1,
+            'duration': 1,
+            'events': 1,
+        }},
+        {'$merge': {'into': rollup_collection.name, 'on': ['date', 'hour', 'camera'], 'whenMatched': 'replace'}},
+    ])
+
+
+def record_event(rollup_collection, event_id, started_at, camera, duration):
+    """Count one closed event in its (date, hour, camera) bucket.
+
+    Both writes are idempotent, so replaying them (e.g. from the log sink's
+    spool) does not count the event twice: the first only creates the bucket
+    and the second only matches while the event id is not in it yet.
+    """
+    started = datetime.datetime.fromtimestamp(started_at, local_timezone())
+    bucket = {'date': started.strftime('%Y-%m-%d'), 'hour': started.hour, 'camera': camera}
+    rollup_collection.update_one(
+        bucket,
+        {'$setOnInsert': {'month': started.strftime('%Y-%m'), 'count': 0, 'duration': 0, 'events': []}},
+        upsert=True
+    )
+    rollup_collection.update_one(
+        dict(bucket, events={'$ne': event_id}),
+        {'$inc': {'count': 1, 'duration': duration}, '$push': {'events': event_id}}
+    )
+
+
+def _bucket(field):
+    return [
+        {'$group': {'_id': field, 'count': {'$sum': '$count'}, 'duration': {'$sum': '$duration'}}},
+        {'$sort': {'_id': 1}},
+        {'$project': {'_id': 0, 'key': '$_id', 'count': 1, 'duration': 1}},
+    ]
+
+
+def query_stats(rollup_collection, start=None, end=None, camera=None):
+    """Per-day, per-hour-of-day and per-month event counts and total durations.
+
+    Runs over the rollup buckets, so the cost depends on the number of
+    buckets in range rather than the number of detections.
+    """
+    match = {}
+    if start or end:
+        match['date'] = {}
+        if start:
+            match['date']['$gte'] = start
+        if end:
+            match['date']['$lte'] = end
+    if camera:
+        match['camera'] = camera
+
+    result = list(rollup_collection.aggregate([
+        {'$match': match},
+        {'$facet': {
+            'daily': _bucket('$date'),
+            'hourly': _bucket('$hour'),
+            'monthly': _bucket('$month'),
+        }},
+    ]))
+    stats = result[0] if result else {'daily': [], 'hourly': [], 'monthly': []}
+    stats['total'] = sum(bucket['count'] for bucket in stats['daily'])
+    return stats
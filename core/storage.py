@@ -0,0 +1,271 @@
+import os
+import sys
+import time
+import hashlib
+import logging
+import datetime
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Re-encoded clips: H.264 at a low bitrate, no audio (the cameras have none)
+TRANSCODE_ARGS = ['-c:v', 'libx264', '-preset', 'veryfast', '-b:v', '400k', '-an', '-movflags', '+faststart']
+
+
+def _low_priority():
+    """subprocess arguments that run a child at the lowest CPU priority."""
+    if sys.platform == 'win32':
+        return {'creationflags': subprocess.IDLE_PRIORITY_CLASS}
+    return {'preexec_fn': lambda: os.nice(19)}
+
+
+def _inode(path):
+    """Identity of the file's data, shared by all of its hard links."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path
+    return stat.st_dev, stat.st_ino
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StorageManager:
+    """Background job that keeps the footage folders within their disk budget.
+
+    Each pass, over every catalog's folder:
+
+    * identical files are deduplicated: the copy in a later folder is
+      replaced by a hard link to the one in the first folder, or removed with
+      its references moved over when the folders are on different disks;
+    * clips older than ``transcode_after_days`` are re-encoded to a low
+      bitrate H.264 .mp4 with ffmpeg at idle CPU priority; a clip ffmpeg
+      fails on is marked and not tried again unless the file changes;
+    * clips not linked to any detection log are deleted once older than
+      ``max_age_days`` (never when it is None), and if the folders still
+      exceed ``max_bytes`` the oldest clips are deleted, unlinked ones first.
+      Hard-linked copies are counted once.
+
+    Whenever a file is renamed or removed, the new file is written first,
+    then the ``video_filename``/``clip`` references in the detection logs are
+    updated, and only then is the old file deleted, so a log never points at
+    a missing clip.
+    """
+
+    def __init__(self, catalogs, log_collection, max_bytes=None, max_age_days=None, transcode_after_days=2,
+                 ffmpeg='ffmpeg', interval=3600.0):
+        self.catalogs = catalogs
+        self.log_collection = log_collection
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.transcode_after_days = transcode_after_days
+        self.ffmpeg = ffmpeg
+        self.interval = interval
+
+        self.deduplicated = 0
+        self.transcoded = 0
+        self.deleted = 0
+        self.bytes_freed = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        def run():
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Storage manager pass failed: {e}")
+                time.sleep(self.interval)
+
+        threading.Thread(target=run, daemon=True, name="storage-manager").start()
+
+    def stats(self):
+        return {
+            'deduplicated': self.deduplicated,
+            'transcoded': self.transcoded,
+            'deleted': self.deleted,
+            'bytes_freed': self.bytes_freed,
+        }
+
+    def run_once(self):
+        with self._lock:
+            for catalog in self.catalogs:
+                catalog.scan()
+            self.deduplicate()
+            if self.transcode_after_days is not None:
+                self.transcode_old()
+            self.enforce_quotas()
+
+    def _clips(self):
+        """(catalog, document) for every indexed clip, oldest first."""
+        clips = [(catalog, video) for catalog in self.catalogs for video in catalog.find()]
+        return sorted(clips, key=lambda clip: clip[1]['started'])
+
+    def _is_linked(self, filename):
+        return self.log_collection.count_documents({'video_filename': filename}, limit=1) > 0
+
+    def _free(self, size):
+        self.bytes_freed += size
+
+    # Deduplication
+
+    def deduplicate(self):
+        by_size = {}
+        for catalog, video in self._clips():
+            by_size.setdefault(video['size'], []).append((catalog, video))
+
+        for candidates in by_size.values():
+            if len(candidates) < 2:
+                continue
+            by_hash = {}
+            for catalog, video in candidates:
+                by_hash.setdefault(file_hash(video['path']), []).append((catalog, video))
+            for copies in by_hash.values():
+                # Keep the copy in the first configured folder
+                copies.sort(key=lambda clip: self.catalogs.index(clip[0]))
+                keep = copies[0][1]
+                for catalog, video in copies[1:]:
+                    self._replace_duplicate(catalog, video, keep)
+
+    def _replace_duplicate(self, catalog, video, keep):
+        if os.path.samefile(video['path'], keep['path']):
+            return
+        try:
+            # Same disk: a hard link keeps both paths valid, so no reference changes
+            tmp_path = f"{video['path']}.link"
+            os.link(keep['path'], tmp_path)
+            os.replace(tmp_path, video['path'])
+        except OSError:
+            # Different disks: move references to the kept copy, then delete this one
+            self._move_references(video, keep['filename'], keep['path'])
+            self._delete_file(catalog, video)
+            self.deduplicated += 1
+            return
+        self.deduplicated += 1
+        self._free(video['size'])
+        logger.info(f"Deduplicated {video['path']} against {keep['path']}")
+
+    # Transcoding
+
+    def transcode_old(self):
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=self.transcode_after_days)
+        for catalog, video in self._clips():
+            if video['started'] > cutoff or video.get('transcoded') or video.get('transcode_failed'):
+                continue
+            if not self._transcode(catalog, video):
+                # ffmpeg itself could not be run; try again next pass
+                break
+
+    def _transcode(self, catalog, video):
+        """Re-encode one clip; returns False only if ffmpeg could not be run at all."""
+        filename = f"{os.path.splitext(video['filename'])[0]}.mp4"
+        path = os.path.join(catalog.folder, filename)
+        if path != video['path'] and os.path.exists(path):
+            logger.warning(f"Not transcoding {video['path']}: {path} already exists")
+            catalog.collection.update_one({'path': video['path']}, {'$set': {'transcode_failed': True}})
+            return True
+        tmp_folder = os.path.join(catalog.folder, '.recording')
+        os.makedirs(tmp_folder, exist_ok=True)
+        tmp_path = os.path.join(tmp_folder, f"transcode_{filename}")
+
+        command = [self.ffmpeg, '-y', '-loglevel', 'error', '-i', video['path']] + TRANSCODE_ARGS + [tmp_path]
+        try:
+            subprocess.run(command, check=True, capture_output=True, timeout=3600, **_low_priority())
+        except OSError as e:
+            logger.error(f"Failed to run {self.ffmpeg}: {e}")
+            return False
+        except subprocess.SubprocessError as e:
+            logger.error(f"Failed to transcode {video['path']}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            # Re-indexing a changed file drops the mark, so it is only retried then
+            catalog.collection.update_one({'path': video['path']}, {'$set': {'transcode_failed': True}})
+            return True
+
+        new_size = os.path.getsize(tmp_path)
+        if new_size == 0 or new_size >= video['size']:
+            # Already compact; remember that so it is not tried again
+            os.remove(tmp_path)
+            catalog.collection.update_one({'path': video['path']}, {'$set': {'transcoded': True}})
+            return True
+
+        os.replace(tmp_path, path)
+        if path != video['path']:
+            self._move_references(video, filename, path)
+            self._delete_file(catalog, video, freed=False)
+        catalog.add(path, camera=video.get('camera'), started=video['started'])
+        catalog.collection.update_one({'path': path}, {'$set': {'transcoded': True}})
+        self.transcoded += 1
+        self._free(video['size'] - new_size)
+        logger.info(f"Transcoded {video['path']} ({video['size']} -> {new_size} bytes)")
+        return True
+
+    # Retention
+
+    def enforce_quotas(self):
+        clips = self._clips()
+        now = datetime.datetime.now()
+        linked = {video['filename']: self._is_linked(video['filename']) for _, video in clips}
+        inodes = {video['path']: _inode(video['path']) for _, video in clips}
+
+        if self.max_age_days is not None:
+            cutoff = now - datetime.timedelta(days=self.max_age_days)
+            for catalog, video in list(clips):
+                if video['started'] < cutoff and not linked[video['filename']]:
+                    self._delete_file(catalog, video)
+                    clips.remove((catalog, video))
+
+        if self.max_bytes is None:
+            return
+        # Deduplicated copies are hard links to the same data, so each file is counted once
+        total = sum({inodes[video['path']]: video['size'] for _, video in clips}.values())
+        # Unlinked clips go first, oldest first within each group
+        for catalog, video in sorted(clips, key=lambda clip: (linked[clip[1]['filename']], clip[1]['started'])):
+            if total <= self.max_bytes:
+                break
+            clips.remove((catalog, video))
+            # Logs refer to clips by filename; keep the link while another folder still has a copy
+            if linked[video['filename']] and not any(other['filename'] == video['filename'] for _, other in clips):
+                self._move_references(video, None, None)
+            self._delete_file(catalog, video)
+            # Deleting one of several links frees nothing
+            if not any(inodes[other['path']] == inodes[video['path']] for _, other in clips):
+                total -= video['size']
+
+    # File and reference updates
+
+    def _move_references(self, video, filename, path):
+        """Point logs at the clip's replacement, or unlink them when ``filename`` is None."""
+        query = {'video_filename': video['filename']}
+        if filename is None:
+            update = {'$unset': {'video_filename': '', 'clip': ''}}
+        else:
+            update = {'$set': {'video_filename': filename, 'clip.path': path}}
+        self.log_collection.update_many(query, update)
+
+    def _delete_file(self, catalog, video, freed=True):
+        try:
+            links = os.stat(video['path']).st_nlink
+            os.remove(video['path'])
+        except FileNotFoundError:
+            links = 0
+        thumbnail = video.get('thumbnail')
+        if thumbnail:
+            try:
+                os.remove(os.path.join(catalog.thumbnail_folder, thumbnail))
+            except FileNotFoundError:
+                pass
+        catalog.remove(video['path'])
+        if freed:
+            self.deleted += 1
+            # Other hard links still hold the data
+            if links == 1:
+                self._free(video['size'])
+            logger.info(f"Deleted footage {video['path']}")
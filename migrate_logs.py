@@ -0,0 +1,140 @@
+"""Convert detection logs from the string schema to the datetime schema.
+
+Version 1 logs keep the event as local ``date``/``detection_time``/
+``close_time`` strings with a top-level ``camera``; version 2 stores UTC
+``start``/``end`` datetimes and ``meta.camera`` (see core/logs.py). Logs are
+converted in ``_id`` order, one bulk write per batch, and the last converted
+id is saved in the ``migrations`` collection after every batch, so an
+interrupted run carries on where it stopped. Only version 1 documents are
+ever matched, so running it again is harmless.
+
+    python migrate_logs.py --dry-run
+    python migrate_logs.py --timezone Asia/Kolkata --drop-legacy-indexes --rebuild-stats
+"""
+import logging
+import argparse
+import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from core.db import get_db
+from core.logs import LEGACY_FIELDS, LEGACY_INDEXES, ensure_indexes, local_timezone, migrate_document
+from core.services import log_collection, stats_collection
+from core.stats import rebuild_rollups
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MIGRATION_ID = 'detection_logs_v2'
+
+
+class Checkpoint:
+    """Progress of the migration, kept in MongoDB next to the logs."""
+
+    def __init__(self, collection, restart=False):
+        self.collection = collection
+        state = None if restart else collection.find_one({'_id': MIGRATION_ID})
+        self.last_id = state['last_id'] if state else None
+        self.converted = state['converted'] if state else 0
+        self.failed = state['failed'] if state else 0
+
+    def save(self, last_id):
+        self.last_id = last_id
+        self.collection.replace_one({'_id': MIGRATION_ID}, {
+            'last_id': last_id,
+            'converted': self.converted,
+            'failed': self.failed,
+            'updated_at': datetime.datetime.now(datetime.timezone.utc),
+        }, upsert=True)
+
+
+def convert_batch(logs, tz, keep_legacy_fields):
+    """Update operations for a batch of version 1 logs and the number that could not be read."""
+    operations, failed = [], 0
+    for log in logs:
+        try:
+            fields = migrate_document(log, tz)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Skipping log {log['_id']}: {e}")
+            failed += 1
+            continue
+        update = {'$set': fields}
+        if not keep_legacy_fields:
+            update['$unset'] = {field: '' for field in LEGACY_FIELDS}
+        # Matching on the version too keeps a concurrent or repeated run from converting twice
+        operations.append(UpdateOne({'_id': log['_id'], 'schema_version': {'$exists': False}}, update))
+    return operations, failed
+
+
+def drop_legacy_indexes(collection):
+    for name in LEGACY_INDEXES:
+        try:
+            collection.drop_index(name)
+            logger.info(f"Dropped index {name}.")
+        except OperationFailure:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--timezone', help="Zone the old strings were written in (default: WILDCARE_TIMEZONE "
+                                           "or the server's)")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help="Count and check the logs without writing")
+    parser.add_argument('--restart', action='store_true', help="Ignore the saved progress")
+    parser.add_argument('--keep-legacy-fields', action='store_true',
+                        help="Leave the old date/time strings on converted logs")
+    parser.add_argument('--drop-legacy-indexes', action='store_true',
+                        help="Drop the string-schema indexes once every log is converted")
+    parser.add_argument('--rebuild-stats', action='store_true', help="Recompute the statistics rollups afterwards")
+    args = parser.parse_args()
+
+    if args.timezone:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo(args.timezone)
+    else:
+        tz = local_timezone()
+
+    collection = log_collection()
+    checkpoint = Checkpoint(get_db()['migrations'], restart=args.restart)
+    pending = {'schema_version': {'$exists': False}}
+    logger.info(f"{collection.count_documents(pending)} log(s) to convert; "
+                f"{checkpoint.converted} converted and {checkpoint.failed} skipped by earlier runs.")
+
+    last_id = checkpoint.last_id
+    while True:
+        query = dict(pending, _id={'$gt': last_id}) if last_id is not None else pending
+        logs = list(collection.find(query).sort('_id', 1).limit(args.batch_size))
+        if not logs:
+            break
+        last_id = logs[-1]['_id']
+        operations, failed = convert_batch(logs, tz, args.keep_legacy_fields)
+        if args.dry_run:
+            checkpoint.converted += len(operations)
+            checkpoint.failed += failed
+            continue
+        if operations:
+            result = collection.bulk_write(operations, ordered=False)
+            checkpoint.converted += result.modified_count
+        checkpoint.failed += failed
+        checkpoint.save(last_id)
+        logger.info(f"Converted {checkpoint.converted} log(s), skipped {checkpoint.failed}.")
+
+    if args.dry_run:
+        logger.info(f"Dry run: {checkpoint.converted} log(s) would be converted, {checkpoint.failed} skipped.")
+        return
+
+    ensure_indexes(collection)
+    remaining = collection.count_documents(pending)
+    if remaining:
+        logger.warning(f"{remaining} log(s) could not be converted and still use the old schema.")
+    elif args.drop_legacy_indexes:
+        drop_legacy_indexes(collection)
+    if args.rebuild_stats:
+        rebuild_rollups(collection, stats_collection())
+    logger.info("Migration finished.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,101 @@
 import sys
 import cv2
-import datetime
 import logging
-import io
-import ollama
-from pymongo import MongoClient
+import threading
 from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QPushButton, QVBoxLayout, QWidget, QTextBrowser
 from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtCore import QTimer
-from PIL import Image
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+
+from core import services
+from core.cache import DescriptionCache
+from core.detectors import create_detector
+from core.logs import find_page, to_json
+from core.metrics import metrics
+from core.session import create_sessions
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# MongoDB setup
-try:
-    client = MongoClient('mongodb://127.0.0.1:27017', serverSelectionTimeoutMS=5000)
-    db = client['wildlife_conservation']  
-    log_collection = db['detection_logs']
-    client.server_info()  
-    logger.info("Connected to MongoDB successfully.")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {e}")
-    raise
+LOG_PAGE_SIZE = 50
+
+# MongoDB connects on first use, so the window opens even if it is down;
+# event writes are batched off the UI thread and spooled while it is unavailable
+log_collection = services.log_collection()
+
+
+def render_frame(pipeline, frame):
+    """RGB image of ``frame`` for the window, with the pipeline's latest detection drawn on it."""
+    image = pipeline.overlay(frame)
+    return frame.rgb() if image is None else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class FrameWorker(QThread):
+    """Start a camera's detection session and hand its newest frames to the window.
+
+    Capture, the motion gate, screening and inference run in the session's
+    ``DetectionPipeline``, as they do for the web front ends. A new frame is
+    only emitted once the window has shown the previous one, so a busy UI
+    skips frames instead of queueing them.
+    """
+
+    frame_ready = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+        self.pipeline = None
+        self._running = threading.Event()
+        self._running.set()
+        self._displayed = threading.Event()
+
+    def run(self):
+        # Opening a camera can take seconds, so it happens here rather than on the UI thread
+        if not self.session.start():
+            self.failed.emit(self.session.error)
+            return
+        self.pipeline = self.session.pipeline
+        self._displayed.set()
+        seq = 0
+        while self._running.is_set():
+            if not self.pipeline.running:
+                self.failed.emit("The camera stopped delivering frames.")
+                break
+            if not self._displayed.wait(timeout=0.5):
+                continue
+            seq, frame = self.pipeline.capture.latest.get(after=seq, timeout=0.5)
+            if frame is not None:
+                self._displayed.clear()
+                self.frame_ready.emit(frame)
+
+    def frame_shown(self):
+        self._displayed.set()
+
+    def stop(self):
+        self._running.clear()
+        self.wait()
+
+
+class LogLoader(QThread):
+    """Fetch one page of detection logs from MongoDB."""
+
+    loaded = pyqtSignal(list, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, cursor=None, limit=LOG_PAGE_SIZE):
+        super().__init__()
+        self.cursor = cursor
+        self.limit = limit
+
+    def run(self):
+        try:
+            logs, next_cursor = find_page(log_collection, {}, self.limit, self.cursor)
+            self.loaded.emit(logs, next_cursor)
+        except Exception as e:
+            logger.error(f"Error fetching logs from MongoDB: {e}")
+            self.failed.emit(str(e))
+
 
 class WildlifeMonitor(QMainWindow):
     def __init__(self):
@@ -34,7 +106,7 @@ class WildlifeMonitor(QMainWindow):
 
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
-        
+
         # Layout
         self.layout = QVBoxLayout()
 
@@ -46,6 +118,13 @@ class WildlifeMonitor(QMainWindow):
         self.logs_display = QTextBrowser()
         self.layout.addWidget(self.logs_display)
 
+        # Frame counters and per-stage latency, refreshed once a second
+        self.metrics_label = QLabel(self)
+        self.layout.addWidget(self.metrics_label)
+        self.metrics_timer = QTimer()
+        self.metrics_timer.timeout.connect(self.update_metrics)
+        self.metrics_timer.start(1000)
+
         # Buttons
         self.start_button = QPushButton("Start Detection")
         self.start_button.clicked.connect(self.start_detection)
@@ -59,109 +138,102 @@ class WildlifeMonitor(QMainWindow):
         self.refresh_logs_button.clicked.connect(self.load_logs)
         self.layout.addWidget(self.refresh_logs_button)
 
-        self.central_widget.setLayout(self.layout)
+        self.more_logs_button = QPushButton("Load More Logs")
+        self.more_logs_button.clicked.connect(self.load_more_logs)
+        self.more_logs_button.setEnabled(False)
+        self.layout.addWidget(self.more_logs_button)
 
-        # Video Capture
-        self.cap = cv2.VideoCapture(0)
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
+        self.central_widget.setLayout(self.layout)
 
-        # State Variables
-        self.description_logged = False
-        self.start_time = None
+        # The first configured camera, run by the same detection session as the Streamlit page
+        self.detector = create_detector('hog', cache=DescriptionCache(), prompt="What is in the image?",
+                                        options={"num_gpu": 1})
+        self.session = next(iter(create_sessions(self.detector, services.create_event_log()).values()))
+        self.frame_worker = None
 
-    def process_frame(self, frame):
-        """Send frame to LLaVA model via Ollama and return the response."""
-        try:
-            # Convert OpenCV frame to PIL Image
-            image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-
-            # Convert to bytes for Ollama
-            img_bytes = io.BytesIO()
-            image.save(img_bytes, format='JPEG')
-            img_bytes = img_bytes.getvalue()
-
-            # Send image to LLaVA via Ollama
-            response = ollama.chat(
-                model='llava',
-                messages=[{"role": "user", "content": "What is in the image?", "images": [img_bytes]}],
-                options={"num_gpu": 1}
-            )
-
-            return response['message']['content']
-        except Exception as e:
-            logger.error(f"Error processing frame with LLaVA: {e}")
-            return "Error processing frame."
-
-    def update_frame(self):
-        """Update the video feed and process frames."""
-        ret, frame = self.cap.read()
-        if not ret:
-            logger.error("Failed to grab frame.")
-            return
-        
-        # Get description from LLaVA
-        description = self.process_frame(frame)
-        logger.info(f"LLaVA Output: {description}")
-
-        # Log Detection
-        if not self.description_logged:
-            self.start_time = datetime.datetime.now()
-            detection_time = self.start_time.strftime('%H:%M:%S')
-            date = self.start_time.strftime('%Y-%m-%d')
-
-            try:
-                log_collection.insert_one({
-                    'date': date,
-                    'detection_time': detection_time,
-                    'close_time': None,
-                    'description': description
-                })
-                self.description_logged = True
-            except Exception as e:
-                logger.error(f"Error logging detection to MongoDB: {e}")
-
-        # Convert Frame to QPixmap
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        height, width, channel = frame.shape
-        bytes_per_line = 3 * width
-        q_image = QImage(frame.data, width, height, bytes_per_line, QImage.Format_RGB888)
-        self.video_label.setPixmap(QPixmap.fromImage(q_image))
-
-        # Reset Logging
-        if self.description_logged:
-            close_time = datetime.datetime.now().strftime('%H:%M:%S')
-            try:
-                log_collection.update_one(
-                    {'date': date, 'detection_time': detection_time, 'close_time': None},
-                    {'$set': {'close_time': close_time}}
-                )
-                self.description_logged = False
-            except Exception as e:
-                logger.error(f"Error updating close time in MongoDB: {e}")
+        self.log_loader = None
+        self.logs_cursor = None
 
     def start_detection(self):
         """Start video capture and object detection."""
-        self.cap.open(0)
-        self.timer.start(50)
+        if self.frame_worker is not None:
+            return
+        self.frame_worker = FrameWorker(self.session)
+        self.frame_worker.frame_ready.connect(self.update_frame)
+        self.frame_worker.failed.connect(self.capture_failed)
+        self.frame_worker.start()
 
     def stop_detection(self):
         """Stop video capture and object detection."""
-        self.timer.stop()
-        self.cap.release()
+        if self.frame_worker is None:
+            return
+        self.frame_worker.stop()
+        # Closes the open event; a model call still in progress finishes on its own and is ignored
+        self.session.stop()
+        self.frame_worker = None
         self.video_label.clear()
 
+    def capture_failed(self, message):
+        logger.error(message)
+        self.stop_detection()
+        self.video_label.setText(message)
+
+    def update_frame(self, frame):
+        """Show a captured frame with the latest detection drawn on it."""
+        if self.frame_worker is None:
+            return
+        with metrics.timer('display'):
+            rgb = render_frame(self.frame_worker.pipeline, frame)
+
+            # Convert Frame to QPixmap
+            height, width, channel = rgb.shape
+            bytes_per_line = 3 * width
+            q_image = QImage(rgb.data, width, height, bytes_per_line, QImage.Format_RGB888)
+            self.video_label.setPixmap(QPixmap.fromImage(q_image))
+        self.frame_worker.frame_shown()
+
+    def update_metrics(self):
+        self.metrics_label.setText(metrics.summary_text())
+
     def load_logs(self):
-        """Load logs from MongoDB and display in text browser."""
-        try:
-            logs = log_collection.find()
-            logs_text = ""
-            for log in logs:
-                logs_text += f"Date: {log['date']}, Start: {log['detection_time']}, End: {log['close_time']}, Description: {log.get('description', 'No description')}\n"
-            self.logs_display.setText(logs_text)
-        except Exception as e:
-            logger.error(f"Error fetching logs from MongoDB: {e}")
-            self.logs_display.setText("Failed to fetch logs.")
+        """Load the newest page of logs from MongoDB in the background."""
+        self.logs_display.clear()
+        self.logs_cursor = None
+        self.fetch_logs(None)
+
+    def load_more_logs(self):
+        self.fetch_logs(self.logs_cursor)
+
+    def fetch_logs(self, cursor):
+        if self.log_loader is not None and self.log_loader.isRunning():
+            return
+        self.refresh_logs_button.setEnabled(False)
+        self.more_logs_button.setEnabled(False)
+        self.log_loader = LogLoader(cursor)
+        self.log_loader.loaded.connect(self.show_logs)
+        self.log_loader.failed.connect(self.logs_failed)
+        self.log_loader.start()
+
+    def show_logs(self, logs, next_cursor):
+        for log in map(to_json, logs):
+            self.logs_display.append(f"Date: {log['date']}, Start: {log['detection_time']}, "
+                                     f"End: {log['close_time']}, Description: {log['description']}")
+        if not logs and self.logs_cursor is None:
+            self.logs_display.setText("No logs found.")
+        self.logs_cursor = next_cursor
+        self.refresh_logs_button.setEnabled(True)
+        self.more_logs_button.setEnabled(next_cursor is not None)
+
+    def logs_failed(self, error):
+        self.logs_display.setText("Failed to fetch logs.")
+        self.refresh_logs_button.setEnabled(True)
+
+    def closeEvent(self, event):
+        self.stop_detection()
+        # Let the last log page arrive before exiting
+        if self.log_loader is not None:
+            self.log_loader.wait()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,254 @@
+"""Re-run detection over recorded footage.
+
+Clips are decoded and sampled in a process pool, either every ``--stride``
+seconds or on scene changes, optionally screened with HOG, and the sampled
+frames are described by LLaVA with several requests in flight at once.
+Results go to the ``clip_analysis`` collection in one bulk write per clip,
+keyed by run, clip and frame. Finished clips are checkpointed, so an
+interrupted run picks up where it stopped when started again with the same
+``--run`` name.
+
+    python reanalyze.py static/footages saved_videos --stride 2 --workers 4
+    python reanalyze.py saved_videos --scene-threshold 10 --run backfill --update-logs
+"""
+import os
+import json
+import logging
+import argparse
+import datetime
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+import pymongo
+from pymongo import ReplaceOne
+
+from core.config import MODEL_WIDTH
+from core.db import get_db
+from core.detectors import DEFAULT_PROMPT, MODEL_JPEG_QUALITY, HogPersonDetector
+from core.footage import VIDEO_EXTENSIONS, parse_filename
+from core.frames import Frame
+from core.inference import OllamaClient
+from core.motion import hamming
+from core.schema import DETECTION_SCHEMA, build_prompt, parse_response
+from core.services import log_collection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ANALYSIS_COLLECTION = 'clip_analysis'
+
+
+def find_clips(paths):
+    """Video files under the given files and folders, skipping empty ones."""
+    clips = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if not name.startswith('.'))
+            candidates = [os.path.join(path, name) for name in names]
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            if candidate.lower().endswith(VIDEO_EXTENSIONS) and os.path.getsize(candidate) > 0:
+                clips.append(candidate)
+    return clips
+
+
+def sample_clip(path, stride=1.0, scene_threshold=None, screen=False, max_frames=None):
+    """Decode one clip and return its sampled frames; runs in a worker process.
+
+    With ``scene_threshold`` a frame is kept when its hash differs from the
+    last kept frame by more than that many bits, but never more often than
+    ``stride``; otherwise one frame is kept every ``stride`` seconds. Each
+    sample carries the frame's offset in the clip, the model-sized JPEG and,
+    when ``screen`` is set, the HOG result.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return path, [], f"cannot open {path}"
+    fps = cap.get(cv2.CAP_PROP_FPS) or 15.0
+    step = max(1, int(round(stride * fps)))
+    screener = HogPersonDetector() if screen else None
+
+    samples, last_hash, last_index, index = [], None, None, -1
+    try:
+        while max_frames is None or len(samples) < max_frames:
+            # grab() skips decoding frames that are not going to be sampled
+            if not cap.grab():
+                break
+            index += 1
+            if scene_threshold is None and index % step:
+                continue
+            if scene_threshold is not None and last_index is not None and index - last_index < step:
+                continue
+            ret, image = cap.retrieve()
+            if not ret:
+                break
+            frame = Frame(image, seq=index)
+            if scene_threshold is not None:
+                frame_hash = frame.dhash()
+                if last_hash is not None and hamming(frame_hash, last_hash) <= scene_threshold:
+                    continue
+                last_hash = frame_hash
+            last_index = index
+
+            sample = {'frame_index': index, 'offset': round(index / fps, 2),
+                      'jpeg': frame.jpeg(MODEL_JPEG_QUALITY, MODEL_WIDTH)}
+            if screener is not None:
+                candidate = screener.detect(frame)
+                sample['screen'] = {'person': candidate.person, 'confidence': candidate.confidence,
+                                    'boxes': candidate.boxes}
+            samples.append(sample)
+    finally:
+        cap.release()
+    return path, samples, None
+
+
+class Checkpoint:
+    """Set of clips already analyzed by a run, saved after every clip."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = set(json.load(f)['done'])
+
+    def add(self, clip):
+        self.done.add(clip)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'done': sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+
+def analyze(client, samples, prompt, options, detector, batch_size):
+    """Attach a detection to every sample, sending LLaVA requests ``batch_size`` at a time."""
+    pending = []
+    for sample in samples:
+        screen = sample.get('screen')
+        if detector == 'hog' or (detector == 'cascade' and not screen['person']):
+            sample['detection'] = dict(screen, description=None, stage='hog')
+        else:
+            pending.append(sample)
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        results = client.chat_many([(sample['jpeg'], build_prompt(prompt)) for sample in batch], options,
+                                   format=DETECTION_SCHEMA)
+        for sample, result in zip(batch, results):
+            screen = sample.get('screen') or {}
+            if not result.ok:
+                sample['detection'] = {'error': f"{result.status}: {result.error}", 'stage': 'llava'}
+                continue
+            data = parse_response(result.text)
+            sample['detection'] = {
+                'person': data['person'],
+                'confidence': data['confidence'],
+                'screen_confidence': screen.get('confidence'),
+                'boxes': screen.get('boxes', []),
+                'description': data['description'] or result.text,
+                'labels': [item['label'] for item in data['labels']],
+                'counts': {item['label']: item['count'] for item in data['labels']},
+                'stage': 'llava',
+            }
+    return samples
+
+
+def write_results(collection, run, clip, samples, prompt, model):
+    started, camera = parse_filename(os.path.basename(clip))
+    now = datetime.datetime.now()
+    operations = []
+    for sample in samples:
+        document = dict(sample['detection'],
+                        run=run,
+                        clip=os.path.basename(clip),
+                        path=clip,
+                        camera=camera,
+                        frame_index=sample['frame_index'],
+                        offset=sample['offset'],
+                        timestamp=started + datetime.timedelta(seconds=sample['offset']) if started else None,
+                        prompt=prompt,
+                        model=model,
+                        analyzed_at=now)
+        key = {'run': run, 'path': clip, 'frame_index': sample['frame_index']}
+        operations.append(ReplaceOne(key, document, upsert=True))
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def update_logs(clip, samples):
+    """Fill in the description of logs linked to the clip that have none, and add the labels found."""
+    described = [s['detection'] for s in samples if s['detection'].get('person') and s['detection'].get('description')]
+    if not described:
+        return 0
+    best = max(described, key=lambda detection: detection['confidence'])
+    labels = sorted({label for sample in samples for label in sample['detection'].get('labels', [])})
+    result = log_collection().update_many(
+        {'video_filename': os.path.basename(clip), 'description': {'$in': [None, '']}},
+        {'$set': {'description': best['description']}, '$addToSet': {'labels': {'$each': labels}}}
+    )
+    return result.modified_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help="Clips or folders of clips")
+    parser.add_argument('--run', default=datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+                        help="Run name; reuse it to resume an interrupted run")
+    parser.add_argument('--stride', type=float, default=1.0, help="Seconds between sampled frames")
+    parser.add_argument('--scene-threshold', type=int, help="Sample on scene changes (dhash bits) instead")
+    parser.add_argument('--max-frames', type=int, help="Sampled frames per clip at most")
+    parser.add_argument('--detector', choices=('llava', 'cascade', 'hog'), default='llava',
+                        help="LLaVA on every sample, HOG screening then LLaVA, or HOG only")
+    parser.add_argument('--prompt', default=DEFAULT_PROMPT)
+    parser.add_argument('--model', default='llava')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Decoding processes")
+    parser.add_argument('--concurrency', type=int, default=2, help="LLaVA requests in flight")
+    parser.add_argument('--update-logs', action='store_true', help="Backfill missing log descriptions")
+    args = parser.parse_args()
+
+    checkpoint = Checkpoint(f"reanalyze_{args.run}.json")
+    clips = [clip for clip in find_clips(args.paths) if clip not in checkpoint.done]
+    logger.info(f"Run {args.run}: {len(clips)} clip(s) to analyze, {len(checkpoint.done)} already done.")
+
+    collection = get_db()[ANALYSIS_COLLECTION]
+    collection.create_index([('run', pymongo.ASCENDING), ('path', pymongo.ASCENDING),
+                             ('frame_index', pymongo.ASCENDING)], unique=True, name='run_clip_frame')
+    collection.create_index([('labels', pymongo.ASCENDING), ('timestamp', pymongo.ASCENDING)], name='labels_time')
+    client = OllamaClient(model=args.model, concurrency=args.concurrency, max_pending=args.concurrency * 4)
+    screen = args.detector in ('cascade', 'hog')
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Inference on one clip overlaps with decoding of the next ones; the
+        # number of decoded clips waiting in memory is bounded
+        queued, running = list(clips), set()
+        while queued or running:
+            while queued and len(running) < 2 * args.workers:
+                running.add(pool.submit(sample_clip, queued.pop(0), args.stride, args.scene_threshold, screen,
+                                        args.max_frames))
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                process_clip(future.result(), args, client, collection, checkpoint)
+
+
+def process_clip(sampled, args, client, collection, checkpoint):
+    clip, samples, error = sampled
+    if error:
+        logger.error(f"Skipping {clip}: {error}")
+        return
+    analyze(client, samples, args.prompt, None, args.detector, args.concurrency)
+    write_results(collection, args.run, clip, samples, args.prompt, args.model)
+    failed = sum(1 for sample in samples if 'error' in sample['detection'])
+    persons = sum(1 for sample in samples if sample['detection'].get('person'))
+    message = f"{clip}: {len(samples)} frame(s), {persons} with a person"
+    if failed:
+        # Leave the clip out of the checkpoint so a rerun retries it
+        logger.warning(f"{message}, {failed} failed")
+        return
+    if args.update_logs:
+        message += f", {update_logs(clip, samples)} log(s) updated"
+    checkpoint.add(clip)
+    logger.info(message)
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,20 @@
 import streamlit as st
-import cv2
-import datetime
+import atexit
 import logging
-import io
-import ollama
-import plotly.express as px
-from pymongo import MongoClient
-from PIL import Image
-import numpy as np
-import pandas as pd
 import os
+import datetime
+
+from bson import ObjectId
+
+from core import services
+from core.cache import DescriptionCache
+from core.db import get_db
+from core.detectors import create_detector
+from core.logs import LOG_PROJECTION, LOG_SORT, MAX_PAGE_SIZE, build_query, to_json
+from core.metrics import metrics
+from core.recorder import ClipRecorder
+from core.session import create_sessions
+from core.stats import query_stats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,39 +23,88 @@ logger = logging.getLogger(__name__)
 # Ensure saved_videos directory exists
 os.makedirs("saved_videos", exist_ok=True)
 
-# MongoDB Setup
-try:
-    client = MongoClient('mongodb://127.0.0.1:27017', serverSelectionTimeoutMS=5000)
-    db = client['wildlife_conservation']
-    log_collection = db['detection_logs']
-    client.server_info()  # Test connection
-    logger.info("Connected to MongoDB successfully.")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {e}")
-    raise
-
-# Function to process frame using LLaVA
-def process_frame(frame):
-    """Send frame to LLaVA model via Ollama and return the response."""
-    try:
-        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        img_bytes = io.BytesIO()
-        image.save(img_bytes, format='JPEG')
-        img_bytes = img_bytes.getvalue()
-
-        response = ollama.chat(
-            model='llava',
-            messages=[{"role": "user", "content": "What is in the video(the camera is a night vision camera so ignore the resolution)?", "images": [img_bytes]}],
-            options={"num_gpu": 1}
-        )
+# How often the live image and the status panel refresh, in seconds
+LIVE_REFRESH_SECONDS = 0.2
+STATUS_REFRESH_SECONDS = 1.0
 
-        return response['message']['content']
-    except Exception as e:
-        logger.error(f"Error processing frame with LLaVA: {e}")
-        return "Error processing frame."
 
-# Streamlit UI
+# Streamlit re-runs this script on every interaction; these are created once
+# per process instead. MongoDB connects on first query, not at startup.
+@st.cache_resource
+def get_database():
+    services.prepare_database()
+    return get_db()
+
+
+@st.cache_resource
+def get_detector():
+    return create_detector('hog', cache=DescriptionCache(), options={"num_gpu": 1})
+
+
+@st.cache_resource
+def get_footage_catalog():
+    return services.create_footage_catalog("saved_videos")
+
+
+@st.cache_resource
+def get_sessions():
+    """Detection sessions per camera, shared by every browser session and rerun.
+
+    The camera is owned by the session's capture thread, so reruns, page
+    changes and other users never open it a second time.
+    """
+    def create_recorder(camera):
+        # Keeps a few seconds of pre-roll and writes clips on a background thread
+        return ClipRecorder("saved_videos", camera.id, on_clip=services.create_clip_linker(get_footage_catalog()))
+
+    sessions = create_sessions(get_detector(), services.create_event_log(), recorder_factory=create_recorder)
+    # Close open events when the server shuts down
+    atexit.register(lambda: [session.stop() for session in sessions.values()])
+    return sessions
+
+
+# Only these parts of the Live Detection page refresh; the rest of the script does not rerun
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_view(camera_id):
+    session = get_sessions()[camera_id]
+    snapshot = session.snapshot()
+    if snapshot is not None:
+        # JPEG bytes go to the browser as is, shared with every other viewer of the frame
+        st.image(snapshot)
+    elif session.error:
+        st.error(session.error)
+    else:
+        st.info("Detection is stopped.")
+
+
+@st.fragment(run_every=STATUS_REFRESH_SECONDS)
+def status_panel(camera_id):
+    session = get_sessions()[camera_id]
+    # The buttons start or stop the shared session before the fragment reruns; being part of
+    # the fragment, they follow changes made from other browser sessions too
+    running = session.running
+    st.button("Start Detection", key="start_btn", on_click=session.start, disabled=running)
+    st.button("Stop Detection", key="stop_btn", on_click=session.stop, disabled=not running)
+
+    status = session.status()
+    if status['running']:
+        st.success(f"Running since {datetime.datetime.fromtimestamp(status['started_at']):%H:%M:%S}")
+    if status['error']:
+        st.error(status['error'])
+    if status['description']:
+        seen = datetime.datetime.fromtimestamp(status['detected_at'])
+        st.write(f"{'🚨 ' if status['person'] else ''}{seen:%H:%M:%S}: {status['description']}")
+    # Frame counters and per-stage latency
+    st.code(metrics.summary_text())
+
+
+# Streamlit UI; set_page_config must be the first Streamlit command of each run
 st.set_page_config(page_title="Wildlife Conservation", layout="wide")
+
+db = get_database()
+log_collection = services.log_collection()
+stats_collection = services.stats_collection()
+
 st.title("🐾 Wildlife Conservation Monitoring System")
 
 # Sidebar Navigation
@@ -60,102 +114,46 @@ menu = st.sidebar.radio("Navigation", ["Live Detection", "Logs", "Saved Footages
 if menu == "Live Detection":
     st.subheader("📹 Real-Time Wildlife Detection")
 
-    # Placeholder for the camera feed
-    live_feed = st.image([])  
-
-    cap = None
-
-    if st.sidebar.button("Start Detection",key="start_btn"):
-        cap = cv2.VideoCapture(0) 
-
-        description_logged = False
-        recording = False  
-        video_writer = None  
-        video_filename = None
-
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                st.error("Failed to grab frame.")
-                break
-
-            # Convert BGR (OpenCV default) to RGB for Streamlit display
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            live_feed.image(frame_rgb, channels="RGB")
-
-            # Process frame with LLaVA
-            description = process_frame(frame)
-            logger.info(f"LLaVA Output: {description}")
-
-            # Detecting people and start recording
-            if "person" in description.lower() or "people" in description.lower():
-                if not description_logged:
-                    video_folder = "saved_videos"
-                    os.makedirs(video_folder, exist_ok=True)
-                    start_time = datetime.datetime.now()
-                    detection_time = start_time.strftime('%H:%M:%S')
-                    date = start_time.strftime('%Y-%m-%d')
-                    timestamp = start_time.strftime('%Y-%m-%d_%H-%M-%S')
-
-                    video_filename = f"saved_videos/footage_{date}_{detection_time.replace(':', '-')}.mp4"
-                    video_writer = cv2.VideoWriter(
-                        video_filename,
-                        cv2.VideoWriter_fourcc(*"mp4v"),  
-                        (frame.shape[1], frame.shape[0])
-                    )
-
-                    recording = True
-                    try:
-                        log_entry = log_collection.insert_one({
-                            'date': date,
-                            'detection_time': detection_time,
-                            'close_time': None,
-                            'description': description,
-                            'video_filename': video_filename
-                        })
-                        log_entry_id = log_entry.inserted_id  
-                        description_logged = True
-                        logger.info("Detection logged and recording started.")
-                    except Exception as e:
-                        logger.error(f"Error logging detection: {e}")
-
-            else:
-                # Stop recording when no people are detected
-                if description_logged:
-                    close_time = datetime.datetime.now().strftime('%H:%M:%S')
-                    try:
-                        log_collection.update_one(
-                            {'_id': log_entry_id},
-                            {'$set': {'close_time': close_time}}
-                        )
-                        logger.info("Close time updated in MongoDB.")
-                        if recording and video_writer is not None:
-                            video_writer.release()
-                            recording = False
-                            logger.info(f"Recording saved: {video_filename}")
-
-                    except Exception as e:
-                        logger.error(f"Error updating close time: {e}")
-
-                description_logged = False  
-
-            # Stop detection button
-            if st.sidebar.button("Stop Detection"):
-                cap.release()
-                st.success("Detection Stopped.")
-                break
-
-        cap.release()
-        live_feed.image([])  # Clear the stream
+    sessions = {session.camera.name: session for session in get_sessions().values()}
+    session = sessions[st.sidebar.selectbox("Camera", list(sessions))]
+
+    # The detection keeps running when this page is left or the browser is closed
+    with st.sidebar:
+        status_panel(session.camera.id)
+    live_view(session.camera.id)
 
 # Logs Page
 elif menu == "Logs":
     st.subheader("📜 Detection Logs")
-    logs = log_collection.find()
-    logs_list = [[log['date'], log['detection_time'], log['close_time'], log.get('description', 'No description')] for log in logs]
+    import pandas as pd
+
+    # Logs seen by this session are kept across reruns; each rerun only fetches
+    # logs newer than the newest one seen, plus the events still open. Ids are
+    # generated by each writer process, so the last minute is re-read to catch
+    # inserts from other processes that sort just below the newest id.
+    cached = st.session_state.setdefault("logs", {"rows": {}, "newest": None})
+    rows = cached["rows"]
+    if cached["newest"] is None:
+        query = {}
+    else:
+        since = ObjectId.from_datetime(cached["newest"].generation_time - datetime.timedelta(minutes=1))
+        still_open = [log_id for log_id, log in rows.items() if log.get('close_time') is None]
+        query = {'$or': [{'_id': {'$gte': since}}, {'_id': {'$in': still_open}}]}
+    try:
+        for log in log_collection.find(query, LOG_PROJECTION).sort(LOG_SORT).limit(MAX_PAGE_SIZE):
+            rows[log['_id']] = to_json(log)
+            if cached["newest"] is None or log['_id'] > cached["newest"]:
+                cached["newest"] = log['_id']
+    except Exception as e:
+        logger.error(f"Error fetching logs from MongoDB: {e}")
+        st.error("Failed to fetch new logs.")
+    st.button("Refresh")
+
+    logs = sorted(rows.values(), key=lambda log: log['start'], reverse=True)
+    logs_list = [[log['date'], log['detection_time'], log['close_time'], log['description']] for log in logs]
 
     df = pd.DataFrame(logs_list, columns=["Date", "Start Time", "End Time", "Description"])
-    
+
     if not df.empty:
         st.dataframe(df)
     else:
@@ -165,42 +163,45 @@ elif menu == "Logs":
 elif menu == "Saved Footages":
     st.subheader("🎥 Saved Wildlife Footages")
 
-    logs = log_collection.find({"video_filename": {"$exists": True}})
-    videos = [log["video_filename"] for log in logs if "video_filename" in log]
-    video_folder = "saved_videos"
-    os.makedirs(video_folder, exist_ok=True)
-    
+    # Metadata and thumbnails come from the footage index; only the chosen clip is loaded
+    videos = get_footage_catalog().find()
+
     if not videos:
         st.warning("No saved footages found.")
     else:
-        for video in videos:
-            full_path = os.path.join(video_folder, os.path.basename(video)) 
-
-            if os.path.exists(full_path): 
-                st.write(f"📂 **Recorded Footage:** {full_path}")
-                with open(full_path, "rb") as video_file:
-                    video_bytes = video_file.read()
-                    st.video(video_bytes)
-                    st.download_button("Download Video", video_bytes, file_name=os.path.basename(video))
-            else:
-                st.error(f"⚠️ Video file not found: {full_path}")
+        columns = st.columns(4)
+        for i, video in enumerate(videos):
+            with columns[i % 4]:
+                if video.get('thumbnail'):
+                    st.image(os.path.join(get_footage_catalog().thumbnail_folder, video['thumbnail']))
+                st.caption(f"{video['filename']} · {video.get('duration') or '?'}s · {video['size'] / 1024:.1f} KiB")
+
+        selected = st.selectbox("Play footage", [video['filename'] for video in videos])
+        video = next(video for video in videos if video['filename'] == selected)
+        if os.path.exists(video['path']):
+            st.write(f"📂 **Recorded Footage:** {video['path']}")
+            st.video(video['path'])
+            with open(video['path'], "rb") as video_file:
+                st.download_button("Download Video", video_file, file_name=video['filename'])
+        else:
+            st.error(f"⚠️ Video file not found: {video['path']}")
 
 # Analysis Page
 elif menu == "Analysis":
     st.subheader("📊 Wildlife Detection Analysis")
+    # Only this page needs the plotting stack
+    import pandas as pd
+    import plotly.express as px
 
-    logs = log_collection.find()
-    logs_list = [[log['date'], log.get('description', 'Unknown')] for log in logs]
-
-    df = pd.DataFrame(logs_list, columns=["Date", "Description"])
+    # Counts come from the per-day rollups; only the selected day's logs are fetched
+    daily = query_stats(stats_collection)['daily']
+    df = pd.DataFrame([[bucket['key'], bucket['count']] for bucket in daily], columns=["Date", "Detections"])
 
     if df.empty:
         st.warning("No data available for analysis.")
     else:
-        detection_counts = df.groupby("Date").size().reset_index(name="Detections")
-
         fig = px.bar(
-            detection_counts, x="Date", y="Detections",
+            df, x="Date", y="Detections",
             text_auto=True, title="📈 Number of Detections Per Day",
             color="Detections",
             color_continuous_scale="turbo"
@@ -208,12 +209,20 @@ elif menu == "Analysis":
         fig.update_layout(xaxis_title="Date", yaxis_title="Number of Detections", template="plotly_dark")
         st.plotly_chart(fig, use_container_width=True)
 
-        selected_date = st.selectbox("Select Date to View Detections", df["Date"].unique())
+        selected_date = st.selectbox("Select Date to View Detections", df["Date"])
         if selected_date:
-            filtered_df = df[df["Date"] == selected_date]
             st.write(f"**Detections on {selected_date}:**")
-            for desc in filtered_df["Description"]:
-                st.markdown(f"✅ {desc}")
+            for log in log_collection.find(build_query(date=selected_date), {"description": 1}):
+                st.markdown(f"✅ {log.get('description') or 'Unknown'}")
+
+    # Species lookups are served by the labels index, not a scan of the descriptions
+    labels = log_collection.distinct("labels")
+    if labels:
+        selected_label = st.selectbox("Select Species", sorted(labels))
+        st.write(f"**Latest detections with {selected_label}:**")
+        for log in log_collection.find({"labels": selected_label}, LOG_PROJECTION).sort(LOG_SORT).limit(100):
+            log = to_json(log)
+            st.markdown(f"✅ {log['date']} {log['detection_time']}: {log['description']}")
 
 # Profile Page
 elif menu == "Profile":
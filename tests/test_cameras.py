@@ -0,0 +1,32 @@
+import time
+
+from core.cameras import InferenceScheduler, _CameraQueue
+
+
+def create_scheduler(max_wait):
+    """An ``activity`` scheduler without workers, so ``_next`` can be checked directly."""
+    scheduler = InferenceScheduler(lambda frame: frame, policy='activity', max_wait=max_wait)
+    for camera_id, priority in (('busy', 1), ('quiet', 0)):
+        scheduler._cameras[camera_id] = _CameraQueue(None, 1, priority)
+    return scheduler
+
+
+def test_active_high_priority_camera_goes_first():
+    scheduler = create_scheduler(max_wait=10.0)
+    scheduler.submit('quiet', 1, 'quiet frame')
+    scheduler.submit('busy', 1, 'busy frame')
+    scheduler.mark_activity('busy')
+
+    assert scheduler._next()[0] == 'busy'
+
+
+def test_camera_waiting_longer_than_max_wait_is_served():
+    scheduler = create_scheduler(max_wait=0.05)
+    scheduler.submit('quiet', 1, 'quiet frame')
+    time.sleep(0.1)
+    # A newer frame replaces the queued one but does not restart the wait
+    scheduler.submit('quiet', 2, 'newer quiet frame')
+    scheduler.submit('busy', 1, 'busy frame')
+    scheduler.mark_activity('busy')
+
+    assert scheduler._next()[0] == 'quiet'
@@ -0,0 +1,71 @@
+import os
+import time
+
+from pymongo.errors import AutoReconnect, WriteError
+
+from core.log_sink import LogSink
+
+
+class FakeCollection:
+    """Applies ``bulk_write`` operations by counting them; a bad document or a ``down`` server makes it fail."""
+
+    def __init__(self, server):
+        self.server = server
+        self.documents = {}
+
+    def bulk_write(self, operations, ordered=True):
+        if self.server.down:
+            raise AutoReconnect("connection refused")
+        for operation in operations:
+            document = operation._doc
+            if document.get('bad'):
+                raise WriteError("document failed validation", code=121)
+            self.documents[document['_id']] = document
+
+
+class FakeDatabase(dict):
+    down = False
+
+    def __missing__(self, name):
+        collection = self[name] = FakeCollection(self)
+        return collection
+
+
+def create_sink(tmp_path, db):
+    return LogSink(db, flush_interval=0.05, spool_path=str(tmp_path / 'spool.ndjson'), retry_interval=0.1)
+
+
+def test_rejected_write_does_not_block_the_others(tmp_path):
+    db = FakeDatabase()
+    sink = create_sink(tmp_path, db)
+    sink.insert('logs', {'n': 1})
+    sink.insert('logs', {'bad': True})
+    sink.insert('logs', {'n': 2})
+    sink.flush()
+    sink.close()
+
+    assert sorted(document.get('n') for document in db['logs'].documents.values()) == [1, 2]
+    assert sink.online
+    assert not os.path.exists(sink.spool_path)
+    with open(sink.spool_path + '.rejected') as f:
+        assert len(f.readlines()) == 1
+
+
+def test_connection_errors_are_spooled_and_replayed(tmp_path):
+    db = FakeDatabase()
+    db.down = True
+    sink = create_sink(tmp_path, db)
+    sink.insert('logs', {'n': 1})
+    sink.flush()
+    assert not sink.online
+    assert os.path.exists(sink.spool_path)
+
+    db.down = False
+    # Writes arriving before the retry is due queue up behind the spool
+    time.sleep(0.15)
+    sink.insert('logs', {'n': 2})
+    sink.flush()
+    sink.close()
+
+    assert sorted(document['n'] for document in db['logs'].documents.values()) == [1, 2]
+    assert not os.path.exists(sink.spool_path)
@@ -0,0 +1,42 @@
+import threading
+
+from core.detectors import Detection
+from core.pipeline import DetectionPipeline
+
+
+class FakeScheduler:
+    def register(self, camera_id, callback, priority=0):
+        pass
+
+    def unregister(self, camera_id):
+        pass
+
+    def mark_activity(self, camera_id):
+        pass
+
+
+def test_stop_waits_for_the_result_being_handled():
+    calls = []
+    handling, release = threading.Event(), threading.Event()
+
+    def on_result(frame, result):
+        handling.set()
+        release.wait(timeout=5)
+        calls.append('result')
+
+    pipeline = DetectionPipeline(FakeScheduler(), 'cam0', on_result=on_result,
+                                 on_stop=lambda camera_id: calls.append('stop'))
+    worker = threading.Thread(target=pipeline._handle_result, args=(1, None, Detection(person=True)))
+    worker.start()
+    handling.wait(timeout=5)
+    stopper = threading.Thread(target=pipeline.stop)
+    stopper.start()
+    stopper.join(timeout=0.2)
+    # The tracker must not be closed while the result is still updating it
+    assert calls == []
+
+    release.set()
+    worker.join(timeout=5)
+    stopper.join(timeout=5)
+    pipeline._handle_result(2, None, Detection(person=True))
+    assert calls == ['result', 'stop']
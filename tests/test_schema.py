@@ -0,0 +1,38 @@
+import pytest
+
+from core.schema import parse_response, parse_text
+
+
+@pytest.mark.parametrize('text', [
+    "There isn't a person in the frame.",
+    "I cannot see any person.",
+    "The scene doesn't show any people.",
+    "There’s no one here and there aren’t any humans.",
+    "I can't make out a man in the dark.",
+    "There is never a hunter visible in this footage.",
+    "Nothing resembling a person is visible.",
+    "No one is in the frame.",
+])
+def test_negated_person_is_not_detected(text):
+    data = parse_text(text)
+    assert data['person'] is False
+    assert data['labels'] == []
+
+
+def test_negation_ends_with_its_clause():
+    data = parse_text("There isn't a deer, but two men are walking past.")
+    assert data['person'] is True
+    assert data['labels'] == [{'label': 'person', 'count': 2}]
+
+
+def test_labels_and_counts_from_prose():
+    data = parse_text("A man is standing near three elephants.")
+    assert data['person'] is True
+    assert {item['label']: item['count'] for item in data['labels']} == {'person': 1, 'elephant': 3}
+
+
+def test_invalid_json_falls_back_to_prose():
+    data = parse_response("The frame doesn't show any people. A deer is grazing.")
+    assert data['structured'] is False
+    assert data['person'] is False
+    assert data['labels'] == [{'label': 'deer', 'count': 1}]
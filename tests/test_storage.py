@@ -0,0 +1,78 @@
+import os
+import datetime
+
+from core.storage import StorageManager
+
+
+class FakeCollection:
+    """Just enough of a MongoDB collection for the storage manager and its catalogs."""
+
+    def __init__(self, documents=()):
+        self.documents = list(documents)
+
+    def count_documents(self, query, limit=0):
+        return 0
+
+    def update_many(self, query, update):
+        pass
+
+    def update_one(self, query, update):
+        for document in self.documents:
+            if document['path'] == query['path']:
+                document.update(update['$set'])
+
+
+class FakeCatalog:
+    def __init__(self, folder, videos):
+        self.folder = folder
+        self.thumbnail_folder = os.path.join(folder, '.thumbnails')
+        self.collection = FakeCollection(videos)
+
+    def scan(self):
+        pass
+
+    def find(self):
+        return [dict(video) for video in self.collection.documents]
+
+    def remove(self, path):
+        self.collection.documents = [video for video in self.collection.documents if video['path'] != path]
+
+
+def write_clip(folder, name, size, days_old):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    started = datetime.datetime.now() - datetime.timedelta(days=days_old)
+    return {'path': path, 'filename': name, 'size': size, 'started': started}
+
+
+def test_hard_linked_copies_are_counted_once(tmp_path):
+    first, second = tmp_path / 'footages', tmp_path / 'saved'
+    first.mkdir()
+    second.mkdir()
+    old = write_clip(str(first), 'old.mp4', 1000, days_old=3)
+    new = write_clip(str(first), 'new.mp4', 1000, days_old=1)
+    # A deduplicated copy of the newer clip
+    os.link(new['path'], second / 'new.mp4')
+    copy = dict(new, path=str(second / 'new.mp4'))
+    catalogs = [FakeCatalog(str(first), [old, new]), FakeCatalog(str(second), [copy])]
+    manager = StorageManager(catalogs, FakeCollection(), max_bytes=1500, transcode_after_days=None)
+    manager.run_once()
+
+    # 2000 bytes on disk, not 3000: deleting the oldest clip is enough
+    assert not os.path.exists(old['path'])
+    assert os.path.exists(new['path']) and os.path.exists(copy['path'])
+    assert manager.bytes_freed == 1000
+
+
+def test_failed_transcode_is_not_retried(tmp_path, caplog):
+    clip = write_clip(str(tmp_path), 'clip.mp4', 1000, days_old=3)
+    catalog = FakeCatalog(str(tmp_path), [clip])
+    # An "ffmpeg" that always fails
+    manager = StorageManager([catalog], FakeCollection(), ffmpeg='false')
+    manager.transcode_old()
+    assert catalog.collection.documents[0]['transcode_failed']
+
+    caplog.clear()
+    manager.transcode_old()
+    assert not caplog.records